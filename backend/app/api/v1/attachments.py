@@ -0,0 +1,204 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from ...config import settings
+from ...database import get_db
+from ...crud import attachment as attachment_crud
+from ...crud import knowledge as knowledge_crud
+from ...models import AttachmentUpload
+from ...schemas import attachment as attachment_schemas
+from ...schemas.common import ApiResponse, PageResponse
+from ...services.file_service import UPLOAD_CHUNK_SIZE, ChunkChecksumError, file_service
+from ...utils.http import etag_matches
+
+router = APIRouter(prefix="/knowledge", tags=["attachments"])
+
+# 上传的文件可能是 HTML、SVG 等，直接打开时禁止执行脚本，也不让浏览器猜测类型
+ATTACHMENT_HEADERS = {
+    "Cache-Control": "private, max-age=31536000, immutable",
+    "Content-Security-Policy": "sandbox",
+    "X-Content-Type-Options": "nosniff"
+}
+
+
+def _upload_status(db: Session, upload: AttachmentUpload) -> attachment_schemas.AttachmentUpload:
+    return attachment_schemas.AttachmentUpload(
+        id=upload.id,
+        knowledge_item_id=upload.knowledge_item_id,
+        filename=upload.filename,
+        size=upload.size,
+        chunk_size=upload.chunk_size,
+        chunk_count=attachment_crud.chunk_count(upload.size, upload.chunk_size),
+        received=attachment_crud.get_received_chunks(db, upload.id)
+    )
+
+
+def _get_upload(db: Session, upload_id: str) -> AttachmentUpload:
+    upload = attachment_crud.get_upload(db, upload_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="上传不存在或已过期")
+    return upload
+
+
+@router.get("/{item_id}/attachments", response_model=PageResponse[attachment_schemas.Attachment])
+async def list_attachments(
+    item_id: int,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，传入时忽略 page"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    db: Session = Depends(get_db)
+):
+    if not knowledge_crud.knowledge_item_exists(db, item_id):
+        raise HTTPException(status_code=404, detail="知识项不存在")
+
+    attachments, next_cursor = attachment_crud.get_attachments_by_knowledge(
+        db, item_id, page=page, page_size=page_size, cursor=cursor, order=order
+    )
+    return PageResponse(data=attachments, next_cursor=next_cursor, message=f"获取到 {len(attachments)} 个附件")
+
+
+@router.post("/{item_id}/attachments/uploads", response_model=ApiResponse[attachment_schemas.AttachmentUpload])
+async def create_attachment_upload(
+    item_id: int,
+    upload_data: attachment_schemas.AttachmentUploadCreate,
+    db: Session = Depends(get_db)
+):
+    """开始分块上传：按返回的 chunk_size 切分文件，逐块 PUT 后调用 complete；中断后用 GET 查询已收到的分块继续上传"""
+    if not knowledge_crud.knowledge_item_exists(db, item_id):
+        raise HTTPException(status_code=404, detail="知识项不存在")
+    if upload_data.size > settings.ATTACHMENT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"附件不能超过 {settings.ATTACHMENT_MAX_BYTES // 1024 // 1024} MB")
+
+    upload = attachment_crud.create_upload(
+        db, item_id, upload_data.filename, upload_data.size, upload_data.content_type, upload_data.sha256
+    )
+    return ApiResponse(data=_upload_status(db, upload), message="已创建上传")
+
+
+@router.get("/attachments/uploads/{upload_id}", response_model=ApiResponse[attachment_schemas.AttachmentUpload])
+async def get_attachment_upload(
+    upload_id: str,
+    db: Session = Depends(get_db)
+):
+    upload = _get_upload(db, upload_id)
+    return ApiResponse(data=_upload_status(db, upload), message="获取上传进度成功")
+
+
+@router.put(
+    "/attachments/uploads/{upload_id}/chunks/{index}",
+    response_model=ApiResponse[attachment_schemas.AttachmentUpload]
+)
+async def upload_attachment_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    x_chunk_sha256: str = Header(..., pattern="^[0-9a-fA-F]{64}$", description="该分块内容的 sha256"),
+    db: Session = Depends(get_db)
+):
+    """请求体为分块的原始字节，边接收边写入组装文件的对应位置；同一块可以重复上传"""
+    upload = _get_upload(db, upload_id)
+    if not 0 <= index < attachment_crud.chunk_count(upload.size, upload.chunk_size):
+        raise HTTPException(status_code=400, detail="分块序号超出范围")
+
+    offset, length = attachment_crud.chunk_range(upload, index)
+    # 打开、写入、fsync 和关闭都是磁盘 IO，与 complete 一样放到线程中执行；请求体攒到 UPLOAD_CHUNK_SIZE 再写
+    try:
+        chunk = await asyncio.to_thread(file_service.open_upload_chunk, upload_id, offset, length)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="上传不存在或已过期")
+    try:
+        buffer = bytearray()
+        async for data in request.stream():
+            buffer += data
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                block, buffer = buffer, bytearray()
+                await asyncio.to_thread(chunk.write, block)
+        if buffer:
+            await asyncio.to_thread(chunk.write, buffer)
+        await asyncio.to_thread(chunk.finish, x_chunk_sha256)
+    except ChunkChecksumError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await asyncio.to_thread(chunk.close)
+
+    attachment_crud.mark_chunk_received(db, upload_id, index)
+    return ApiResponse(data=_upload_status(db, upload), message=f"已收到第 {index} 块")
+
+
+@router.post("/attachments/uploads/{upload_id}/complete", response_model=ApiResponse[attachment_schemas.Attachment])
+async def complete_attachment_upload(
+    upload_id: str,
+    db: Session = Depends(get_db)
+):
+    upload = _get_upload(db, upload_id)
+    missing = attachment_crud.get_missing_chunks(db, upload)
+    if missing:
+        raise HTTPException(status_code=409, detail={"message": "还有分块没有上传", "missing": missing})
+
+    try:
+        # 需要完整读一遍文件计算哈希，放到线程中执行
+        digest = await asyncio.to_thread(file_service.store_attachment, upload_id, upload.sha256)
+    except ChunkChecksumError as e:
+        attachment_crud.delete_upload(db, upload_id)
+        raise HTTPException(status_code=422, detail=f"{e}，请重新上传")
+    except FileNotFoundError:
+        raise HTTPException(status_code=409, detail="上传已完成或已取消")
+
+    attachment = attachment_crud.complete_upload(db, upload, digest)
+    return ApiResponse(data=attachment, message="上传附件成功")
+
+
+@router.delete("/attachments/uploads/{upload_id}", response_model=ApiResponse)
+async def cancel_attachment_upload(
+    upload_id: str,
+    db: Session = Depends(get_db)
+):
+    _get_upload(db, upload_id)
+    attachment_crud.delete_upload(db, upload_id)
+    return ApiResponse(message="已取消上传")
+
+
+@router.get("/attachments/{attachment_id}")
+async def download_attachment(
+    attachment_id: int,
+    request: Request,
+    download: bool = Query(False, description="为 true 时以下载方式返回，否则在浏览器中直接打开"),
+    db: Session = Depends(get_db)
+):
+    """支持 Range / If-Range 断点续传；ASGI 服务器支持 pathsend 扩展时由服务器直接发送文件"""
+    attachment = attachment_crud.get_attachment(db, attachment_id)
+    if not attachment:
+        raise HTTPException(status_code=404, detail="附件不存在")
+    path = file_service.attachment_path(attachment.hash)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="附件文件不存在")
+
+    # 内容按哈希存放，ETag 就是内容哈希
+    headers = {**ATTACHMENT_HEADERS, "ETag": f'"{attachment.hash}"'}
+    if etag_matches(request.headers.get("if-none-match"), [headers["ETag"]]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        path,
+        media_type=attachment.content_type,
+        filename=attachment.filename,
+        content_disposition_type="attachment" if download else "inline",
+        headers=headers
+    )
+
+
+@router.delete("/attachments/{attachment_id}", response_model=ApiResponse[attachment_schemas.Attachment])
+async def delete_attachment(
+    attachment_id: int,
+    db: Session = Depends(get_db)
+):
+    attachment = attachment_crud.delete_attachment(db, attachment_id)
+    if not attachment:
+        raise HTTPException(status_code=404, detail="附件不存在")
+    return ApiResponse(data=attachment, message="删除附件成功")
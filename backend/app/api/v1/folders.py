@@ -5,27 +5,34 @@ from typing import List, Optional
 from ...database import get_db
 from ...crud import folder as folder_crud
 from ...schemas import folder as folder_schemas
-from ...schemas.common import ApiResponse
+from ...schemas.common import ApiResponse, PageResponse
 
 router = APIRouter(prefix="/folders", tags=["folders"])
 
 
-@router.get("", response_model=ApiResponse[List[folder_schemas.Folder]])
+@router.get("", response_model=PageResponse[folder_schemas.Folder])
 async def get_folders(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，传入时忽略 page"),
+    sort: str = Query("id", pattern="^(id|created_at|updated_at|name)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
     db: Session = Depends(get_db)
 ):
-    folders = folder_crud.get_folders(db, page=page, page_size=page_size)
-    return ApiResponse(data=folders, message=f"获取到 {len(folders)} 个文件夹")
+    folders, next_cursor = folder_crud.get_folders(
+        db, page=page, page_size=page_size, cursor=cursor, sort=sort, order=order
+    )
+    return PageResponse(data=folders, next_cursor=next_cursor, message=f"获取到 {len(folders)} 个文件夹")
 
 
 @router.get("/tree", response_model=ApiResponse[List[folder_schemas.FolderWithChildren]])
 async def get_folder_tree(
     root_id: Optional[int] = None,
+    depth: Optional[int] = Query(None, ge=1, le=folder_crud.MAX_FOLDER_DEPTH, description="返回的层数，不传则返回整棵子树"),
+    with_counts: bool = Query(False, description="附带每个文件夹的知识项数量（本层、含子文件夹、按类型）"),
     db: Session = Depends(get_db)
 ):
-    folder_tree = folder_crud.get_folder_tree(db, root_id=root_id)
+    folder_tree = folder_crud.get_folder_tree(db, root_id=root_id, depth=depth, with_counts=with_counts)
     return ApiResponse(data=folder_tree, message="获取文件夹树成功")
 
 
@@ -38,6 +45,28 @@ async def get_folders_by_parent(
     return ApiResponse(data=folders, message=f"获取到 {len(folders)} 个文件夹")
 
 
+@router.get("/{folder_id}/descendants", response_model=ApiResponse[List[folder_schemas.Folder]])
+async def get_folder_descendants(
+    folder_id: int,
+    db: Session = Depends(get_db)
+):
+    if not folder_crud.get_folder(db, folder_id):
+        raise HTTPException(status_code=404, detail="文件夹不存在")
+    folders = folder_crud.get_descendants(db, folder_id)
+    return ApiResponse(data=folders, message=f"获取到 {len(folders)} 个子文件夹")
+
+
+@router.get("/{folder_id}/breadcrumbs", response_model=ApiResponse[List[folder_schemas.Folder]])
+async def get_folder_breadcrumbs(
+    folder_id: int,
+    db: Session = Depends(get_db)
+):
+    folders = folder_crud.get_ancestors(db, folder_id)
+    if not folders:
+        raise HTTPException(status_code=404, detail="文件夹不存在")
+    return ApiResponse(data=folders, message="获取文件夹路径成功")
+
+
 @router.get("/{folder_id}", response_model=ApiResponse[folder_schemas.Folder])
 async def get_folder(
     folder_id: int,
@@ -54,6 +83,9 @@ async def create_folder(
     folder: folder_schemas.FolderCreate,
     db: Session = Depends(get_db)
 ):
+    error = folder_crud.get_create_error(db, folder.parent_id)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
     db_folder = folder_crud.create_folder(db, folder)
     return ApiResponse(data=db_folder, message="创建文件夹成功")
 
@@ -64,9 +96,14 @@ async def update_folder(
     folder: folder_schemas.FolderUpdate,
     db: Session = Depends(get_db)
 ):
-    db_folder = folder_crud.update_folder(db, folder_id, folder)
+    db_folder = folder_crud.get_folder(db, folder_id)
     if not db_folder:
         raise HTTPException(status_code=404, detail="文件夹不存在")
+    if "parent_id" in folder.model_fields_set:
+        error = folder_crud.get_move_error(db, db_folder, folder.parent_id)
+        if error:
+            raise HTTPException(status_code=400, detail=error)
+    db_folder = folder_crud.update_folder(db, folder_id, folder)
     return ApiResponse(data=db_folder, message="更新文件夹成功")
 
 
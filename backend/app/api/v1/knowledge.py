@@ -4,51 +4,90 @@ from typing import List, Optional
 
 from ...database import get_db
 from ...crud import knowledge as knowledge_crud
+from ...crud import folder as folder_crud
+from ...crud import tag as tag_crud
 from ...schemas import knowledge as knowledge_schemas
-from ...schemas.common import ApiResponse
+from ...schemas.common import ApiResponse, PageResponse
+from ...services.suggest_service import suggest_service
+from ...utils.tag_query import TagQueryError, parse_tag_query
 
 router = APIRouter(prefix="/knowledge", tags=["knowledge"])
 
 
-@router.get("", response_model=ApiResponse[List[knowledge_schemas.KnowledgeItem]])
+@router.get("", response_model=PageResponse[knowledge_schemas.KnowledgeItem])
 async def get_knowledge_items(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     folder_id: Optional[int] = None,
     type: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，传入时忽略 page"),
+    sort: str = Query("id", pattern="^(id|created_at|updated_at|title)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    include_subfolders: bool = Query(False, description="同时包含 folder_id 的所有子文件夹"),
     db: Session = Depends(get_db)
 ):
-    knowledge_items = knowledge_crud.get_knowledge_items(
+    knowledge_items, next_cursor = knowledge_crud.get_knowledge_items(
         db, 
         page=page, 
         page_size=page_size,
         folder_id=folder_id,
-        type=type
+        type=type,
+        cursor=cursor,
+        sort=sort,
+        order=order,
+        include_subfolders=include_subfolders
+    )
+    return PageResponse(
+        data=knowledge_items,
+        next_cursor=next_cursor,
+        message=f"获取到 {len(knowledge_items)} 个知识项"
     )
-    return ApiResponse(data=knowledge_items, message=f"获取到 {len(knowledge_items)} 个知识项")
 
 
-@router.get("/search", response_model=ApiResponse[List[knowledge_schemas.KnowledgeItem]])
+@router.get("/search", response_model=PageResponse[knowledge_schemas.KnowledgeSearchResult])
 async def search_knowledge(
     q: str = Query(..., description="搜索关键词"),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，传入时忽略 page"),
+    folder_id: Optional[int] = None,
+    include_subfolders: bool = Query(False, description="同时搜索 folder_id 的所有子文件夹"),
     db: Session = Depends(get_db)
 ):
-    knowledge_items = knowledge_crud.search_knowledge(
+    knowledge_items, next_cursor = knowledge_crud.search_knowledge(
         db, 
         query=q, 
         page=page, 
-        page_size=page_size
+        page_size=page_size,
+        cursor=cursor,
+        folder_id=folder_id,
+        include_subfolders=include_subfolders
+    )
+    return PageResponse(
+        data=knowledge_items,
+        next_cursor=next_cursor,
+        message=f"搜索到 {len(knowledge_items)} 个知识项"
     )
-    return ApiResponse(data=knowledge_items, message=f"搜索到 {len(knowledge_items)} 个知识项")
 
 
-@router.get("/by-tags", response_model=ApiResponse[List[knowledge_schemas.KnowledgeItem]])
+@router.get("/suggest", response_model=ApiResponse[List[knowledge_schemas.KnowledgeSuggestion]])
+async def suggest_knowledge(
+    q: str = Query(..., min_length=1, description="输入前缀，支持汉字、拼音和英文"),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    suggestions = suggest_service.suggest(db, q, limit=limit)
+    return ApiResponse(data=suggestions, message=f"获取到 {len(suggestions)} 条建议")
+
+
+@router.get("/by-tags", response_model=PageResponse[knowledge_schemas.KnowledgeItem])
 async def get_knowledge_by_tags(
     tag_ids: str = Query(..., description="标签ID，多个用逗号分隔"),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，传入时忽略 page"),
+    sort: str = Query("id", pattern="^(id|created_at|updated_at|title)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
     db: Session = Depends(get_db)
 ):
     try:
@@ -56,13 +95,98 @@ async def get_knowledge_by_tags(
     except ValueError:
         raise HTTPException(status_code=400, detail="标签ID格式错误")
     
-    knowledge_items = knowledge_crud.get_knowledge_by_tags(
+    knowledge_items, next_cursor = knowledge_crud.get_knowledge_by_tags(
         db, 
         tag_ids=tag_id_list, 
         page=page, 
-        page_size=page_size
+        page_size=page_size,
+        cursor=cursor,
+        sort=sort,
+        order=order
+    )
+    return PageResponse(
+        data=knowledge_items,
+        next_cursor=next_cursor,
+        message=f"获取到 {len(knowledge_items)} 个知识项"
+    )
+
+
+@router.get("/tag-query", response_model=knowledge_schemas.KnowledgeTagQueryPage)
+async def query_knowledge_by_tags(
+    q: str = Query(..., max_length=1000, description='标签表达式，如 (python AND asyncio) OR rust NOT draft'),
+    facets: bool = Query(True, description="第一页同时返回命中总数和各标签的分面计数"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，传入时忽略 page"),
+    sort: str = Query("id", pattern="^(id|created_at|updated_at|title)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    db: Session = Depends(get_db)
+):
+    try:
+        node = parse_tag_query(q)
+    except TagQueryError as e:
+        raise HTTPException(status_code=400, detail=f"标签表达式错误: {e}")
+
+    condition = knowledge_crud.tag_query_filter(db, node)
+    knowledge_items, next_cursor = knowledge_crud.get_knowledge_by_tag_query(
+        db, condition, page=page, page_size=page_size, cursor=cursor, sort=sort, order=order
     )
-    return ApiResponse(data=knowledge_items, message=f"获取到 {len(knowledge_items)} 个知识项")
+    total, tag_facets = None, []
+    if facets and not cursor:
+        total, tag_facets = knowledge_crud.get_tag_facets(db, condition)
+    return knowledge_schemas.KnowledgeTagQueryPage(
+        data=knowledge_items,
+        next_cursor=next_cursor,
+        total=total,
+        facets=[facet._asdict() for facet in tag_facets],
+        message=f"获取到 {len(knowledge_items)} 个知识项"
+    )
+
+
+def _check_tags(db: Session, tag_ids: List[int]):
+    missing = tag_crud.get_missing_tag_ids(db, tag_ids)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"标签不存在: {', '.join(map(str, missing))}")
+
+
+@router.post("/bulk/add-tags", response_model=ApiResponse[knowledge_schemas.KnowledgeBulkResult])
+async def bulk_add_tags(
+    request: knowledge_schemas.KnowledgeBulkTags,
+    db: Session = Depends(get_db)
+):
+    _check_tags(db, request.tag_ids)
+    result = knowledge_crud.bulk_add_tags(db, request.item_ids, request.tag_ids)
+    return ApiResponse(data=result, message=f"已为 {result.updated} 个知识项添加标签")
+
+
+@router.post("/bulk/remove-tags", response_model=ApiResponse[knowledge_schemas.KnowledgeBulkResult])
+async def bulk_remove_tags(
+    request: knowledge_schemas.KnowledgeBulkTags,
+    db: Session = Depends(get_db)
+):
+    _check_tags(db, request.tag_ids)
+    result = knowledge_crud.bulk_remove_tags(db, request.item_ids, request.tag_ids)
+    return ApiResponse(data=result, message=f"已为 {result.updated} 个知识项移除标签")
+
+
+@router.post("/bulk/move", response_model=ApiResponse[knowledge_schemas.KnowledgeBulkResult])
+async def bulk_move(
+    request: knowledge_schemas.KnowledgeBulkMove,
+    db: Session = Depends(get_db)
+):
+    if request.folder_id is not None and not folder_crud.get_folder(db, request.folder_id):
+        raise HTTPException(status_code=404, detail="文件夹不存在")
+    result = knowledge_crud.bulk_move(db, request.item_ids, request.folder_id)
+    return ApiResponse(data=result, message=f"已移动 {result.updated} 个知识项")
+
+
+@router.post("/bulk/delete", response_model=ApiResponse[knowledge_schemas.KnowledgeBulkResult])
+async def bulk_delete(
+    request: knowledge_schemas.KnowledgeBulkDelete,
+    db: Session = Depends(get_db)
+):
+    result = knowledge_crud.bulk_delete(db, request.item_ids)
+    return ApiResponse(data=result, message=f"已删除 {result.updated} 个知识项")
 
 
 @router.get("/{item_id}", response_model=ApiResponse[knowledge_schemas.KnowledgeItem])
@@ -1,29 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile, File
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional
 from pydantic import BaseModel
 
+from ...config import settings
 from ...database import get_db
 from ...crud import markdown as markdown_crud
 from ...crud import knowledge as knowledge_crud
+from ...crud import folder as folder_crud
+from ...crud import version as version_crud
 from ...schemas import markdown as markdown_schemas
-from ...schemas.common import ApiResponse
+from ...schemas.common import ApiResponse, PageResponse
+from ...services.executor import ExecutorBusyError
+from ...services.file_service import UPLOAD_CHUNK_SIZE, UploadTooLargeError, file_service
+from ...services.markdown_render import markdown_render_service
+from ...services.vault_import import vault_import_service
+from ...utils import compression
+from ...utils.http import RangeNotSatisfiableError, accepts_encoding, etag_matches, if_range_matches, parse_range
 
 router = APIRouter(prefix="/knowledge", tags=["markdown"])
 
+MARKDOWN_MEDIA_TYPE = "text/markdown; charset=utf-8"
+
+# 渲染出的 HTML 片段应插入页面使用，直接打开时也不执行任何脚本
+RENDERED_HTML_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Content-Security-Policy": "default-src 'none'; img-src * data:; style-src 'unsafe-inline'",
+    "X-Content-Type-Options": "nosniff"
+}
+
 
 class MarkdownContentUpdate(BaseModel):
     content: str
 
 
+async def _get_outline(db: Session, item_id: int):
+    db_markdown = markdown_crud.get_markdown_content_by_knowledge(db, item_id)
+    if not db_markdown:
+        raise HTTPException(status_code=404, detail="Markdown 内容不存在")
+    try:
+        return db_markdown.file_path, await markdown_render_service.ensure(db_markdown.file_path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Markdown 文件不存在")
+
+
+async def _prerender(file_path: str):
+    # 保存后立即渲染，打开笔记时直接读缓存；执行器繁忙时留到第一次请求时再渲染
+    try:
+        await markdown_render_service.ensure(file_path)
+    except ExecutorBusyError:
+        pass
+
+
 @router.get("/{item_id}/markdown", response_model=ApiResponse[markdown_schemas.MarkdownContentWithData])
 async def get_markdown_content(
     item_id: int,
     db: Session = Depends(get_db)
 ):
     # 检查知识项是否存在
-    knowledge_item = knowledge_crud.get_knowledge_item(db, item_id)
-    if not knowledge_item:
+    if not knowledge_crud.knowledge_item_exists(db, item_id):
         raise HTTPException(status_code=404, detail="知识项不存在")
     
     markdown_content = markdown_crud.get_markdown_content_with_data(db, item_id)
@@ -33,6 +71,166 @@ async def get_markdown_content(
     return ApiResponse(data=markdown_content, message="获取 Markdown 内容成功")
 
 
+@router.get("/{item_id}/markdown/raw")
+async def get_markdown_raw(
+    item_id: int,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """流式返回 Markdown 原文，支持 ETag / If-None-Match、单个字节范围的 Range 请求和 gzip 传输"""
+    db_markdown = markdown_crud.get_markdown_content_by_knowledge(db, item_id)
+    if not db_markdown:
+        raise HTTPException(status_code=404, detail="Markdown 内容不存在")
+    file_path = db_markdown.file_path
+    try:
+        stat = file_service.stat_markdown(file_path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Markdown 文件不存在")
+
+    # 压缩传输是另一种表示，ETag 不能与原文相同
+    gzip_etag = stat.etag[:-1] + '-gzip"'
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    byte_range = None
+    if if_range_matches(request.headers.get("if-range"), stat.etag):
+        try:
+            byte_range = parse_range(request.headers.get("range"), stat.size)
+        except RangeNotSatisfiableError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat.size}"})
+
+    use_gzip = (
+        byte_range is None
+        and stat.size >= settings.MARKDOWN_COMPRESSION_MIN_BYTES
+        and accepts_encoding(request.headers.get("accept-encoding"), "gzip")
+    )
+    headers["ETag"] = gzip_etag if use_gzip else stat.etag
+    if etag_matches(request.headers.get("if-none-match"), [stat.etag, gzip_etag]):
+        return Response(status_code=304, headers=headers)
+
+    if byte_range is not None:
+        start, end = byte_range
+        headers.update({"Content-Range": f"bytes {start}-{end}/{stat.size}", "Content-Length": str(end - start + 1)})
+        return StreamingResponse(
+            file_service.iter_markdown(file_path, start=start, length=end - start + 1),
+            status_code=206, media_type=MARKDOWN_MEDIA_TYPE, headers=headers
+        )
+
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        if stat.codec == "gzip":
+            # 以 gzip 存储的文件原样发送，不解压也不重新压缩
+            headers["Content-Length"] = str(stat.stored_size)
+            body = file_service.iter_stored(file_path)
+        else:
+            body = compression.gzip_blocks(file_service.iter_markdown(file_path))
+        return StreamingResponse(body, media_type=MARKDOWN_MEDIA_TYPE, headers=headers)
+
+    headers["Content-Length"] = str(stat.size)
+    return StreamingResponse(file_service.iter_markdown(file_path), media_type=MARKDOWN_MEDIA_TYPE, headers=headers)
+
+
+@router.get("/{item_id}/markdown/html")
+async def get_markdown_html(
+    item_id: int,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """渲染并清理过的 HTML 片段，标题带有与大纲一致的 id"""
+    _, outline = await _get_outline(db, item_id)
+    etag = f'"{outline["content_hash"]}-html"'
+    headers = {**RENDERED_HTML_HEADERS, "ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), [etag]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        markdown_render_service.html_path(outline), media_type="text/html; charset=utf-8", headers=headers
+    )
+
+
+@router.get("/{item_id}/markdown/outline", response_model=ApiResponse[markdown_schemas.MarkdownOutline])
+async def get_markdown_outline(
+    item_id: int,
+    db: Session = Depends(get_db)
+):
+    """标题大纲，读取按内容哈希缓存的结果，不读取正文"""
+    _, outline = await _get_outline(db, item_id)
+    return ApiResponse(data=outline, message=f"获取到 {len(outline['headings'])} 个标题")
+
+
+@router.get("/{item_id}/markdown/sections/{anchor}", response_model=ApiResponse[markdown_schemas.MarkdownSection])
+async def get_markdown_section(
+    item_id: int,
+    anchor: str,
+    db: Session = Depends(get_db)
+):
+    """按标题锚点返回该节的 Markdown 原文，只读取大纲中记录的字节范围"""
+    file_path, outline = await _get_outline(db, item_id)
+    heading = markdown_render_service.find_heading(outline, anchor)
+    if heading is None:
+        raise HTTPException(status_code=404, detail="标题不存在")
+    try:
+        data = b"".join(file_service.iter_markdown(
+            file_path, start=heading["start"], length=heading["end"] - heading["start"]
+        ))
+    except OSError:
+        raise HTTPException(status_code=404, detail="Markdown 文件不存在")
+    content = data.decode("utf-8", errors="replace")
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return ApiResponse(data={**heading, "content": content}, message="获取章节成功")
+
+
+@router.get("/{item_id}/markdown/versions", response_model=PageResponse[markdown_schemas.MarkdownVersion])
+async def list_markdown_versions(
+    item_id: int,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，传入时忽略 page"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    db: Session = Depends(get_db)
+):
+    if not knowledge_crud.knowledge_item_exists(db, item_id):
+        raise HTTPException(status_code=404, detail="知识项不存在")
+
+    versions, next_cursor = version_crud.get_versions(
+        db, item_id, page=page, page_size=page_size, cursor=cursor, order=order
+    )
+    return PageResponse(data=versions, next_cursor=next_cursor, message=f"获取到 {len(versions)} 个版本")
+
+
+@router.get("/{item_id}/markdown/versions/diff", response_model=ApiResponse[markdown_schemas.MarkdownVersionDiff])
+async def diff_markdown_versions(
+    item_id: int,
+    from_version: int = Query(..., ge=1),
+    to_version: int = Query(..., ge=1),
+    db: Session = Depends(get_db)
+):
+    try:
+        diff = version_crud.diff_versions(db, item_id, from_version, to_version)
+    except OSError:
+        raise HTTPException(status_code=404, detail="版本快照文件不存在")
+    if diff is None:
+        raise HTTPException(status_code=404, detail="版本不存在")
+    return ApiResponse(data=diff, message="比较版本成功")
+
+
+@router.get(
+    "/{item_id}/markdown/versions/{version}",
+    response_model=ApiResponse[markdown_schemas.MarkdownVersionWithContent]
+)
+async def get_markdown_version(
+    item_id: int,
+    version: int,
+    db: Session = Depends(get_db)
+):
+    try:
+        markdown_version = version_crud.get_version_with_content(db, item_id, version)
+    except OSError:
+        raise HTTPException(status_code=404, detail="版本快照文件不存在")
+    if not markdown_version:
+        raise HTTPException(status_code=404, detail="版本不存在")
+    return ApiResponse(data=markdown_version, message="获取版本成功")
+
+
 @router.put("/{item_id}/markdown", response_model=ApiResponse[markdown_schemas.MarkdownContent])
 async def update_markdown_content(
     item_id: int,
@@ -40,12 +238,12 @@ async def update_markdown_content(
     db: Session = Depends(get_db)
 ):
     # 检查知识项是否存在
-    knowledge_item = knowledge_crud.get_knowledge_item(db, item_id)
-    if not knowledge_item:
+    item_type = knowledge_crud.get_knowledge_item_type(db, item_id)
+    if item_type is None:
         raise HTTPException(status_code=404, detail="知识项不存在")
     
     # 检查是否为 Markdown 类型
-    if knowledge_item.type != "markdown":
+    if item_type != "markdown":
         raise HTTPException(status_code=400, detail="该知识项不是 Markdown 类型")
     
     # 检查是否已有 Markdown 内容
@@ -56,6 +254,7 @@ async def update_markdown_content(
     else:
         # 创建新内容
         markdown_content = markdown_crud.create_markdown_content(db, item_id, markdown_data.content)
+    await _prerender(markdown_content.file_path)
     
     return ApiResponse(data=markdown_content, message="更新 Markdown 内容成功")
 
@@ -67,25 +266,54 @@ async def upload_markdown_file(
     db: Session = Depends(get_db)
 ):
     # 检查知识项是否存在
-    knowledge_item = knowledge_crud.get_knowledge_item(db, item_id)
-    if not knowledge_item:
+    item_type = knowledge_crud.get_knowledge_item_type(db, item_id)
+    if item_type is None:
         raise HTTPException(status_code=404, detail="知识项不存在")
     
     # 检查是否为 Markdown 类型
-    if knowledge_item.type != "markdown":
+    if item_type != "markdown":
         raise HTTPException(status_code=400, detail="该知识项不是 Markdown 类型")
     
-    # 读取文件内容
-    content = await file.read()
-    content = content.decode("utf-8")
-    
-    # 检查是否已有 Markdown 内容
-    existing_content = markdown_crud.get_markdown_content_by_knowledge(db, item_id)
-    if existing_content:
-        # 更新现有内容
-        markdown_content = markdown_crud.update_markdown_content(db, item_id, content)
-    else:
-        # 创建新内容
-        markdown_content = markdown_crud.create_markdown_content(db, item_id, content)
+    # 分块写入临时文件，边写边校验 UTF-8 和大小，完成后原子地换入 blob 存储；
+    # 写入、压缩和 fsync 都在线程中执行，不阻塞事件循环
+    upload = file_service.start_markdown_upload(settings.MARKDOWN_MAX_UPLOAD_BYTES)
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await asyncio.to_thread(upload.write, chunk)
+        file_path = await asyncio.to_thread(upload.commit)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        upload.discard()
     
+    markdown_content = markdown_crud.replace_markdown_file(db, item_id, file_path)
+    await _prerender(file_path)
     return ApiResponse(data=markdown_content, message="上传 Markdown 文件成功")
+
+
+@router.post("/markdown/import", response_model=ApiResponse[markdown_schemas.MarkdownImportJob])
+async def import_markdown_vault(
+    file: UploadFile = File(..., description="笔记库压缩包（zip），目录结构映射为文件夹"),
+    folder_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    if folder_id is not None and not folder_crud.get_folder(db, folder_id):
+        raise HTTPException(status_code=404, detail="文件夹不存在")
+    
+    try:
+        source = await vault_import_service.save_upload(file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    job = vault_import_service.start(source, folder_id)
+    return ApiResponse(data=job, message="已创建导入任务")
+
+
+@router.get("/markdown/import/{job_id}", response_model=ApiResponse[markdown_schemas.MarkdownImportJob])
+async def get_markdown_import_job(job_id: str):
+    job = vault_import_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导入任务不存在")
+    return ApiResponse(data=job, message="获取导入任务成功")
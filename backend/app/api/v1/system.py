@@ -0,0 +1,42 @@
+from datetime import datetime
+from typing import Dict
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+from ...schemas.common import ApiResponse
+from ...services.executor import cpu_executor
+from ...services.export_service import export_service
+from ...services.file_service import file_service
+from ...services.refresh_scheduler import refresh_scheduler
+
+router = APIRouter(prefix="/system", tags=["system"])
+
+EXPORT_MEDIA_TYPES = {
+    "zip": "application/zip",
+    "ndjson": "application/x-ndjson"
+}
+
+
+@router.get("/metrics", response_model=ApiResponse[Dict])
+async def get_metrics():
+    metrics = {
+        "executor": cpu_executor.snapshot(),
+        "refresh": refresh_scheduler.snapshot(),
+        "markdown_cache": file_service.cache.snapshot() if file_service.cache is not None else None
+    }
+    return ApiResponse(data=metrics, message="获取运行指标成功")
+
+
+@router.get("/export")
+def export_knowledge_base(
+    format: str = Query("zip", pattern="^(zip|ndjson)$", description="zip 含 Markdown 原文件；ndjson 为单个文本流")
+):
+    """流式导出整个知识库：文件夹、标签、知识项、网页元数据、学习记录和 Markdown 正文"""
+    filename = f"study-one-export-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    # 同步生成器由 Starlette 放到线程池中迭代，不指定长度，以分块传输发送
+    return StreamingResponse(
+        export_service.iter_export(format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -1,23 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from ...database import get_db
 from ...crud import tag as tag_crud
 from ...schemas import tag as tag_schemas
-from ...schemas.common import ApiResponse
+from ...schemas.common import ApiResponse, PageResponse
 
 router = APIRouter(prefix="/tags", tags=["tags"])
 
 
-@router.get("", response_model=ApiResponse[List[tag_schemas.Tag]])
+@router.get("", response_model=PageResponse[tag_schemas.Tag])
 async def get_tags(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，传入时忽略 page"),
+    sort: str = Query("id", pattern="^(id|created_at|name)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
     db: Session = Depends(get_db)
 ):
-    tags = tag_crud.get_tags(db, page=page, page_size=page_size)
-    return ApiResponse(data=tags, message=f"获取到 {len(tags)} 个标签")
+    tags, next_cursor = tag_crud.get_tags(
+        db, page=page, page_size=page_size, cursor=cursor, sort=sort, order=order
+    )
+    return PageResponse(data=tags, next_cursor=next_cursor, message=f"获取到 {len(tags)} 个标签")
 
 
 @router.get("/{tag_id}", response_model=ApiResponse[tag_schemas.Tag])
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import Dict
+from urllib.parse import urlsplit
 from pydantic import BaseModel
 
 from ...database import get_db
@@ -8,6 +9,9 @@ from ...crud import webpage as webpage_crud
 from ...crud import knowledge as knowledge_crud
 from ...schemas import webpage as webpage_schemas
 from ...schemas.common import ApiResponse
+from ...config import settings
+from ...services.crawl_service import crawl_service
+from ...utils.url import canonical_url
 
 router = APIRouter(prefix="/knowledge", tags=["webpage"])
 
@@ -18,8 +22,7 @@ async def get_webpage_content(
     db: Session = Depends(get_db)
 ):
     # 检查知识项是否存在
-    knowledge_item = knowledge_crud.get_knowledge_item(db, item_id)
-    if not knowledge_item:
+    if not knowledge_crud.knowledge_item_exists(db, item_id):
         raise HTTPException(status_code=404, detail="知识项不存在")
     
     webpage_content = webpage_crud.get_webpage_content_by_knowledge(db, item_id)
@@ -36,14 +39,19 @@ async def create_webpage_content(
     db: Session = Depends(get_db)
 ):
     # 检查知识项是否存在
-    knowledge_item = knowledge_crud.get_knowledge_item(db, item_id)
-    if not knowledge_item:
+    item_type = knowledge_crud.get_knowledge_item_type(db, item_id)
+    if item_type is None:
         raise HTTPException(status_code=404, detail="知识项不存在")
     
     # 检查是否为网页类型
-    if knowledge_item.type != "webpage":
+    if item_type != "webpage":
         raise HTTPException(status_code=400, detail="该知识项不是网页类型")
     
+    # 同一网址只能保存在一个知识项中
+    saved_webpage = webpage_crud.get_webpage_by_url(db, webpage_data.url)
+    if saved_webpage and saved_webpage.knowledge_item_id != item_id:
+        raise HTTPException(status_code=409, detail=f"该网址已保存在知识项 {saved_webpage.knowledge_item_id} 中")
+    
     # 检查是否已有网页内容
     existing_content = webpage_crud.get_webpage_content_by_knowledge(db, item_id)
     if existing_content:
@@ -73,8 +81,24 @@ async def fetch_webpage(
     fetch_request: webpage_schemas.WebpageFetchRequest,
     db: Session = Depends(get_db)
 ):
+    # 已保存过的网址直接返回保存的内容，不再抓取
+    saved_webpage = webpage_crud.get_webpage_by_url(db, fetch_request.url)
+    if saved_webpage:
+        return ApiResponse(
+            data={
+                "url": saved_webpage.url,
+                "title": saved_webpage.title,
+                "description": saved_webpage.description,
+                "summary": saved_webpage.summary,
+                "keywords": saved_webpage.keywords,
+                "knowledge_item_id": saved_webpage.knowledge_item_id,
+                "fetched_at": saved_webpage.fetched_at
+            },
+            message="该网址已保存，返回已保存的内容"
+        )
+    
     # 抓取网页内容
-    webpage_data = webpage_crud.fetch_webpage(db, fetch_request.url)
+    webpage_data = await webpage_crud.fetch_webpage(db, fetch_request.url)
     
     if "error" in webpage_data:
         return ApiResponse(
@@ -86,6 +110,70 @@ async def fetch_webpage(
     return ApiResponse(data=webpage_data, message="抓取网页成功")
 
 
+@router.post("/webpage/import", response_model=ApiResponse[webpage_schemas.WebpageImportJob])
+async def import_webpages(
+    import_request: webpage_schemas.WebpageImportRequest,
+    db: Session = Depends(get_db)
+):
+    if len(import_request.urls) > settings.CRAWL_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"单次最多导入 {settings.CRAWL_MAX_URLS} 个网址")
+    
+    # 按规范 URL 去重，过滤非 http(s) 和无法解析的网址
+    candidates = {}
+    rejected = []
+    for url in (url.strip() for url in import_request.urls):
+        if not url:
+            continue
+        try:
+            parts = urlsplit(url)
+            # 端口超出范围时访问 port 才会报错
+            parts.port
+        except ValueError:
+            rejected.append(url)
+            continue
+        if parts.scheme in ("http", "https") and parts.netloc:
+            candidates.setdefault(canonical_url(url), url)
+        else:
+            rejected.append(url)
+    
+    # 已保存过的网址复用现有记录，不再重复抓取
+    saved = webpage_crud.get_webpages_by_canonical_urls(db, list(candidates))
+    urls = [url for key, url in candidates.items() if key not in saved]
+    existing = [
+        {"url": candidates[key], "knowledge_item_id": webpage.knowledge_item_id}
+        for key, webpage in saved.items()
+    ]
+    
+    targets = webpage_crud.create_webpage_items(db, urls, folder_id=import_request.folder_id)
+    job = crawl_service.start(targets)
+    job.rejected = rejected
+    job.existing = existing
+    return ApiResponse(
+        data=job,
+        message=f"已创建导入任务，共 {len(urls)} 个网址，{len(existing)} 个已保存"
+    )
+
+
+@router.get("/webpage/lookup", response_model=ApiResponse[webpage_schemas.WebpageContent])
+async def lookup_webpage(
+    url: str,
+    db: Session = Depends(get_db)
+):
+    # 按规范 URL 判断网址是否已经保存
+    webpage_content = webpage_crud.get_webpage_by_url(db, url)
+    if not webpage_content:
+        return ApiResponse(data=None, message="该网址尚未保存")
+    return ApiResponse(data=webpage_content, message="该网址已保存")
+
+
+@router.get("/webpage/import/{job_id}", response_model=ApiResponse[webpage_schemas.WebpageImportJob])
+async def get_import_job(job_id: str):
+    job = crawl_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导入任务不存在")
+    return ApiResponse(data=job, message="获取导入任务成功")
+
+
 class WebpageFetchUpdate(BaseModel):
     url: str
 
@@ -97,16 +185,21 @@ async def fetch_and_update_webpage(
     db: Session = Depends(get_db)
 ):
     # 检查知识项是否存在
-    knowledge_item = knowledge_crud.get_knowledge_item(db, item_id)
-    if not knowledge_item:
+    item_type = knowledge_crud.get_knowledge_item_type(db, item_id)
+    if item_type is None:
         raise HTTPException(status_code=404, detail="知识项不存在")
     
     # 检查是否为网页类型
-    if knowledge_item.type != "webpage":
+    if item_type != "webpage":
         raise HTTPException(status_code=400, detail="该知识项不是网页类型")
     
+    # 同一网址只能保存在一个知识项中
+    saved_webpage = webpage_crud.get_webpage_by_url(db, fetch_data.url)
+    if saved_webpage and saved_webpage.knowledge_item_id != item_id:
+        raise HTTPException(status_code=409, detail=f"该网址已保存在知识项 {saved_webpage.knowledge_item_id} 中")
+    
     # 抓取网页并更新内容
-    webpage_content = webpage_crud.create_or_update_webpage_content(db, item_id, fetch_data.url)
+    webpage_content = await webpage_crud.create_or_update_webpage_content(db, item_id, fetch_data.url)
     
     if not webpage_content:
         raise HTTPException(status_code=500, detail="抓取网页失败")
@@ -0,0 +1,256 @@
+"""维护命令
+
+用法（在 backend 目录下）：
+    python -m app.cli dedup-webpages [--dry-run]
+    python -m app.cli rebuild-folder-paths
+    python -m app.cli import-vault PATH [--folder-id ID]
+    python -m app.cli export OUTPUT [--format zip|ndjson]
+    python -m app.cli migrate-markdown-blobs
+    python -m app.cli gc-blobs [--grace-seconds N]
+    python -m app.cli compact-versions [--days N]
+    python -m app.cli gc-attachments [--grace-seconds N]
+    python -m app.cli compress-markdown [--codec none|gzip|zstd]
+    python -m app.cli bench-compression [--sample N] [--repeat N]
+"""
+import argparse
+import itertools
+import sys
+import tempfile
+import time
+
+from .config import settings
+from .database import Base, SessionLocal, engine, migrate_schema
+from . import models  # noqa: F401  注册所有表
+from .crud import attachment as attachment_crud
+from .crud import blob as blob_crud
+from .crud import folder as folder_crud
+from .crud import version as version_crud
+from .crud import webpage as webpage_crud
+from .services.export_service import export_service
+from .services.file_service import FileService, file_service
+from .services.search_service import search_service
+from .services.vault_import import VaultImportJob, open_source, vault_import_service
+from .utils import compression
+
+
+def dedup_webpages(args):
+    db = SessionLocal()
+    try:
+        groups = webpage_crud.find_duplicate_webpages(db)
+        merged = 0
+        for group in groups:
+            ids = [webpage.knowledge_item_id for webpage in group]
+            print(f"{group[0].url}: 保留知识项 {ids[0]}，合并 {ids[1:]}")
+            if not args.dry_run:
+                webpage_crud.merge_duplicate_webpages(db, group)
+            merged += len(group) - 1
+
+        if not args.dry_run:
+            webpage_crud.backfill_canonical_urls(db)
+        action = "将合并" if args.dry_run else "已合并"
+        print(f"共 {len(groups)} 组重复网址，{action} {merged} 个知识项")
+    finally:
+        db.close()
+
+
+def rebuild_folder_paths(args):
+    db = SessionLocal()
+    try:
+        updated = folder_crud.rebuild_folder_paths(db, only_missing=False)
+        print(f"已更新 {updated} 个文件夹的路径")
+    finally:
+        db.close()
+
+
+def import_vault(args):
+    try:
+        source = open_source(args.path)
+    except ValueError as e:
+        sys.exit(str(e))
+    job = VaultImportJob(source.name, args.folder_id)
+
+    def progress(job):
+        print(
+            f"\r已扫描 {job.discovered}，导入 {job.imported}，跳过 {job.skipped}，失败 {job.failed}，"
+            f"{job.files_per_second or 0} 个/秒",
+            end="", flush=True
+        )
+
+    vault_import_service.run(job, source, progress=progress)
+    print()
+    for error in job.errors:
+        print(f"失败: {error.get('path', '')} {error['error']}")
+    print(
+        f"{job.status}: 导入 {job.imported} 个文件（{job.bytes / 1024 / 1024:.1f} MB），跳过已导入的 {job.skipped} 个，"
+        f"失败 {job.failed} 个，用时 {job.elapsed or 0:.1f} 秒，{job.files_per_second or 0} 个/秒，"
+        f"{job.megabytes_per_second or 0} MB/秒"
+    )
+
+
+def export(args):
+    export_format = args.format or ("ndjson" if args.output.endswith(".ndjson") else "zip")
+    size = 0
+    with open(args.output, "wb") as f:
+        for chunk in export_service.iter_export(export_format):
+            f.write(chunk)
+            size += len(chunk)
+            print(f"\r已写出 {size / 1024 / 1024:.1f} MB", end="", flush=True)
+    print()
+    print(f"已导出到 {args.output}")
+
+
+def migrate_markdown_blobs(args):
+    db = SessionLocal()
+    try:
+        migrated = blob_crud.migrate_legacy_files(db)
+        print(f"已将 {migrated} 个旧 Markdown 文件转存为 blob")
+    finally:
+        db.close()
+
+
+def gc_blobs(args):
+    db = SessionLocal()
+    try:
+        result = blob_crud.collect_garbage(db, args.grace_seconds)
+        print(f"已删除 {result['blobs']} 个无引用的 blob、{result['records']} 条失效记录、{result['temp_files']} 个临时文件")
+    finally:
+        db.close()
+
+
+def gc_attachments(args):
+    db = SessionLocal()
+    try:
+        result = attachment_crud.collect_garbage(db, args.grace_seconds)
+        print(f"已清理 {result['uploads']} 个过期上传、{result['parts']} 个残留的组装文件、{result['files']} 个无引用的附件文件")
+    finally:
+        db.close()
+
+
+def compact_versions(args):
+    db = SessionLocal()
+    try:
+        result = version_crud.compact_versions(db, args.days)
+        print(f"已合并 {result['items']} 个知识项的历史，删除 {result['versions']} 个版本，{result['failed']} 个知识项因快照缺失跳过")
+    finally:
+        db.close()
+
+
+def compress_markdown(args):
+    codec = args.codec or file_service.compression
+    try:
+        compression.check_codec(codec)
+    except (ValueError, RuntimeError) as e:
+        sys.exit(str(e))
+    files = converted = before = after = 0
+    for path in file_service.iter_markdown_files():
+        old_size, new_size = file_service.recompress(path, codec)
+        files += 1
+        converted += old_size != new_size
+        before += old_size
+        after += new_size
+    print(f"共 {files} 个文件，转换 {converted} 个，占用 {before / 1024 / 1024:.1f} MB -> {after / 1024 / 1024:.1f} MB")
+
+
+def bench_compression(args):
+    """用已有笔记的样本比较各压缩方式的磁盘占用和读取延迟（不经过读缓存）"""
+    contents = []
+    for path in itertools.islice(file_service.iter_markdown_files(), args.sample):
+        try:
+            contents.append(compression.decompress(path.read_bytes()).decode("utf-8"))
+        except (OSError, UnicodeDecodeError):
+            continue
+    if not contents:
+        sys.exit("没有可用的 Markdown 文件")
+    raw = sum(len(content.encode("utf-8")) for content in contents)
+    print(f"样本 {len(contents)} 个文件，原始大小 {raw / 1024 / 1024:.2f} MB，压缩阈值 {settings.MARKDOWN_COMPRESSION_MIN_BYTES} 字节")
+
+    for codec in compression.available_codecs():
+        with tempfile.TemporaryDirectory() as tmp:
+            bench = FileService(tmp)
+            bench.cache = None
+            bench.compression = codec
+            started = time.perf_counter()
+            paths = [bench.save_markdown(content) for content in contents]
+            write_ms = (time.perf_counter() - started) * 1000 / len(paths)
+
+            size = allocated = 0
+            for path in paths:
+                stat = bench.get_full_path(path).stat()
+                size += stat.st_size
+                allocated += stat.st_blocks * 512
+
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                for path in paths:
+                    bench.read_markdown(path)
+            read_us = (time.perf_counter() - started) * 1e6 / (len(paths) * args.repeat)
+        print(
+            f"{codec:5} 文件 {size / 1024 / 1024:8.2f} MB（{raw / size:.2f}x），磁盘占用 {allocated / 1024 / 1024:8.2f} MB，"
+            f"平均读取 {read_us:8.1f} µs，平均写入 {write_ms:6.2f} ms"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="study-one 维护命令")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    dedup = subparsers.add_parser("dedup-webpages", help="按规范 URL 合并重复保存的网页")
+    dedup.add_argument("--dry-run", action="store_true", help="只列出重复项，不修改数据")
+    dedup.set_defaults(func=dedup_webpages)
+
+    rebuild = subparsers.add_parser("rebuild-folder-paths", help="按 parent_id 重新计算所有文件夹的物化路径")
+    rebuild.set_defaults(func=rebuild_folder_paths)
+
+    vault = subparsers.add_parser("import-vault", help="导入 Obsidian / Typora 等笔记目录或 zip 压缩包，中断后重新执行会跳过已导入的文件")
+    vault.add_argument("path", help="笔记目录或 zip 文件")
+    vault.add_argument("--folder-id", type=int, default=None, help="导入到该文件夹下，默认导入到根目录")
+    vault.set_defaults(func=import_vault)
+
+    export_parser = subparsers.add_parser("export", help="流式导出整个知识库")
+    export_parser.add_argument("output", help="输出文件路径")
+    export_parser.add_argument("--format", choices=["zip", "ndjson"], default=None, help="默认按扩展名判断，其余为 zip")
+    export_parser.set_defaults(func=export)
+
+    migrate = subparsers.add_parser("migrate-markdown-blobs", help="把旧的 uuid 命名的 Markdown 文件转存到内容寻址存储")
+    migrate.set_defaults(func=migrate_markdown_blobs)
+
+    gc = subparsers.add_parser("gc-blobs", help="删除没有被引用的 Markdown blob")
+    gc.add_argument(
+        "--grace-seconds", type=int, default=blob_crud.GC_GRACE_SECONDS,
+        help="最近这段时间内写入或复用过的 blob 不删除，默认 %(default)s 秒"
+    )
+    gc.set_defaults(func=gc_blobs)
+
+    gc_attachments_parser = subparsers.add_parser("gc-attachments", help="清理过期的分块上传和没有被引用的附件文件")
+    gc_attachments_parser.add_argument(
+        "--grace-seconds", type=int, default=blob_crud.GC_GRACE_SECONDS,
+        help="最近这段时间内写入或复用过的文件不删除，默认 %(default)s 秒"
+    )
+    gc_attachments_parser.set_defaults(func=gc_attachments)
+
+    compact = subparsers.add_parser("compact-versions", help="合并旧的 Markdown 历史版本，超过天数的每天只保留最后一个")
+    compact.add_argument(
+        "--days", type=int, default=settings.MARKDOWN_VERSION_COMPACT_AFTER_DAYS,
+        help="早于这么多天的版本参与合并，默认 %(default)s 天"
+    )
+    compact.set_defaults(func=compact_versions)
+
+    compress = subparsers.add_parser("compress-markdown", help="把已有的 Markdown 文件原地转换为指定的压缩方式")
+    compress.add_argument("--codec", choices=compression.CODECS, default=None, help="默认使用 MARKDOWN_COMPRESSION")
+    compress.set_defaults(func=compress_markdown)
+
+    bench = subparsers.add_parser("bench-compression", help="比较各压缩方式的磁盘占用和读取延迟")
+    bench.add_argument("--sample", type=int, default=2000, help="参与测试的文件数")
+    bench.add_argument("--repeat", type=int, default=5, help="每个文件读取的次数")
+    bench.set_defaults(func=bench_compression)
+
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    migrate_schema(engine)
+    search_service.init_index(engine)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
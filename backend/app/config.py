@@ -11,6 +11,55 @@ class Settings(BaseSettings):
     DATA_DIR: str = "./data"
     UPLOAD_DIR: str = "./data/uploads"
 
+    FETCH_TIMEOUT: float = 10.0
+    FETCH_MAX_CONNECTIONS: int = 100
+    FETCH_MAX_CONNECTIONS_PER_HOST: int = 4
+    FETCH_KEEPALIVE_EXPIRY: float = 30.0
+    FETCH_MAX_BYTES: int = 5 * 1024 * 1024
+    FETCH_CACHE_ENABLED: bool = True
+    EXTRACT_MAX_BYTES: int = 2 * 1024 * 1024
+
+    EXECUTOR_MODE: str = "process"
+    EXECUTOR_WORKERS: int = 0
+    EXECUTOR_MAX_PENDING: int = 64
+
+    CRAWL_CONCURRENCY: int = 16
+    CRAWL_MAX_RETRIES: int = 3
+    CRAWL_RETRY_BACKOFF: float = 1.0
+    CRAWL_BATCH_SIZE: int = 50
+    CRAWL_FLUSH_INTERVAL: float = 5.0
+    CRAWL_MAX_URLS: int = 10000
+
+    JOB_RETENTION_SECONDS: int = 3600
+    JOB_MAX_FINISHED: int = 100
+
+    IMPORT_BATCH_SIZE: int = 200
+    IMPORT_READ_WORKERS: int = 8
+    IMPORT_MAX_FILE_BYTES: int = 10 * 1024 * 1024
+    IMPORT_MAX_ZIP_BYTES: int = 2 * 1024 * 1024 * 1024
+
+    MARKDOWN_CACHE_BYTES: int = 64 * 1024 * 1024
+    MARKDOWN_CACHE_MAX_ENTRY_BYTES: int = 4 * 1024 * 1024
+    MARKDOWN_COMPRESSION: str = "none"
+    MARKDOWN_COMPRESSION_MIN_BYTES: int = 4096
+    MARKDOWN_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    MARKDOWN_VERSION_SNAPSHOT_INTERVAL: int = 20
+    MARKDOWN_VERSION_COMPACT_AFTER_DAYS: int = 30
+
+    SUGGEST_REFRESH_INTERVAL: float = 2.0
+
+    ATTACHMENT_MAX_BYTES: int = 1024 * 1024 * 1024
+    ATTACHMENT_CHUNK_SIZE: int = 8 * 1024 * 1024
+    ATTACHMENT_UPLOAD_EXPIRE_SECONDS: int = 7 * 86400
+
+    REFRESH_ENABLED: bool = False
+    REFRESH_RATE_PER_MINUTE: float = 30.0
+    REFRESH_CONCURRENCY: int = 4
+    REFRESH_MIN_INTERVAL: int = 3600
+    REFRESH_DEFAULT_INTERVAL: int = 86400
+    REFRESH_MAX_INTERVAL: int = 30 * 86400
+    REFRESH_RESYNC_INTERVAL: float = 600.0
+
     HOST: str = "127.0.0.1"
     PORT: int = 8000
 
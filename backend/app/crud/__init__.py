@@ -1,15 +1,21 @@
 from . import folder
 from . import tag
 from . import knowledge
+from . import blob
+from . import version
 from . import markdown
 from . import webpage
 from . import learning
+from . import attachment
 
 __all__ = [
     "folder",
     "tag",
     "knowledge",
+    "blob",
+    "version",
     "markdown",
     "webpage",
-    "learning"
+    "learning",
+    "attachment"
 ]
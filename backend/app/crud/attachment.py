@@ -0,0 +1,228 @@
+import mimetypes
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import PurePath
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import Attachment, AttachmentUpload, AttachmentUploadChunk
+from ..services.file_service import file_service
+from ..utils.pagination import keyset_paginate
+from .blob import BATCH_SIZE, GC_GRACE_SECONDS
+
+
+SORT_COLUMNS = {
+    "id": Attachment.id
+}
+
+
+def _insert_ignore(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(AttachmentUploadChunk).on_conflict_do_nothing()
+
+
+def clean_filename(filename: str) -> str:
+    # 只保留文件名部分，去掉客户端带上的路径
+    name = PurePath(filename.replace("\\", "/")).name.strip()
+    return name[:255] or "attachment"
+
+
+def guess_content_type(filename: str, content_type: Optional[str] = None) -> str:
+    if content_type and "/" in content_type:
+        return content_type[:100]
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def chunk_count(size: int, chunk_size: int) -> int:
+    return -(-size // chunk_size)
+
+
+def chunk_range(upload: AttachmentUpload, index: int) -> Tuple[int, int]:
+    """分块在文件中的 (偏移, 长度)，最后一块可能不足 chunk_size"""
+    offset = index * upload.chunk_size
+    return offset, min(upload.chunk_size, upload.size - offset)
+
+
+def get_attachment(db: Session, attachment_id: int) -> Optional[Attachment]:
+    return db.query(Attachment).filter(Attachment.id == attachment_id).first()
+
+
+def get_attachments_by_knowledge(
+    db: Session,
+    knowledge_id: int,
+    page: int = 1,
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    order: str = "asc"
+) -> Tuple[List[Attachment], Optional[str]]:
+    query = db.query(Attachment).filter(Attachment.knowledge_item_id == knowledge_id)
+    return keyset_paginate(
+        query, SORT_COLUMNS, Attachment.id,
+        sort="id", order=order, cursor=cursor, limit=page_size, page=page
+    )
+
+
+def delete_attachment(db: Session, attachment_id: int) -> Optional[Attachment]:
+    # 文件可能被其它附件共用，没有引用后由 gc 删除
+    db_attachment = get_attachment(db, attachment_id)
+    if not db_attachment:
+        return None
+    db.delete(db_attachment)
+    db.commit()
+    return db_attachment
+
+
+def create_upload(
+    db: Session,
+    knowledge_id: int,
+    filename: str,
+    size: int,
+    content_type: Optional[str] = None,
+    sha256: Optional[str] = None
+) -> AttachmentUpload:
+    """开始一次分块上传；sha256 只用于完成时校验
+
+    即使同样内容的附件已经存在也要完整上传一遍：只凭哈希就能引用已有文件，等于让不持有内容的客户端
+    取得别的知识项的附件。去重发生在 complete 中，文件已存在时丢弃组装文件，复用已有的那份。
+    """
+    filename = clean_filename(filename)
+    db_upload = AttachmentUpload(
+        id=uuid.uuid4().hex,
+        knowledge_item_id=knowledge_id,
+        filename=filename,
+        content_type=guess_content_type(filename, content_type),
+        size=size,
+        chunk_size=settings.ATTACHMENT_CHUNK_SIZE,
+        sha256=sha256.lower() if sha256 else None
+    )
+    file_service.create_upload_part(db_upload.id, size)
+    db.add(db_upload)
+    db.commit()
+    db.refresh(db_upload)
+    return db_upload
+
+
+def get_upload(db: Session, upload_id: str) -> Optional[AttachmentUpload]:
+    return db.query(AttachmentUpload).filter(AttachmentUpload.id == upload_id).first()
+
+
+def get_received_chunks(db: Session, upload_id: str) -> List[int]:
+    return list(db.execute(
+        select(AttachmentUploadChunk.chunk_index).where(
+            AttachmentUploadChunk.upload_id == upload_id
+        ).order_by(AttachmentUploadChunk.chunk_index)
+    ).scalars())
+
+
+def mark_chunk_received(db: Session, upload_id: str, index: int):
+    # 同一块重复上传时覆盖写入文件，记录只保留一条
+    db.execute(_insert_ignore(db), [{"upload_id": upload_id, "chunk_index": index}])
+    db.query(AttachmentUpload).filter(AttachmentUpload.id == upload_id).update(
+        {"updated_at": func.now()}, synchronize_session=False
+    )
+    db.commit()
+
+
+def get_missing_chunks(db: Session, upload: AttachmentUpload) -> List[int]:
+    received = set(get_received_chunks(db, upload.id))
+    return [index for index in range(chunk_count(upload.size, upload.chunk_size)) if index not in received]
+
+
+def _delete_upload_rows(db: Session, upload_ids: List[str]):
+    db.query(AttachmentUploadChunk).filter(
+        AttachmentUploadChunk.upload_id.in_(upload_ids)
+    ).delete(synchronize_session=False)
+    db.query(AttachmentUpload).filter(AttachmentUpload.id.in_(upload_ids)).delete(synchronize_session=False)
+
+
+def complete_upload(db: Session, upload: AttachmentUpload, digest: str) -> Attachment:
+    """组装文件已经按哈希移入附件目录后，新建附件并删除上传记录"""
+    db_attachment = Attachment(
+        knowledge_item_id=upload.knowledge_item_id,
+        filename=upload.filename,
+        content_type=upload.content_type,
+        size=upload.size,
+        hash=digest
+    )
+    db.add(db_attachment)
+    _delete_upload_rows(db, [upload.id])
+    db.commit()
+    db.refresh(db_attachment)
+    return db_attachment
+
+
+def delete_upload(db: Session, upload_id: str):
+    _delete_upload_rows(db, [upload_id])
+    db.commit()
+    file_service.delete_upload_part(upload_id)
+
+
+def delete_uploads_by_knowledge(db: Session, item_ids: List[int]) -> List[str]:
+    """删除知识项进行中的上传记录，返回上传 id，由调用方在提交后删除组装文件"""
+    upload_ids = list(db.execute(
+        select(AttachmentUpload.id).where(AttachmentUpload.knowledge_item_id.in_(item_ids))
+    ).scalars())
+    if upload_ids:
+        _delete_upload_rows(db, upload_ids)
+    return upload_ids
+
+
+def collect_garbage(db: Session, grace_seconds: int = GC_GRACE_SECONDS) -> Dict[str, int]:
+    """清理过期的上传和没有被引用的附件文件"""
+    expired_before = datetime.utcnow() - timedelta(seconds=settings.ATTACHMENT_UPLOAD_EXPIRE_SECONDS)
+    expired = list(db.execute(
+        select(AttachmentUpload.id).where(AttachmentUpload.updated_at < expired_before)
+    ).scalars())
+    for start in range(0, len(expired), BATCH_SIZE):
+        _delete_upload_rows(db, expired[start:start + BATCH_SIZE])
+    db.commit()
+    for upload_id in expired:
+        file_service.delete_upload_part(upload_id)
+
+    # 进程崩溃等原因留下的没有上传记录的组装文件
+    cutoff = time.time() - grace_seconds
+    live_uploads = set(db.execute(select(AttachmentUpload.id)).scalars())
+    db.rollback()
+    orphan_parts = 0
+    for path in file_service.uploads_dir.glob("*.part"):
+        if path.stem not in live_uploads and path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+            orphan_parts += 1
+
+    removed = 0
+    batch = []
+    for attachment in file_service.iter_attachments():
+        batch.append(attachment)
+        if len(batch) >= BATCH_SIZE:
+            removed += _collect_batch(db, batch, cutoff)
+            batch = []
+    if batch:
+        removed += _collect_batch(db, batch, cutoff)
+    return {"uploads": len(expired), "parts": orphan_parts, "files": removed}
+
+
+def _collect_batch(db: Session, batch, cutoff: float) -> int:
+    live = set(db.execute(
+        select(Attachment.hash).where(Attachment.hash.in_([digest for digest, _ in batch]))
+    ).scalars())
+    db.rollback()
+    removed = 0
+    for digest, path in batch:
+        if digest in live:
+            continue
+        # 宽限期内写入或复用过的文件可能属于尚未提交的附件
+        try:
+            if path.stat().st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        path.unlink(missing_ok=True)
+        removed += 1
+    return removed
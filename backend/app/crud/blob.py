@@ -0,0 +1,169 @@
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+
+from ..models import MarkdownBlob, MarkdownContent, MarkdownVersion
+from ..services.file_service import file_service
+from ..utils import compression
+from .loading import row_exists
+
+
+# 新写入或刚被复用的 blob 在这段时间内不会被 gc，留给尚未提交的事务登记引用
+GC_GRACE_SECONDS = 3600
+
+BATCH_SIZE = 500
+
+
+def _upsert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(MarkdownBlob)
+    return stmt.on_conflict_do_update(
+        index_elements=[MarkdownBlob.hash],
+        set_={"ref_count": MarkdownBlob.ref_count + stmt.excluded.ref_count}
+    )
+
+
+def _count_hashes(file_paths: List[str]) -> Counter:
+    return Counter(
+        digest for digest in (file_service.blob_hash(file_path) for file_path in file_paths) if digest
+    )
+
+
+def add_refs(db: Session, file_paths: List[str]):
+    """登记对 blob 的引用，与引用它的 MarkdownContent 在同一个事务中提交"""
+    counts = _count_hashes(file_paths)
+    if counts:
+        db.execute(_upsert(db), [{"hash": digest, "ref_count": count} for digest, count in counts.items()])
+
+
+def release_refs(db: Session, file_paths: List[str]) -> List[str]:
+    """释放引用，返回其中不属于 blob 存储的旧文件路径，由调用方在提交后删除
+
+    引用计数归零的 blob 不立即删除，同样的内容可能马上又被写入，统一由 collect_garbage 清理。
+    """
+    counts = _count_hashes(file_paths)
+    if counts:
+        table = MarkdownBlob.__table__
+        db.execute(
+            table.update().where(table.c.hash == bindparam("b_hash")).values(
+                ref_count=table.c.ref_count - bindparam("b_count")
+            ),
+            [{"b_hash": digest, "b_count": count} for digest, count in counts.items()]
+        )
+    return [file_path for file_path in file_paths if file_service.blob_hash(file_path) is None]
+
+
+def _collect_batch(db: Session, batch: List[Tuple[str, Path]], cutoff: float) -> int:
+    live = set(db.execute(
+        select(MarkdownBlob.hash).where(MarkdownBlob.hash.in_([digest for digest, _ in batch]), MarkdownBlob.ref_count > 0)
+    ).scalars())
+
+    candidates = []
+    for digest, path in batch:
+        if digest in live:
+            continue
+        try:
+            if path.stat().st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        # 引用计数与实际不符时以 markdown_contents 和版本快照为准，宁可不删
+        file_path = str(path.relative_to(file_service.base_dir))
+        if row_exists(db, MarkdownContent.file_path == file_path):
+            continue
+        if row_exists(db, MarkdownVersion.file_path == file_path):
+            continue
+        candidates.append((digest, path))
+    if not candidates:
+        return 0
+
+    db.query(MarkdownBlob).filter(
+        MarkdownBlob.hash.in_([digest for digest, _ in candidates]), MarkdownBlob.ref_count <= 0
+    ).delete(synchronize_session=False)
+    db.commit()
+
+    removed = 0
+    for digest, path in candidates:
+        # 删除前再确认一次期间没有被重新写入或复用
+        try:
+            if path.stat().st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        path.unlink(missing_ok=True)
+        file_service.delete_rendered(digest)
+        removed += 1
+    return removed
+
+
+def collect_garbage(db: Session, grace_seconds: int = GC_GRACE_SECONDS) -> Dict[str, int]:
+    """删除没有引用的 blob 文件，包括引用计数归零的和写入后事务未提交留下的"""
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    batch = []
+    for blob in file_service.iter_blobs():
+        batch.append(blob)
+        if len(batch) >= BATCH_SIZE:
+            removed += _collect_batch(db, batch, cutoff)
+            batch = []
+    if batch:
+        removed += _collect_batch(db, batch, cutoff)
+
+    # 文件已经不存在的零引用记录
+    orphans = [
+        digest for digest in db.execute(select(MarkdownBlob.hash).where(MarkdownBlob.ref_count <= 0)).scalars()
+        if not file_service.blob_path(digest).exists()
+    ]
+    for start in range(0, len(orphans), BATCH_SIZE):
+        db.query(MarkdownBlob).filter(
+            MarkdownBlob.hash.in_(orphans[start:start + BATCH_SIZE]), MarkdownBlob.ref_count <= 0
+        ).delete(synchronize_session=False)
+    db.commit()
+
+    return {
+        "blobs": removed,
+        "records": len(orphans),
+        "temp_files": file_service.remove_stale_temp_files(cutoff)
+    }
+
+
+def migrate_legacy_files(db: Session) -> int:
+    """把旧的 uuid 命名的 Markdown 文件转存为 blob，每批提交后删除旧文件，返回转存的数量"""
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = db.query(MarkdownContent).filter(
+            MarkdownContent.id > last_id
+        ).order_by(MarkdownContent.id).limit(BATCH_SIZE).all()
+        if not rows:
+            return migrated
+        last_id = rows[-1].id
+
+        old_paths = []
+        new_paths = []
+        for row in rows:
+            if file_service.blob_hash(row.file_path) is not None:
+                continue
+            try:
+                # 旧文件可能已被 compress-markdown 原地压缩，按文件头解压后再计算哈希
+                data = compression.decompress(file_service.get_full_path(row.file_path).read_bytes())
+                content = data.decode("utf-8")
+            except (OSError, EOFError, zlib.error, UnicodeDecodeError, RuntimeError):
+                continue
+            old_paths.append(row.file_path)
+            row.file_path = file_service.save_markdown(content, cache=False)
+            new_paths.append(row.file_path)
+        add_refs(db, new_paths)
+        db.commit()
+
+        for file_path in old_paths:
+            file_service.delete_file(file_path)
+        migrated += len(old_paths)
@@ -1,17 +1,40 @@
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from sqlalchemy import String, and_, false, func, literal, select, update
+from typing import Optional, List, Tuple, Dict
 
-from ..models import Folder
+from ..models import Folder, KnowledgeItem
 from ..schemas import folder as folder_schemas
+from ..utils.pagination import keyset_paginate
+from .loading import row_exists
+
+
+# 文件夹最大层数，同时保证 path 不超过列长度
+MAX_FOLDER_DEPTH = 64
+
+SORT_COLUMNS = {
+    "id": Folder.id,
+    "created_at": Folder.created_at,
+    "updated_at": Folder.updated_at,
+    "name": Folder.name
+}
 
 
 def get_folder(db: Session, folder_id: int) -> Optional[Folder]:
     return db.query(Folder).filter(Folder.id == folder_id).first()
 
 
-def get_folders(db: Session, page: int = 1, page_size: int = 20) -> List[Folder]:
-    skip = (page - 1) * page_size
-    return db.query(Folder).offset(skip).limit(page_size).all()
+def get_folders(
+    db: Session, 
+    page: int = 1, 
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc"
+) -> Tuple[List[Folder], Optional[str]]:
+    return keyset_paginate(
+        db.query(Folder), SORT_COLUMNS, Folder.id,
+        sort=sort, order=order, cursor=cursor, limit=page_size, page=page
+    )
 
 
 def get_folders_by_parent(db: Session, parent_id: Optional[int] = None) -> List[Folder]:
@@ -24,19 +47,42 @@ def create_folder(db: Session, folder: folder_schemas.FolderCreate) -> Folder:
         parent_id=folder.parent_id
     )
     db.add(db_folder)
+    # 路径里包含自身 id，先 flush 拿到 id
+    db.flush()
+    parent = get_folder(db, folder.parent_id) if folder.parent_id is not None else None
+    db_folder.path, db_folder.depth = _child_path(parent, db_folder.id)
     db.commit()
     db.refresh(db_folder)
     return db_folder
 
 
 def update_folder(db: Session, folder_id: int, folder: folder_schemas.FolderUpdate) -> Optional[Folder]:
+    """更新文件夹；parent_id 变化时整棵子树的路径用一条 UPDATE 改写
+
+    调用方需先用 get_move_error 校验目标位置，避免成环。
+    """
     db_folder = get_folder(db, folder_id)
     if not db_folder:
         return None
     
     update_data = folder.model_dump(exclude_unset=True)
+    new_parent_id = update_data.pop("parent_id", db_folder.parent_id)
     for field, value in update_data.items():
         setattr(db_folder, field, value)
+
+    if new_parent_id != db_folder.parent_id:
+        parent = get_folder(db, new_parent_id) if new_parent_id is not None else None
+        new_path, new_depth = _child_path(parent, db_folder.id)
+        old_path, old_depth = db_folder.path, db_folder.depth
+        db_folder.parent_id = new_parent_id
+        db.flush()
+        db.query(Folder).filter(_subtree_filter(old_path)).update({
+            Folder.path: literal(new_path, String) + func.substr(Folder.path, len(old_path) + 1),
+            Folder.depth: Folder.depth + (new_depth - old_depth),
+            # 子孙文件夹只是位置跟着变，不算修改
+            Folder.updated_at: Folder.updated_at
+        }, synchronize_session=False)
+        db.expire(db_folder, ["path", "depth"])
     
     db.commit()
     db.refresh(db_folder)
@@ -44,28 +90,266 @@ def update_folder(db: Session, folder_id: int, folder: folder_schemas.FolderUpda
 
 
 def delete_folder(db: Session, folder_id: int) -> Optional[Folder]:
+    """删除文件夹及其整棵子树，其中的知识项移到根目录
+
+    与外键上 ON DELETE CASCADE / SET NULL 的语义一致，但按路径范围批量执行，不加载 ORM 对象。
+    """
     db_folder = get_folder(db, folder_id)
     if not db_folder:
         return None
     
-    db.delete(db_folder)
+    subtree = _subtree_filter(db_folder.path)
+    # 返回值在提交后仍要读取，先从会话中分离
+    db.expunge(db_folder)
+    db.query(KnowledgeItem).filter(
+        KnowledgeItem.folder_id.in_(select(Folder.id).where(subtree))
+    ).update({KnowledgeItem.folder_id: None}, synchronize_session=False)
+    db.query(Folder).filter(subtree).delete(synchronize_session=False)
     db.commit()
     return db_folder
 
 
-def get_folder_tree(db: Session, root_id: Optional[int] = None) -> List[folder_schemas.FolderWithChildren]:
-    def build_tree(folders, parent_id):
-        tree = []
-        for folder in folders:
-            if folder.parent_id == parent_id:
-                folder_dict = folder_schemas.Folder.model_validate(folder).model_dump()
-                children = build_tree(folders, folder.id)
-                folder_with_children = folder_schemas.FolderWithChildren(
-                    **folder_dict,
-                    children=children
-                )
-                tree.append(folder_with_children)
-        return tree
+def _child_path(parent: Optional[Folder], folder_id: int) -> Tuple[str, int]:
+    if parent is None:
+        return f"/{folder_id}/", 1
+    return f"{parent.path}{folder_id}/", parent.depth + 1
+
+
+def _subtree_filter(path: str, include_self: bool = True):
+    """以 path 为前缀的所有文件夹：["/1/5/", "/1/50") 是一段连续的索引范围（"0" 紧跟在 "/" 之后）"""
+    lower = Folder.path >= path if include_self else Folder.path > path
+    return and_(lower, Folder.path < path[:-1] + "0")
+
+
+def get_or_create_folder_path(
+    db: Session,
+    names: Tuple[str, ...],
+    parent_id: Optional[int] = None,
+    cache: Optional[Dict[Tuple[Optional[int], str], Tuple[int, str, int]]] = None
+) -> Optional[int]:
+    """按目录名逐级查找或创建子文件夹，返回最末一级的 id；只 flush 不提交
+
+    cache 以 (父文件夹 id, 名称) 缓存 (id, path, depth)，批量导入时避免重复查询。超出层数上限的部分不再往下建。
+    """
+    cache = {} if cache is None else cache
+    parent = get_folder(db, parent_id) if parent_id is not None else None
+    current = (parent.id, parent.path, parent.depth) if parent else None
+    for name in names:
+        if current is not None and current[2] >= MAX_FOLDER_DEPTH:
+            break
+        key = (current[0] if current else None, name[:255])
+        if key not in cache:
+            db_folder = db.query(Folder).filter(Folder.parent_id == key[0], Folder.name == key[1]).first()
+            if db_folder is None:
+                db_folder = Folder(name=key[1], parent_id=key[0])
+                db.add(db_folder)
+                db.flush()
+                if current is None:
+                    db_folder.path, db_folder.depth = f"/{db_folder.id}/", 1
+                else:
+                    db_folder.path, db_folder.depth = f"{current[1]}{db_folder.id}/", current[2] + 1
+                db.flush()
+            cache[key] = (db_folder.id, db_folder.path, db_folder.depth)
+        current = cache[key]
+    return current[0] if current else None
+
+
+def get_create_error(db: Session, parent_id: Optional[int]) -> Optional[str]:
+    """检查能否在 parent_id 下新建文件夹，不能时返回原因"""
+    if parent_id is None:
+        return None
+    parent = get_folder(db, parent_id)
+    if parent is None:
+        return "父文件夹不存在"
+    if parent.depth >= MAX_FOLDER_DEPTH:
+        return f"文件夹层级不能超过 {MAX_FOLDER_DEPTH} 层"
+    return None
+
+
+def get_move_error(db: Session, db_folder: Folder, new_parent_id: Optional[int]) -> Optional[str]:
+    """检查能否把 db_folder 移到 new_parent_id 下，不能时返回原因"""
+    if new_parent_id is None or new_parent_id == db_folder.parent_id:
+        return None
+    parent = get_folder(db, new_parent_id)
+    if parent is None:
+        return "父文件夹不存在"
+    if parent.path.startswith(db_folder.path):
+        return "不能将文件夹移动到自身或其子文件夹下"
+    deepest = db.query(func.max(Folder.depth)).filter(_subtree_filter(db_folder.path)).scalar()
+    if parent.depth + 1 + deepest - db_folder.depth > MAX_FOLDER_DEPTH:
+        return f"文件夹层级不能超过 {MAX_FOLDER_DEPTH} 层"
+    return None
+
+
+def get_ancestors(db: Session, folder_id: int, include_self: bool = True) -> List[Folder]:
+    """从根到 folder_id 的文件夹（面包屑）；祖先 id 直接从 path 中解析"""
+    path = db.query(Folder.path).filter(Folder.id == folder_id).scalar()
+    if path is None:
+        return []
+    ids = [int(part) for part in path.strip("/").split("/")]
+    if not include_self:
+        ids = ids[:-1]
+    if not ids:
+        return []
+    return db.query(Folder).filter(Folder.id.in_(ids)).order_by(Folder.depth).all()
+
+
+def get_descendant_ids_query(db: Session, folder_id: int, include_self: bool = True):
+    """folder_id 及其所有子孙文件夹 id 的子查询，可直接用于 in_() 过滤"""
+    path = db.query(Folder.path).filter(Folder.id == folder_id).scalar()
+    if path is None:
+        return select(Folder.id).where(false())
+    return select(Folder.id).where(_subtree_filter(path, include_self))
+
+
+def get_descendant_ids(db: Session, folder_id: int, include_self: bool = True) -> List[int]:
+    return list(db.execute(get_descendant_ids_query(db, folder_id, include_self)).scalars())
+
+
+def get_descendants(db: Session, folder_id: int) -> List[Folder]:
+    return db.query(Folder).filter(
+        Folder.id.in_(get_descendant_ids_query(db, folder_id, include_self=False))
+    ).order_by(Folder.id).all()
+
+
+def rebuild_folder_paths(db: Session, only_missing: bool = True) -> int:
+    """按 parent_id 重新计算 path/depth，返回更新的行数
+
+    用于旧数据库升级后的回填。parent_id 成环或指向不存在的文件夹时，断开处的文件夹提升为根文件夹。
+    """
+    if only_missing and not row_exists(db, Folder.path.is_(None)):
+        return 0
+
+    rows = db.query(Folder.id, Folder.parent_id, Folder.path, Folder.depth).all()
+    known = {row.id for row in rows}
+    children: Dict[Optional[int], List[int]] = {}
+    for row in rows:
+        children.setdefault(row.parent_id if row.parent_id in known else None, []).append(row.id)
+
+    paths: Dict[int, Tuple[str, int]] = {}
+
+    def walk(root_id: int):
+        stack = [(root_id, "/", 1)]
+        while stack:
+            folder_id, prefix, depth = stack.pop()
+            if folder_id in paths:
+                continue
+            path = f"{prefix}{folder_id}/"
+            paths[folder_id] = (path, depth)
+            stack.extend((child_id, path, depth + 1) for child_id in children.get(folder_id, ()))
+
+    roots = set()
+    for row in rows:
+        if row.parent_id not in known:
+            roots.add(row.id)
+            walk(row.id)
+    for row in rows:
+        # 此时仍不可达的只有环上的节点，从这里把环断开
+        if row.id not in paths:
+            roots.add(row.id)
+            walk(row.id)
+
+    changes = []
+    for row in rows:
+        path, depth = paths[row.id]
+        change = {"id": row.id, "path": path, "depth": depth}
+        if row.id in roots and row.parent_id is not None:
+            change["parent_id"] = None
+        elif (row.path, row.depth) == (path, depth):
+            continue
+        changes.append(change)
+    for start in range(0, len(changes), 1000):
+        db.execute(update(Folder), changes[start:start + 1000])
+    db.commit()
+    return len(changes)
+
+
+def get_folder_tree(
+    db: Session, 
+    root_id: Optional[int] = None,
+    depth: Optional[int] = None,
+    with_counts: bool = False
+) -> List[folder_schemas.FolderWithChildren]:
+    """按路径范围一次取出子树，再按 parent_id 一遍挂到父节点上
+
+    depth 限制返回的层数；被截断的节点 has_children 为真，前端可以再以它为 root_id 展开。
+    with_counts 为真时附带每个节点的知识项数量。
+    """
+    query = db.query(
+        Folder.id, Folder.name, Folder.parent_id, Folder.path, Folder.depth,
+        Folder.created_at, Folder.updated_at
+    )
+    base_depth = 0
+    root_path = None
+    if root_id is not None:
+        root = db.query(Folder.path, Folder.depth).filter(Folder.id == root_id).first()
+        if root is None:
+            return []
+        base_depth, root_path = root.depth, root.path
+        query = query.filter(_subtree_filter(root_path, include_self=False))
+    if depth is not None:
+        query = query.filter(Folder.depth <= base_depth + depth)
+    rows = query.order_by(Folder.depth, Folder.id).all()
     
-    all_folders = db.query(Folder).all()
-    return build_tree(all_folders, root_id)
+    nodes: Dict[int, folder_schemas.FolderWithChildren] = {}
+    tree = []
+    for row in rows:
+        node = folder_schemas.FolderWithChildren.model_construct(
+            id=row.id,
+            name=row.name,
+            parent_id=row.parent_id,
+            path=row.path,
+            depth=row.depth,
+            created_at=row.created_at,
+            updated_at=row.updated_at,
+            children=[],
+            has_children=False
+        )
+        nodes[row.id] = node
+        parent = nodes.get(row.parent_id) if row.depth > base_depth + 1 else None
+        if parent is not None:
+            parent.children.append(node)
+            parent.has_children = True
+        else:
+            tree.append(node)
+    
+    # 最深一层的节点没有展开，单独查一次是否还有子文件夹
+    if rows and depth is not None and rows[-1].depth >= base_depth + depth:
+        leaf_ids = [row.id for row in rows if row.depth == base_depth + depth]
+        for start in range(0, len(leaf_ids), 500):
+            for (parent_id,) in db.query(Folder.parent_id).filter(
+                Folder.parent_id.in_(leaf_ids[start:start + 500])
+            ).distinct():
+                nodes[parent_id].has_children = True
+
+    if with_counts:
+        _attach_item_counts(db, nodes, root_path)
+    return tree
+
+
+def _attach_item_counts(
+    db: Session,
+    nodes: Dict[int, folder_schemas.FolderWithChildren],
+    root_path: Optional[str] = None
+):
+    """一次分组查询取出子树内每个文件夹按类型的知识项数，再沿 path 累加到各级祖先"""
+    counts = {folder_id: folder_schemas.FolderItemCounts() for folder_id in nodes}
+    query = db.query(Folder.path, KnowledgeItem.type, func.count(KnowledgeItem.id)).join(
+        Folder, KnowledgeItem.folder_id == Folder.id
+    )
+    if root_path is not None:
+        query = query.filter(_subtree_filter(root_path, include_self=False))
+    for path, type, count in query.group_by(Folder.id, Folder.path, KnowledgeItem.type):
+        ids = [int(part) for part in path.strip("/").split("/")]
+        own = counts.get(ids[-1])
+        if own is not None:
+            own.direct += count
+            own.by_type[type] = own.by_type.get(type, 0) + count
+        # 截断在 depth 之外的文件夹也计入已返回的祖先
+        for folder_id in ids:
+            ancestor = counts.get(folder_id)
+            if ancestor is not None:
+                ancestor.total += count
+                ancestor.total_by_type[type] = ancestor.total_by_type.get(type, 0) + count
+    for folder_id, node in nodes.items():
+        node.counts = counts[folder_id]
@@ -1,17 +1,44 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_
-from typing import Optional, List
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, false, func, not_, or_, select
+from typing import Callable, Dict, Optional, List, Set, Tuple
 
-from ..models import KnowledgeItem, Tag
+from ..models import (
+    KnowledgeItem, Tag, knowledge_tags, MarkdownContent, MarkdownImportRecord, MarkdownVersion, WebpageContent,
+    WebpageRefreshState, LearningRecord, Attachment
+)
 from ..schemas import knowledge as knowledge_schemas
+from ..services.file_service import file_service
+from ..services.search_service import search_service
+from ..services.suggest_service import suggest_service
+from . import loading
+from . import attachment as attachment_crud
+from . import blob as blob_crud
+from . import folder as folder_crud
+from ..utils.pagination import keyset_paginate, encode_cursor, decode_cursor, InvalidCursorError
+from ..utils.tag_query import Node, evaluate, tag_names
+
+
+# 列表支持的排序字段，均有 (字段, id) 复合索引
+SORT_COLUMNS = {
+    "id": KnowledgeItem.id,
+    "created_at": KnowledgeItem.created_at,
+    "updated_at": KnowledgeItem.updated_at,
+    "title": KnowledgeItem.title
+}
 
 
 def get_knowledge_item(db: Session, item_id: int) -> Optional[KnowledgeItem]:
-    return db.query(KnowledgeItem).options(
-        joinedload(KnowledgeItem.tags),
-        joinedload(KnowledgeItem.markdown_content),
-        joinedload(KnowledgeItem.webpage_content)
-    ).filter(KnowledgeItem.id == item_id).first()
+    # 详情接口只返回知识项本身的列，关系按需延迟加载
+    return db.get(KnowledgeItem, item_id)
+
+
+def knowledge_item_exists(db: Session, item_id: int) -> bool:
+    return loading.row_exists(db, KnowledgeItem.id == item_id)
+
+
+def get_knowledge_item_type(db: Session, item_id: int) -> Optional[str]:
+    """只取知识项类型，不存在时返回 None；用于接口中的存在性和类型检查"""
+    return db.query(KnowledgeItem.type).filter(KnowledgeItem.id == item_id).scalar()
 
 
 def get_knowledge_items(
@@ -19,29 +46,81 @@ def get_knowledge_items(
     page: int = 1, 
     page_size: int = 20,
     folder_id: Optional[int] = None,
-    type: Optional[str] = None
-) -> List[KnowledgeItem]:
-    skip = (page - 1) * page_size
+    type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc",
+    include_subfolders: bool = False
+) -> Tuple[List[KnowledgeItem], Optional[str]]:
     query = db.query(KnowledgeItem)
     
     if folder_id is not None:
-        query = query.filter(KnowledgeItem.folder_id == folder_id)
+        if include_subfolders:
+            query = query.filter(KnowledgeItem.folder_id.in_(folder_crud.get_descendant_ids_query(db, folder_id)))
+        else:
+            query = query.filter(KnowledgeItem.folder_id == folder_id)
     
     if type is not None:
         query = query.filter(KnowledgeItem.type == type)
     
-    return query.options(
-        joinedload(KnowledgeItem.tags)
-    ).offset(skip).limit(page_size).all()
+    return keyset_paginate(
+        query.options(*loading.knowledge_list()),
+        SORT_COLUMNS, KnowledgeItem.id,
+        sort=sort, order=order, cursor=cursor, limit=page_size, page=page
+    )
 
 
 def search_knowledge(
     db: Session, 
     query: str, 
     page: int = 1, 
-    page_size: int = 20
-) -> List[KnowledgeItem]:
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    folder_id: Optional[int] = None,
+    include_subfolders: bool = False
+) -> Tuple[List[knowledge_schemas.KnowledgeSearchResult], Optional[str]]:
     skip = (page - 1) * page_size
+    
+    # 限定在某个文件夹（及其子文件夹）内搜索
+    folder_ids = None
+    if folder_id is not None:
+        folder_ids = folder_crud.get_descendant_ids(db, folder_id) if include_subfolders else [folder_id]
+
+    if search_service.enabled:
+        # 游标为上一页最后一条的 (bm25 分数, id)
+        after = None
+        if cursor:
+            cursor_sort, _, score, last_id = decode_cursor(cursor)
+            if cursor_sort != "relevance":
+                raise InvalidCursorError("游标与当前排序方式不一致")
+            after = (score, last_id)
+        hits = search_service.search(
+            db, query, limit=page_size + 1, offset=skip, after=after, folder_ids=folder_ids
+        )
+        next_cursor = None
+        if len(hits) > page_size:
+            hits = hits[:page_size]
+            next_cursor = encode_cursor("relevance", "asc", hits[-1][1], hits[-1][0])
+        if not hits:
+            return [], None
+
+        items = db.query(KnowledgeItem).options(*loading.knowledge_list()).filter(
+            KnowledgeItem.id.in_([hit[0] for hit in hits])
+        ).all()
+        items_by_id = {item.id: item for item in items}
+
+        # 按 bm25 排名顺序返回
+        results = []
+        for item_id, score, snippet in hits:
+            item = items_by_id.get(item_id)
+            if item is None:
+                continue
+            result = knowledge_schemas.KnowledgeSearchResult.model_validate(item)
+            result.score = score
+            result.snippet = snippet
+            results.append(result)
+        return results, next_cursor
+
     search_term = f"%{query}%"
     
     # 搜索标题
@@ -61,9 +140,15 @@ def search_knowledge(
             )
         )
     
-    return knowledge_query.options(
-        joinedload(KnowledgeItem.tags)
-    ).offset(skip).limit(page_size).all()
+    if folder_ids is not None:
+        knowledge_query = knowledge_query.filter(KnowledgeItem.folder_id.in_(folder_ids))
+    
+    items, next_cursor = keyset_paginate(
+        knowledge_query.options(*loading.knowledge_list()),
+        SORT_COLUMNS, KnowledgeItem.id,
+        cursor=cursor, limit=page_size, page=page
+    )
+    return [knowledge_schemas.KnowledgeSearchResult.model_validate(item) for item in items], next_cursor
 
 
 def create_knowledge_item(
@@ -76,8 +161,11 @@ def create_knowledge_item(
         folder_id=knowledge_item.folder_id
     )
     db.add(db_knowledge)
+    db.flush()
+    search_service.update_columns(db, db_knowledge.id, title=db_knowledge.title)
     db.commit()
     db.refresh(db_knowledge)
+    suggest_service.update_knowledge(db_knowledge.id, db_knowledge.title)
     return db_knowledge
 
 
@@ -94,8 +182,13 @@ def update_knowledge_item(
     for field, value in update_data.items():
         setattr(db_knowledge, field, value)
     
+    if "title" in update_data:
+        search_service.update_columns(db, item_id, title=db_knowledge.title)
+    
     db.commit()
     db.refresh(db_knowledge)
+    if "title" in update_data:
+        suggest_service.update_knowledge(item_id, db_knowledge.title)
     return db_knowledge
 
 
@@ -104,8 +197,9 @@ def delete_knowledge_item(db: Session, item_id: int) -> Optional[KnowledgeItem]:
     if not db_knowledge:
         return None
     
-    db.delete(db_knowledge)
-    db.commit()
+    # 返回值在提交后仍要读取，先从会话中分离
+    db.expunge(db_knowledge)
+    _delete_items(db, [item_id])
     return db_knowledge
 
 
@@ -124,6 +218,8 @@ def add_tag_to_knowledge(
     
     if db_tag not in db_knowledge.tags:
         db_knowledge.tags.append(db_tag)
+        db.flush()
+        search_service.update_tags(db, knowledge_id)
         db.commit()
         db.refresh(db_knowledge)
     
@@ -145,6 +241,8 @@ def remove_tag_from_knowledge(
     
     if db_tag in db_knowledge.tags:
         db_knowledge.tags.remove(db_tag)
+        db.flush()
+        search_service.update_tags(db, knowledge_id)
         db.commit()
         db.refresh(db_knowledge)
     
@@ -155,14 +253,209 @@ def get_knowledge_by_tags(
     db: Session, 
     tag_ids: List[int], 
     page: int = 1, 
-    page_size: int = 20
-) -> List[KnowledgeItem]:
-    skip = (page - 1) * page_size
-    
-    query = db.query(KnowledgeItem)
-    for tag_id in tag_ids:
-        query = query.filter(KnowledgeItem.tags.any(Tag.id == tag_id))
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc"
+) -> Tuple[List[KnowledgeItem], Optional[str]]:
+    # 同时带有所有标签：对关联表按知识项分组，命中的标签数等于要求的标签数
+    tag_ids = set(tag_ids)
+    matching = select(knowledge_tags.c.knowledge_item_id).where(
+        knowledge_tags.c.tag_id.in_(tag_ids)
+    ).group_by(knowledge_tags.c.knowledge_item_id).having(func.count() == len(tag_ids))
+    query = db.query(KnowledgeItem).filter(KnowledgeItem.id.in_(matching))
     
-    return query.options(
-        joinedload(KnowledgeItem.tags)
-    ).offset(skip).limit(page_size).all()
+    return keyset_paginate(
+        query.options(*loading.knowledge_list()),
+        SORT_COLUMNS, KnowledgeItem.id,
+        sort=sort, order=order, cursor=cursor, limit=page_size, page=page
+    )
+
+
+def tag_query_filter(db: Session, node: Node):
+    """把标签表达式编译成知识项上的过滤条件
+
+    只扫描一遍关联表：按知识项分组，每个标签对应 HAVING 中的一个 max(tag_id = ?)，布尔运算直接作用在这些列上。
+    不带任何相关标签的知识项不会出现在分组里；表达式对它们成立时（如 NOT draft），改为取不满足表达式的补集。
+    """
+    names = tag_names(node)
+    tag_ids = dict(db.query(Tag.name, Tag.id).filter(Tag.name.in_(names)).all()) if names else {}
+
+    def compile_node(node: Node):
+        kind = node[0]
+        if kind == "tag":
+            tag_id = tag_ids.get(node[1])
+            if tag_id is None:
+                return false()
+            return func.max(case((knowledge_tags.c.tag_id == tag_id, 1), else_=0)) == 1
+        if kind == "not":
+            return not_(compile_node(node[1]))
+        operands = [compile_node(child) for child in node[1:]]
+        return and_(*operands) if kind == "and" else or_(*operands)
+
+    grouped = select(knowledge_tags.c.knowledge_item_id).where(
+        knowledge_tags.c.tag_id.in_(tag_ids.values())
+    ).group_by(knowledge_tags.c.knowledge_item_id)
+    condition = compile_node(node)
+    if evaluate(node, set()):
+        return KnowledgeItem.id.not_in(grouped.having(not_(condition)))
+    return KnowledgeItem.id.in_(grouped.having(condition))
+
+
+def get_knowledge_by_tag_query(
+    db: Session,
+    condition,
+    page: int = 1,
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc"
+) -> Tuple[List[KnowledgeItem], Optional[str]]:
+    return keyset_paginate(
+        db.query(KnowledgeItem).filter(condition).options(*loading.knowledge_list()),
+        SORT_COLUMNS, KnowledgeItem.id,
+        sort=sort, order=order, cursor=cursor, limit=page_size, page=page
+    )
+
+
+def get_tag_facets(db: Session, condition) -> Tuple[int, List[tuple]]:
+    """命中的知识项总数，以及命中集合里每个标签出现的次数（按次数降序）"""
+    total = db.query(func.count(KnowledgeItem.id)).filter(condition).scalar()
+    count = func.count(knowledge_tags.c.knowledge_item_id)
+    facets = db.query(Tag.id, Tag.name, Tag.color, count.label("count")).join(
+        knowledge_tags, knowledge_tags.c.tag_id == Tag.id
+    ).filter(
+        knowledge_tags.c.knowledge_item_id.in_(select(KnowledgeItem.id).where(condition))
+    ).group_by(Tag.id, Tag.name, Tag.color).order_by(count.desc(), Tag.name).all()
+    return total, facets
+
+
+def _insert_ignore(db: Session, table):
+    """INSERT ... ON CONFLICT DO NOTHING"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table).on_conflict_do_nothing()
+
+
+def _bulk_result(item_ids: List[int], existing: Set[int], updated: Set[int]) -> knowledge_schemas.KnowledgeBulkResult:
+    result = knowledge_schemas.KnowledgeBulkResult()
+    for item_id in dict.fromkeys(item_ids):
+        if item_id not in existing:
+            status = "not_found"
+        elif item_id in updated:
+            status = "updated"
+        else:
+            status = "unchanged"
+        setattr(result, status, getattr(result, status) + 1)
+        result.results.append(knowledge_schemas.KnowledgeBulkItemResult(id=item_id, status=status))
+    return result
+
+
+def _existing_item_ids(db: Session, item_ids: List[int]) -> Set[int]:
+    return set(db.execute(select(KnowledgeItem.id).where(KnowledgeItem.id.in_(item_ids))).scalars())
+
+
+def _tag_pairs(db: Session, item_ids: List[int], tag_ids: List[int]) -> Set[Tuple[int, int]]:
+    return set(db.execute(
+        select(knowledge_tags.c.knowledge_item_id, knowledge_tags.c.tag_id).where(
+            knowledge_tags.c.knowledge_item_id.in_(item_ids),
+            knowledge_tags.c.tag_id.in_(tag_ids)
+        )
+    ).all())
+
+
+def bulk_add_tags(db: Session, item_ids: List[int], tag_ids: List[int]) -> knowledge_schemas.KnowledgeBulkResult:
+    """给一批知识项加上一批标签，一条 INSERT ... SELECT ... ON CONFLICT DO NOTHING 完成"""
+    existing = _existing_item_ids(db, item_ids)
+    tag_ids = list(db.execute(select(Tag.id).where(Tag.id.in_(tag_ids))).scalars())
+    tagged = _tag_pairs(db, list(existing), tag_ids)
+    updated = {item_id for item_id in existing if any((item_id, tag_id) not in tagged for tag_id in tag_ids)}
+
+    if updated:
+        db.execute(_insert_ignore(db, knowledge_tags).from_select(
+            ["knowledge_item_id", "tag_id"],
+            select(KnowledgeItem.id, Tag.id).where(KnowledgeItem.id.in_(updated), Tag.id.in_(tag_ids))
+        ))
+        search_service.update_tags_many(db, sorted(updated))
+        db.commit()
+    return _bulk_result(item_ids, existing, updated)
+
+
+def bulk_remove_tags(db: Session, item_ids: List[int], tag_ids: List[int]) -> knowledge_schemas.KnowledgeBulkResult:
+    existing = _existing_item_ids(db, item_ids)
+    updated = {item_id for item_id, _ in _tag_pairs(db, list(existing), tag_ids)}
+
+    if updated:
+        db.execute(knowledge_tags.delete().where(
+            knowledge_tags.c.knowledge_item_id.in_(updated),
+            knowledge_tags.c.tag_id.in_(tag_ids)
+        ))
+        search_service.update_tags_many(db, sorted(updated))
+        db.commit()
+    return _bulk_result(item_ids, existing, updated)
+
+
+def bulk_move(db: Session, item_ids: List[int], folder_id: Optional[int]) -> knowledge_schemas.KnowledgeBulkResult:
+    current: Dict[int, Optional[int]] = dict(db.execute(
+        select(KnowledgeItem.id, KnowledgeItem.folder_id).where(KnowledgeItem.id.in_(item_ids))
+    ).all())
+    updated = {item_id for item_id, current_folder in current.items() if current_folder != folder_id}
+
+    if updated:
+        db.query(KnowledgeItem).filter(KnowledgeItem.id.in_(updated)).update(
+            {KnowledgeItem.folder_id: folder_id}, synchronize_session=False
+        )
+        db.commit()
+    return _bulk_result(item_ids, set(current), updated)
+
+
+def bulk_delete(db: Session, item_ids: List[int]) -> knowledge_schemas.KnowledgeBulkResult:
+    existing = _existing_item_ids(db, item_ids)
+    if existing:
+        _delete_items(db, list(existing))
+    return _bulk_result(item_ids, existing, existing)
+
+
+def _delete_items(db: Session, item_ids: List[int]):
+    after_commit = stage_item_deletion(db, item_ids)
+    db.commit()
+    after_commit()
+
+
+def stage_item_deletion(db: Session, item_ids: List[int]) -> Callable[[], None]:
+    """在当前事务中删除知识项及其内容、历史版本、附件、标签关联和学习记录，不提交
+
+    SQLite 默认不执行外键的 ON DELETE CASCADE，关联表在这里逐个按 WHERE IN 删除。
+    markdown blob（包括版本快照）只释放引用，附件文件可能被其它知识项共用，都由 gc 清理。
+    提交后由调用方执行返回的函数，删除旧的 uuid 文件和进行中上传的组装文件，并更新输入建议。
+    """
+    legacy_paths = blob_crud.release_refs(db, list(db.execute(
+        select(MarkdownContent.file_path).where(MarkdownContent.knowledge_item_id.in_(item_ids))
+    ).scalars()))
+    blob_crud.release_refs(db, list(db.execute(
+        select(MarkdownVersion.file_path).where(
+            MarkdownVersion.knowledge_item_id.in_(item_ids), MarkdownVersion.file_path.isnot(None)
+        )
+    ).scalars()))
+    upload_ids = attachment_crud.delete_uploads_by_knowledge(db, item_ids)
+    webpage_ids = select(WebpageContent.id).where(WebpageContent.knowledge_item_id.in_(item_ids))
+
+    db.query(WebpageRefreshState).filter(
+        WebpageRefreshState.webpage_id.in_(webpage_ids)
+    ).delete(synchronize_session=False)
+    for model in (WebpageContent, MarkdownContent, MarkdownVersion, MarkdownImportRecord, LearningRecord, Attachment):
+        db.query(model).filter(model.knowledge_item_id.in_(item_ids)).delete(synchronize_session=False)
+    db.execute(knowledge_tags.delete().where(knowledge_tags.c.knowledge_item_id.in_(item_ids)))
+    db.query(KnowledgeItem).filter(KnowledgeItem.id.in_(item_ids)).delete(synchronize_session=False)
+    search_service.remove_items(db, item_ids)
+
+    def after_commit():
+        for legacy_path in legacy_paths:
+            file_service.delete_file(legacy_path)
+        for upload_id in upload_ids:
+            file_service.delete_upload_part(upload_id)
+        for item_id in item_ids:
+            suggest_service.remove_knowledge(item_id)
+    return after_commit
@@ -1,8 +1,15 @@
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 from ..models import LearningRecord
 from ..schemas import learning as learning_schemas
+from ..utils.pagination import keyset_paginate
+
+
+SORT_COLUMNS = {
+    "id": LearningRecord.id,
+    "created_at": LearningRecord.created_at
+}
 
 
 def get_learning_record(db: Session, record_id: int) -> Optional[LearningRecord]:
@@ -13,12 +20,18 @@ def get_learning_records_by_knowledge(
     db: Session, 
     knowledge_id: int,
     page: int = 1,
-    page_size: int = 20
-) -> List[LearningRecord]:
-    skip = (page - 1) * page_size
-    return db.query(LearningRecord).filter(
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc"
+) -> Tuple[List[LearningRecord], Optional[str]]:
+    query = db.query(LearningRecord).filter(
         LearningRecord.knowledge_item_id == knowledge_id
-    ).offset(skip).limit(page_size).all()
+    )
+    return keyset_paginate(
+        query, SORT_COLUMNS, LearningRecord.id,
+        sort=sort, order=order, cursor=cursor, limit=page_size, page=page
+    )
 
 
 def create_learning_record(
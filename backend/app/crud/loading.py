@@ -0,0 +1,28 @@
+"""crud 查询共用的加载策略
+
+- 列表视图：只取列表返回的列，不加载任何关系，分页直接作用在主表上
+- 存在性检查：EXISTS 或单列查询，不构造 ORM 对象
+"""
+from sqlalchemy import exists
+from sqlalchemy.orm import Session, load_only
+
+from ..models import KnowledgeItem
+
+
+# 与 schemas.knowledge.KnowledgeItem 返回的字段一致
+KNOWLEDGE_LIST_COLUMNS = (
+    KnowledgeItem.id,
+    KnowledgeItem.title,
+    KnowledgeItem.type,
+    KnowledgeItem.folder_id,
+    KnowledgeItem.created_at,
+    KnowledgeItem.updated_at
+)
+
+
+def knowledge_list():
+    return (load_only(*KNOWLEDGE_LIST_COLUMNS),)
+
+
+def row_exists(db: Session, *criteria) -> bool:
+    return db.query(exists().where(*criteria)).scalar()
@@ -1,9 +1,14 @@
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Dict, List, Optional, Set
 
-from ..models import MarkdownContent, KnowledgeItem
+from ..models import MarkdownContent, MarkdownImportRecord, KnowledgeItem, knowledge_tags
 from ..schemas import markdown as markdown_schemas
 from ..services.file_service import file_service
+from ..services.search_service import search_service
+from ..services.suggest_service import suggest_service
+from . import blob as blob_crud
+from . import tag as tag_crud
+from . import version as version_crud
 
 
 def get_markdown_content(db: Session, markdown_id: int) -> Optional[MarkdownContent]:
@@ -30,11 +35,22 @@ def create_markdown_content(
         file_path=file_path
     )
     db.add(db_markdown)
+    blob_crud.add_refs(db, [file_path])
+    version_crud.add_version(db, knowledge_id, content, file_path=file_path)
+    search_service.update_columns(db, knowledge_id, markdown=content)
     db.commit()
     db.refresh(db_markdown)
     return db_markdown
 
 
+def _read_previous(file_path: str) -> Optional[str]:
+    # 修改前的内容用于计算版本差异，读不到时由 version_crud 从历史中还原
+    try:
+        return file_service.read_markdown(file_path)
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
 def update_markdown_content(
     db: Session, 
     knowledge_id: int, 
@@ -44,11 +60,58 @@ def update_markdown_content(
     if not db_markdown:
         return None
     
-    # 更新文件内容
-    file_service.update_markdown(db_markdown.file_path, content)
-    
-    # 不需要更新数据库记录，因为只更新了文件内容
+    # 内容变化时写入新的 blob，旧文件不做原地修改
+    old_path = db_markdown.file_path
+    file_path = file_service.save_markdown(content)
+    legacy_paths = []
+    if file_path != old_path:
+        version_crud.add_version(db, knowledge_id, content, _read_previous(old_path), file_path)
+        db_markdown.file_path = file_path
+        blob_crud.add_refs(db, [file_path])
+        legacy_paths = blob_crud.release_refs(db, [old_path])
+
+    search_service.update_columns(db, knowledge_id, markdown=content)
     db.commit()
+
+    for legacy_path in legacy_paths:
+        file_service.delete_file(legacy_path)
+    return db_markdown
+
+
+def replace_markdown_file(
+    db: Session,
+    knowledge_id: int,
+    file_path: str
+) -> MarkdownContent:
+    """把已写入 blob 存储的文件设为知识项的 Markdown 内容，没有内容时新建
+
+    版本差异和全文索引都需要正文，这里会把文件完整读入内存一次（上限为 MARKDOWN_MAX_UPLOAD_BYTES）；
+    上传本身仍是流式的。需要快照时版本直接引用这个 blob，不会再写一份。内容没有变化时不读取。
+    """
+    db_markdown = get_markdown_content_by_knowledge(db, knowledge_id)
+    if db_markdown is not None and db_markdown.file_path == file_path:
+        return db_markdown
+
+    content = file_service.read_markdown(file_path)
+    legacy_paths = []
+    if db_markdown is None:
+        db_markdown = MarkdownContent(knowledge_item_id=knowledge_id, file_path=file_path)
+        db.add(db_markdown)
+        blob_crud.add_refs(db, [file_path])
+        version_crud.add_version(db, knowledge_id, content, file_path=file_path)
+    else:
+        old_path = db_markdown.file_path
+        version_crud.add_version(db, knowledge_id, content, _read_previous(old_path), file_path)
+        db_markdown.file_path = file_path
+        blob_crud.add_refs(db, [file_path])
+        legacy_paths = blob_crud.release_refs(db, [old_path])
+
+    search_service.update_columns(db, knowledge_id, markdown=content)
+    db.commit()
+    db.refresh(db_markdown)
+
+    for legacy_path in legacy_paths:
+        file_service.delete_file(legacy_path)
     return db_markdown
 
 
@@ -60,12 +123,14 @@ def delete_markdown_content(
     if not db_markdown:
         return None
     
-    # 删除文件
-    file_service.delete_file(db_markdown.file_path)
-    
-    # 删除数据库记录
+    # 删除数据库记录，blob 由 gc 清理，旧文件在提交后删除
+    legacy_paths = blob_crud.release_refs(db, [db_markdown.file_path])
     db.delete(db_markdown)
+    search_service.update_columns(db, knowledge_id, markdown="")
     db.commit()
+
+    for legacy_path in legacy_paths:
+        file_service.delete_file(legacy_path)
     return db_markdown
 
 
@@ -89,3 +154,62 @@ def get_markdown_content_with_data(
         updated_at=db_markdown.updated_at,
         content=content
     )
+
+
+def get_imported_paths(db: Session, source: str) -> Set[str]:
+    return {
+        row[0] for row in db.query(MarkdownImportRecord.path).filter(MarkdownImportRecord.source == source)
+    }
+
+
+def import_markdown_notes(db: Session, source: str, notes: List[Dict]) -> List[int]:
+    """批量写入导入的笔记，返回新建的知识项 id
+
+    notes 中每项包含 path、title、content、folder_id、tags（标签名列表）。文件经 FileService 写入 blob 存储，
+    知识项、内容、blob 引用、标签关联、索引和导入记录在同一个事务中提交；提交失败时写入的 blob 留给 gc 清理。
+    """
+    tag_ids, new_tags = tag_crud.get_or_create_tags(db, [name for note in notes for name in note["tags"]])
+    try:
+        file_paths = [file_service.save_markdown(note["content"], cache=False) for note in notes]
+
+        db_items = [
+            KnowledgeItem(title=note["title"][:255], type="markdown", folder_id=note["folder_id"])
+            for note in notes
+        ]
+        db.add_all(db_items)
+        db.flush()
+
+        db.add_all([
+            MarkdownContent(knowledge_item_id=db_item.id, file_path=file_path)
+            for db_item, file_path in zip(db_items, file_paths)
+        ])
+        blob_crud.add_refs(db, file_paths)
+        db.add_all([
+            MarkdownImportRecord(source=source, path=note["path"], knowledge_item_id=db_item.id)
+            for db_item, note in zip(db_items, notes)
+        ])
+        links = [
+            {"knowledge_item_id": db_item.id, "tag_id": tag_ids[name]}
+            for db_item, note in zip(db_items, notes)
+            for name in dict.fromkeys(note["tags"])
+        ]
+        if links:
+            db.execute(knowledge_tags.insert(), links)
+        search_service.add_items(db, [
+            {"id": db_item.id, "title": db_item.title, "tags": " ".join(note["tags"]), "markdown": note["content"]}
+            for db_item, note in zip(db_items, notes)
+        ])
+
+        # 提交后对象会过期，先取出后面要用的字段
+        created = [(db_item.id, db_item.title) for db_item in db_items]
+        created_tags = [(tag.id, tag.name) for tag in new_tags]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for tag_id, name in created_tags:
+        suggest_service.update_tag(tag_id, name)
+    for item_id, title in created:
+        suggest_service.update_knowledge(item_id, title)
+    return [item_id for item_id, _ in created]
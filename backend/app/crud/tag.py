@@ -1,21 +1,57 @@
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 
-from ..models import Tag
+from ..models import Tag, knowledge_tags
 from ..schemas import tag as tag_schemas
+from ..services.search_service import search_service
+from ..services.suggest_service import suggest_service
+from ..utils.pagination import keyset_paginate
+
+
+SORT_COLUMNS = {
+    "id": Tag.id,
+    "created_at": Tag.created_at,
+    "name": Tag.name
+}
 
 
 def get_tag(db: Session, tag_id: int) -> Optional[Tag]:
     return db.query(Tag).filter(Tag.id == tag_id).first()
 
 
+def get_missing_tag_ids(db: Session, tag_ids: List[int]) -> List[int]:
+    found = {row[0] for row in db.query(Tag.id).filter(Tag.id.in_(tag_ids)).all()}
+    return sorted(set(tag_ids) - found)
+
+
 def get_tag_by_name(db: Session, name: str) -> Optional[Tag]:
     return db.query(Tag).filter(Tag.name == name).first()
 
 
-def get_tags(db: Session, page: int = 1, page_size: int = 20) -> List[Tag]:
-    skip = (page - 1) * page_size
-    return db.query(Tag).offset(skip).limit(page_size).all()
+def get_or_create_tags(db: Session, names: List[str]) -> Tuple[Dict[str, int], List[Tag]]:
+    """按名称批量取标签 id，不存在的一起创建；只 flush 不提交，返回 (名称到 id 的映射, 新建的标签)"""
+    names = list(dict.fromkeys(names))
+    tag_ids = dict(db.query(Tag.name, Tag.id).filter(Tag.name.in_(names)).all()) if names else {}
+    created = [Tag(name=name) for name in names if name not in tag_ids]
+    if created:
+        db.add_all(created)
+        db.flush()
+        tag_ids.update((tag.name, tag.id) for tag in created)
+    return tag_ids, created
+
+
+def get_tags(
+    db: Session, 
+    page: int = 1, 
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc"
+) -> Tuple[List[Tag], Optional[str]]:
+    return keyset_paginate(
+        db.query(Tag), SORT_COLUMNS, Tag.id,
+        sort=sort, order=order, cursor=cursor, limit=page_size, page=page
+    )
 
 
 def create_tag(db: Session, tag: tag_schemas.TagCreate) -> Tag:
@@ -31,6 +67,7 @@ def create_tag(db: Session, tag: tag_schemas.TagCreate) -> Tag:
     db.add(db_tag)
     db.commit()
     db.refresh(db_tag)
+    suggest_service.update_tag(db_tag.id, db_tag.name)
     return db_tag
 
 
@@ -43,8 +80,15 @@ def update_tag(db: Session, tag_id: int, tag: tag_schemas.TagUpdate) -> Optional
     for field, value in update_data.items():
         setattr(db_tag, field, value)
     
+    if "name" in update_data:
+        db.flush()
+        for item_id in _get_tagged_item_ids(db, tag_id):
+            search_service.update_tags(db, item_id)
+    
     db.commit()
     db.refresh(db_tag)
+    if "name" in update_data:
+        suggest_service.update_tag(tag_id, db_tag.name)
     return db_tag
 
 
@@ -53,6 +97,18 @@ def delete_tag(db: Session, tag_id: int) -> Optional[Tag]:
     if not db_tag:
         return None
     
+    item_ids = _get_tagged_item_ids(db, tag_id)
     db.delete(db_tag)
+    db.flush()
+    for item_id in item_ids:
+        search_service.update_tags(db, item_id)
     db.commit()
+    suggest_service.remove_tag(tag_id)
     return db_tag
+
+
+def _get_tagged_item_ids(db: Session, tag_id: int) -> List[int]:
+    rows = db.query(knowledge_tags.c.knowledge_item_id).filter(
+        knowledge_tags.c.tag_id == tag_id
+    ).all()
+    return [row[0] for row in rows]
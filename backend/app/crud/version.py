@@ -0,0 +1,332 @@
+import difflib
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import MarkdownVersion
+from ..schemas import markdown as markdown_schemas
+from ..services.file_service import file_service
+from ..utils.pagination import keyset_paginate
+from . import blob as blob_crud
+
+
+SORT_COLUMNS = {
+    "version": MarkdownVersion.version
+}
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+
+def _normalize(content: str) -> str:
+    # 与 FileService 读取时的换行处理一致，快照读回后才能与差异对得上
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return content
+
+
+def _hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def make_delta(old_lines: List[str], new_lines: List[str]) -> List:
+    """行级差异，每项为 [i1, i2, 新行列表]，表示用新行替换旧内容的 [i1, i2) 行"""
+    # 一次编辑通常只改动中间一段，先去掉相同的首尾再比较，大文件也只对改动的部分做匹配
+    limit = min(len(old_lines), len(new_lines))
+    start = 0
+    while start < limit and old_lines[start] == new_lines[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old_lines[-end - 1] == new_lines[-end - 1]:
+        end += 1
+    matcher = difflib.SequenceMatcher(
+        None, old_lines[start:len(old_lines) - end], new_lines[start:len(new_lines) - end]
+    )
+    return [
+        [start + i1, start + i2, new_lines[start + j1:start + j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"
+    ]
+
+
+def apply_delta(lines: List[str], delta: List) -> List[str]:
+    result = []
+    position = 0
+    for i1, i2, new_lines in delta:
+        result.extend(lines[position:i1])
+        result.extend(new_lines)
+        position = i2
+    result.extend(lines[position:])
+    return result
+
+
+def _fill(
+    db_version: MarkdownVersion,
+    lines: List[str],
+    previous_lines: Optional[List[str]],
+    chain: int,
+    file_path: Optional[str] = None
+):
+    """按内容填充版本记录：距上一个快照不足间隔且差异比全文小时保存差异，否则写入快照
+
+    chain 为上一个快照之后已有的差异版本数。file_path 为已经保存了同样内容的 blob，
+    需要快照时直接引用，不再重新编码写入。快照的 blob 引用由调用方登记。
+    """
+    content = "".join(lines)
+    data = content.encode("utf-8")
+    db_version.size = len(data)
+    db_version.content_hash = hashlib.sha256(data).hexdigest()
+    if previous_lines is not None and chain + 1 < settings.MARKDOWN_VERSION_SNAPSHOT_INTERVAL:
+        delta = json.dumps(make_delta(previous_lines, lines), ensure_ascii=False, separators=(",", ":"))
+        if len(delta.encode("utf-8")) < len(data):
+            db_version.kind = DELTA
+            db_version.delta = delta
+            db_version.file_path = None
+            return
+    db_version.kind = SNAPSHOT
+    db_version.delta = None
+    db_version.file_path = file_path or file_service.save_markdown(content, cache=False)
+
+
+def get_version(db: Session, knowledge_id: int, version: int) -> Optional[MarkdownVersion]:
+    return db.query(MarkdownVersion).filter(
+        MarkdownVersion.knowledge_item_id == knowledge_id,
+        MarkdownVersion.version == version
+    ).first()
+
+
+def get_latest_version(db: Session, knowledge_id: int) -> Optional[MarkdownVersion]:
+    return db.query(MarkdownVersion).filter(
+        MarkdownVersion.knowledge_item_id == knowledge_id
+    ).order_by(MarkdownVersion.version.desc()).first()
+
+
+def get_versions(
+    db: Session,
+    knowledge_id: int,
+    page: int = 1,
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    order: str = "desc"
+) -> Tuple[List[MarkdownVersion], Optional[str]]:
+    query = db.query(MarkdownVersion).filter(MarkdownVersion.knowledge_item_id == knowledge_id)
+    return keyset_paginate(
+        query, SORT_COLUMNS, MarkdownVersion.version,
+        sort="version", order=order, cursor=cursor, limit=page_size, page=page
+    )
+
+
+def _version_lines(db: Session, knowledge_id: int, version: int) -> List[str]:
+    """从不晚于该版本的最近一个快照开始依次应用差异，最多应用 MARKDOWN_VERSION_SNAPSHOT_INTERVAL - 1 个"""
+    snapshot = db.query(MarkdownVersion).filter(
+        MarkdownVersion.knowledge_item_id == knowledge_id,
+        MarkdownVersion.kind == SNAPSHOT,
+        MarkdownVersion.version <= version
+    ).order_by(MarkdownVersion.version.desc()).first()
+    lines = file_service.read_markdown(snapshot.file_path).splitlines(keepends=True)
+    deltas = db.execute(
+        select(MarkdownVersion.delta).where(
+            MarkdownVersion.knowledge_item_id == knowledge_id,
+            MarkdownVersion.version > snapshot.version,
+            MarkdownVersion.version <= version
+        ).order_by(MarkdownVersion.version)
+    ).scalars()
+    for delta in deltas:
+        lines = apply_delta(lines, json.loads(delta))
+    return lines
+
+
+def get_version_content(db: Session, knowledge_id: int, version: int) -> Optional[str]:
+    if get_version(db, knowledge_id, version) is None:
+        return None
+    return "".join(_version_lines(db, knowledge_id, version))
+
+
+def get_version_with_content(
+    db: Session,
+    knowledge_id: int,
+    version: int
+) -> Optional[markdown_schemas.MarkdownVersionWithContent]:
+    db_version = get_version(db, knowledge_id, version)
+    if not db_version:
+        return None
+    return markdown_schemas.MarkdownVersionWithContent(
+        id=db_version.id,
+        knowledge_item_id=db_version.knowledge_item_id,
+        version=db_version.version,
+        kind=db_version.kind,
+        size=db_version.size,
+        content_hash=db_version.content_hash,
+        created_at=db_version.created_at,
+        content="".join(_version_lines(db, knowledge_id, version))
+    )
+
+
+def diff_versions(db: Session, knowledge_id: int, from_version: int, to_version: int) -> Optional[Dict]:
+    """两个版本的 unified diff 及增删行数，任一版本不存在时返回 None"""
+    old_content = get_version_content(db, knowledge_id, from_version)
+    new_content = get_version_content(db, knowledge_id, to_version)
+    if old_content is None or new_content is None:
+        return None
+    diff = list(difflib.unified_diff(
+        old_content.splitlines(keepends=True),
+        new_content.splitlines(keepends=True),
+        fromfile=f"v{from_version}",
+        tofile=f"v{to_version}"
+    ))
+    return {
+        "from_version": from_version,
+        "to_version": to_version,
+        # 前两行是 ---/+++ 文件头
+        "added": sum(1 for line in diff[2:] if line.startswith("+")),
+        "removed": sum(1 for line in diff[2:] if line.startswith("-")),
+        # 最后一行没有换行符时补上，拼接后每行仍然独立
+        "diff": "".join(line if line.endswith("\n") else line + "\n" for line in diff)
+    }
+
+
+def _chain_length(db: Session, knowledge_id: int) -> int:
+    last_snapshot = select(func.max(MarkdownVersion.version)).where(
+        MarkdownVersion.knowledge_item_id == knowledge_id,
+        MarkdownVersion.kind == SNAPSHOT
+    ).scalar_subquery()
+    return db.execute(
+        select(func.count()).select_from(MarkdownVersion).where(
+            MarkdownVersion.knowledge_item_id == knowledge_id,
+            MarkdownVersion.version > last_snapshot
+        )
+    ).scalar()
+
+
+def add_version(
+    db: Session,
+    knowledge_id: int,
+    content: str,
+    previous: Optional[str] = None,
+    file_path: Optional[str] = None
+) -> Optional[MarkdownVersion]:
+    """记录一个新版本，与内容的修改在同一个事务中提交；内容与最新版本相同时不记录
+
+    previous 为修改前的内容：还没有历史时（功能上线前创建或导入的笔记）先把它记为第一个版本；
+    与最新版本一致时直接用它计算差异，否则从历史中还原最新版本。
+    file_path 为 content 所在的 blob（FileService 保存或上传返回的路径），写快照时直接引用。
+    """
+    content = _normalize(content)
+    digest = _hash(content)
+    if previous is not None:
+        previous = _normalize(previous)
+
+    latest = get_latest_version(db, knowledge_id)
+    new_paths = []
+    if latest is None and previous is not None and _hash(previous) != digest:
+        latest = MarkdownVersion(knowledge_item_id=knowledge_id, version=1)
+        _fill(latest, previous.splitlines(keepends=True), None, 0)
+        db.add(latest)
+        db.flush()
+        new_paths.append(latest.file_path)
+    elif latest is not None and latest.content_hash == digest:
+        return None
+
+    previous_lines = None
+    chain = 0
+    if latest is not None:
+        if previous is not None and _hash(previous) == latest.content_hash:
+            previous_lines = previous.splitlines(keepends=True)
+        else:
+            try:
+                previous_lines = _version_lines(db, knowledge_id, latest.version)
+            except (OSError, UnicodeDecodeError):
+                # 快照文件丢失时从这里重新开始一条完整的链
+                previous_lines = None
+        chain = _chain_length(db, knowledge_id)
+
+    db_version = MarkdownVersion(knowledge_item_id=knowledge_id, version=latest.version + 1 if latest else 1)
+    _fill(db_version, content.splitlines(keepends=True), previous_lines, chain, file_path)
+    db.add(db_version)
+    if db_version.file_path:
+        new_paths.append(db_version.file_path)
+    blob_crud.add_refs(db, new_paths)
+    return db_version
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite 读出的是不带时区的 UTC 时间，PostgreSQL 读出的带时区
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def _compact_item(db: Session, knowledge_id: int, cutoff: datetime) -> int:
+    """早于 cutoff 的版本每天只保留最后一个，第一个版本始终保留；保留的版本重新计算差异和快照"""
+    versions = db.query(MarkdownVersion).filter(
+        MarkdownVersion.knowledge_item_id == knowledge_id
+    ).order_by(MarkdownVersion.version).all()
+
+    last_of_day = {}
+    keep = set()
+    for db_version in versions:
+        created_at = _utc(db_version.created_at)
+        if created_at < cutoff:
+            last_of_day[created_at.date()] = db_version.version
+        else:
+            keep.add(db_version.version)
+    keep.update(last_of_day.values())
+    keep.add(versions[0].version)
+    if len(keep) == len(versions):
+        return 0
+
+    old_paths = [v.file_path for v in versions if v.kind == SNAPSHOT]
+    new_paths = []
+    lines: List[str] = []
+    previous_lines = None
+    chain = 0
+    for db_version in versions:
+        # 先按原记录还原出这个版本的内容，再改写记录
+        if db_version.kind == SNAPSHOT:
+            lines = file_service.read_markdown(db_version.file_path).splitlines(keepends=True)
+        else:
+            lines = apply_delta(lines, json.loads(db_version.delta))
+        if db_version.version not in keep:
+            db.delete(db_version)
+            continue
+        _fill(db_version, lines, previous_lines, chain)
+        if db_version.kind == SNAPSHOT:
+            new_paths.append(db_version.file_path)
+            chain = 0
+        else:
+            chain += 1
+        previous_lines = lines
+
+    blob_crud.add_refs(db, new_paths)
+    blob_crud.release_refs(db, old_paths)
+    db.commit()
+    return len(versions) - len(keep)
+
+
+def compact_versions(db: Session, older_than_days: Optional[int] = None) -> Dict[str, int]:
+    """合并旧版本：超过天数的版本每天只保留最后一个，每个知识项单独提交"""
+    if older_than_days is None:
+        older_than_days = settings.MARKDOWN_VERSION_COMPACT_AFTER_DAYS
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    # 只有一个版本的知识项不需要处理
+    knowledge_ids = list(db.execute(
+        select(MarkdownVersion.knowledge_item_id).where(
+            MarkdownVersion.created_at < cutoff
+        ).group_by(MarkdownVersion.knowledge_item_id).having(func.count() > 1)
+    ).scalars())
+    db.rollback()
+
+    items = removed = failed = 0
+    for knowledge_id in knowledge_ids:
+        try:
+            count = _compact_item(db, knowledge_id, cutoff)
+        except (OSError, UnicodeDecodeError):
+            # 快照文件丢失或损坏，这个知识项的历史保持原样
+            db.rollback()
+            failed += 1
+            continue
+        items += count > 0
+        removed += count
+    return {"items": items, "versions": removed, "failed": failed}
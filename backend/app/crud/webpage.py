@@ -1,10 +1,19 @@
 from sqlalchemy.orm import Session
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime
 
-from ..models import WebpageContent
+from ..models import WebpageContent, WebpageRefreshState, KnowledgeItem, LearningRecord, Tag
 from ..schemas import webpage as webpage_schemas
 from ..services.webpage_fetcher import webpage_fetcher
+from ..services.search_service import search_service
+from ..services.suggest_service import suggest_service
+from ..services.refresh_scheduler import next_refresh_interval
+from ..utils.url import canonical_url
+from . import knowledge as knowledge_crud
+
+
+# 抓取后提取出的、需要比较是否变化的字段
+EXTRACTED_FIELDS = ("title", "description", "summary", "keywords")
 
 
 def get_webpage_content(db: Session, webpage_id: int) -> Optional[WebpageContent]:
@@ -17,6 +26,24 @@ def get_webpage_content_by_knowledge(db: Session, knowledge_id: int) -> Optional
     ).first()
 
 
+def get_webpage_by_url(db: Session, url: str) -> Optional[WebpageContent]:
+    """按规范 URL 查找已保存的网页，用于判断网址是否已经保存过"""
+    return db.query(WebpageContent).filter(
+        WebpageContent.canonical_url == canonical_url(url)
+    ).first()
+
+
+def get_webpages_by_canonical_urls(db: Session, canonical_urls: List[str]) -> Dict[str, WebpageContent]:
+    webpages = {}
+    # 分批查询，避免 IN 参数过多
+    for start in range(0, len(canonical_urls), 500):
+        for webpage in db.query(WebpageContent).filter(
+            WebpageContent.canonical_url.in_(canonical_urls[start:start + 500])
+        ).all():
+            webpages[webpage.canonical_url] = webpage
+    return webpages
+
+
 def create_webpage_content(
     db: Session, 
     knowledge_id: int, 
@@ -25,6 +52,7 @@ def create_webpage_content(
     db_webpage = WebpageContent(
         knowledge_item_id=knowledge_id,
         url=webpage_data.get("url"),
+        canonical_url=canonical_url(webpage_data.get("url")),
         title=webpage_data.get("title"),
         description=webpage_data.get("description"),
         summary=webpage_data.get("summary"),
@@ -32,6 +60,7 @@ def create_webpage_content(
         fetched_at=datetime.utcnow()
     )
     db.add(db_webpage)
+    search_service.update_webpage(db, knowledge_id, db_webpage)
     db.commit()
     db.refresh(db_webpage)
     return db_webpage
@@ -58,7 +87,9 @@ def update_webpage_content(
     
     for field, value in update_data.items():
         setattr(db_webpage, field, value)
+    db_webpage.canonical_url = canonical_url(db_webpage.url)
     
+    search_service.update_webpage(db, knowledge_id, db_webpage)
     db.commit()
     db.refresh(db_webpage)
     return db_webpage
@@ -73,32 +104,268 @@ def delete_webpage_content(
         return None
     
     db.delete(db_webpage)
+    search_service.update_webpage(db, knowledge_id, None)
     db.commit()
     return db_webpage
 
 
-def fetch_webpage(
+async def fetch_webpage(
     db: Session, 
     url: str
 ) -> Dict:
     # 抓取网页内容
-    return webpage_fetcher.fetch(url)
+    return await webpage_fetcher.fetch(url)
 
 
-def create_or_update_webpage_content(
+async def create_or_update_webpage_content(
     db: Session, 
     knowledge_id: int, 
     url: str
 ) -> Optional[WebpageContent]:
     # 抓取网页内容
-    webpage_data = fetch_webpage(db, url)
+    webpage_data = await fetch_webpage(db, url)
     
     # 检查是否已存在
     existing_webpage = get_webpage_content_by_knowledge(db, knowledge_id)
     
+    # 页面未变化且已保存过，跳过数据库写入
+    if (
+        existing_webpage
+        and webpage_data.get("not_modified")
+        and existing_webpage.url == url
+        and existing_webpage.fetched_at is not None
+    ):
+        return existing_webpage
+    
     if existing_webpage:
         # 更新现有记录
         return update_webpage_content(db, knowledge_id, webpage_data)
     else:
         # 创建新记录
         return create_webpage_content(db, knowledge_id, webpage_data)
+
+
+def create_webpage_items(
+    db: Session, 
+    urls: List[str], 
+    folder_id: Optional[int] = None
+) -> List[Tuple[int, str]]:
+    """批量创建网页知识项及其网页内容，标题先用 URL 占位，返回 (knowledge_id, url) 列表
+
+    调用方需保证 urls 的规范 URL 互不相同且尚未保存。
+    """
+    db_items = [
+        KnowledgeItem(title=url[:255], type="webpage", folder_id=folder_id)
+        for url in urls
+    ]
+    db.add_all(db_items)
+    db.flush()
+    
+    db.add_all([
+        WebpageContent(knowledge_item_id=db_item.id, url=url, canonical_url=canonical_url(url))
+        for db_item, url in zip(db_items, urls)
+    ])
+    db.flush()
+    
+    for db_item in db_items:
+        search_service.update_columns(db, db_item.id, title=db_item.title)
+    db.commit()
+    
+    for db_item in db_items:
+        suggest_service.update_knowledge(db_item.id, db_item.title)
+    return [(db_item.id, url) for db_item, url in zip(db_items, urls)]
+
+
+def apply_fetch_results(db: Session, results: List[Tuple[int, Dict]]):
+    """批量写入抓取结果，占位标题替换为网页标题，整批一次提交"""
+    if not results:
+        return
+    
+    knowledge_ids = [knowledge_id for knowledge_id, _ in results]
+    webpages = {
+        webpage.knowledge_item_id: webpage
+        for webpage in db.query(WebpageContent).filter(
+            WebpageContent.knowledge_item_id.in_(knowledge_ids)
+        ).all()
+    }
+    items = {
+        item.id: item
+        for item in db.query(KnowledgeItem).filter(KnowledgeItem.id.in_(knowledge_ids)).all()
+    }
+    
+    renamed = []
+    fetched_at = datetime.utcnow()
+    for knowledge_id, webpage_data in results:
+        db_webpage = webpages.get(knowledge_id)
+        if db_webpage is None:
+            continue
+        
+        for field in EXTRACTED_FIELDS:
+            setattr(db_webpage, field, webpage_data.get(field))
+        db_webpage.fetched_at = fetched_at
+        
+        db_item = items.get(knowledge_id)
+        title = webpage_data.get("title")
+        if db_item is not None and title and db_item.title == db_webpage.url[:255]:
+            db_item.title = title[:255]
+            renamed.append(db_item)
+    
+    db.flush()
+    for knowledge_id, db_webpage in webpages.items():
+        db_item = items.get(knowledge_id)
+        if db_item is None:
+            continue
+        search_service.update_columns(
+            db,
+            knowledge_id,
+            title=db_item.title,
+            webpage=search_service.webpage_text(db_webpage)
+        )
+    db.commit()
+    
+    for db_item in renamed:
+        suggest_service.update_knowledge(db_item.id, db_item.title)
+
+
+def backfill_canonical_urls(db: Session) -> int:
+    """为缺少规范 URL 的网页补上该列；与已有记录重复的保持为空，等待 dedup-webpages 合并"""
+    rows = db.query(WebpageContent).filter(WebpageContent.canonical_url.is_(None)).all()
+    if not rows:
+        return 0
+    
+    canonical = {webpage.id: canonical_url(webpage.url) for webpage in rows}
+    taken = set(get_webpages_by_canonical_urls(db, list(set(canonical.values()))))
+    filled = 0
+    for webpage in sorted(rows, key=lambda webpage: webpage.id):
+        key = canonical[webpage.id]
+        if key in taken:
+            continue
+        webpage.canonical_url = key
+        taken.add(key)
+        filled += 1
+    db.commit()
+    return filled
+
+
+def find_duplicate_webpages(db: Session) -> List[List[WebpageContent]]:
+    """按规范 URL 分组，返回包含多条记录的分组，每组按创建顺序排列"""
+    groups: Dict[str, List[WebpageContent]] = {}
+    for webpage in db.query(WebpageContent).order_by(WebpageContent.id).all():
+        groups.setdefault(canonical_url(webpage.url), []).append(webpage)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def merge_duplicate_webpages(db: Session, group: List[WebpageContent]) -> WebpageContent:
+    """把重复的网页知识项合并到最早创建的一条
+
+    标签和学习记录并入保留的知识项；保留项缺少的网页字段取自最近抓取的重复项；
+    其余知识项按 knowledge.stage_item_deletion 删除，附件、版本等关联数据一并清理，全部在一个事务中提交。
+    """
+    keep, duplicates = group[0], group[1:]
+    keep_item = keep.knowledge_item
+    duplicate_ids = [webpage.knowledge_item_id for webpage in duplicates]
+    
+    latest = max(
+        (webpage for webpage in duplicates if webpage.fetched_at is not None),
+        key=lambda webpage: webpage.fetched_at,
+        default=None
+    )
+    if latest is not None and (keep.fetched_at is None or latest.fetched_at > keep.fetched_at):
+        for field in EXTRACTED_FIELDS:
+            if getattr(keep, field) is None:
+                setattr(keep, field, getattr(latest, field))
+        keep.fetched_at = latest.fetched_at
+    
+    tags = db.query(Tag).join(Tag.knowledge_items).filter(KnowledgeItem.id.in_(duplicate_ids)).all()
+    for tag in tags:
+        if tag not in keep_item.tags:
+            keep_item.tags.append(tag)
+    db.query(LearningRecord).filter(
+        LearningRecord.knowledge_item_id.in_(duplicate_ids)
+    ).update({LearningRecord.knowledge_item_id: keep_item.id}, synchronize_session=False)
+    
+    # 重复项连同刷新状态、附件、进行中的上传和 blob 引用一起删除，与合并在同一个事务中提交
+    after_commit = knowledge_crud.stage_item_deletion(db, duplicate_ids)
+    
+    # 规范 URL 有唯一约束，重复项的行已经删除，flush 时才写到保留项上
+    keep.canonical_url = canonical_url(keep.url)
+    db.flush()
+    search_service.index_item(db, keep_item.id)
+    db.commit()
+    after_commit()
+    return keep
+
+
+def get_refresh_schedule(
+    db: Session
+) -> List[Tuple[int, Optional[datetime], Optional[datetime], Optional[int]]]:
+    """返回所有网页的 (webpage_id, 上次检查时间, 上次抓取时间, 刷新间隔秒数)"""
+    return db.query(
+        WebpageContent.id,
+        WebpageRefreshState.checked_at,
+        WebpageContent.fetched_at,
+        WebpageRefreshState.refresh_interval
+    ).outerjoin(
+        WebpageRefreshState, WebpageRefreshState.webpage_id == WebpageContent.id
+    ).all()
+
+
+def apply_refresh_result(
+    db: Session, 
+    webpage_id: int, 
+    webpage_data: Dict
+) -> Optional[Tuple[WebpageRefreshState, List[str]]]:
+    """写入定时刷新的结果：只更新内容有变化的字段，并按是否变化调整下次刷新间隔
+
+    返回 (刷新状态, 变化的字段)；网页已被删除时返回 None。
+    """
+    db_webpage = get_webpage_content(db, webpage_id)
+    if not db_webpage:
+        return None
+    
+    # 未变化（304 或内容哈希相同）时返回的是上次提取的结果，仍逐字段比较，确保库中内容与之一致
+    failed = "error" in webpage_data
+    changed = []
+    if not failed:
+        changed = [
+            field for field in EXTRACTED_FIELDS
+            if webpage_data.get(field) != getattr(db_webpage, field)
+        ]
+    
+    now = datetime.utcnow()
+    renamed = None
+    if changed:
+        for field in changed:
+            setattr(db_webpage, field, webpage_data.get(field))
+        db_webpage.fetched_at = now
+        
+        db_item = db_webpage.knowledge_item
+        title = webpage_data.get("title")
+        if title and db_item.title == db_webpage.url[:255]:
+            db_item.title = title[:255]
+            renamed = db_item
+        
+        db.flush()
+        search_service.update_columns(
+            db,
+            db_webpage.knowledge_item_id,
+            title=db_item.title,
+            webpage=search_service.webpage_text(db_webpage)
+        )
+    
+    state = db.query(WebpageRefreshState).filter(
+        WebpageRefreshState.webpage_id == webpage_id
+    ).first()
+    if state is None:
+        state = WebpageRefreshState(webpage_id=webpage_id, change_count=0, failure_count=0)
+    state.checked_at = now
+    state.refresh_interval = next_refresh_interval(state.refresh_interval, bool(changed), failed)
+    state.change_count = (state.change_count or 0) + (1 if changed else 0)
+    state.failure_count = ((state.failure_count or 0) + 1) if failed else 0
+    db.add(state)
+    db.commit()
+    db.refresh(state)
+    
+    if renamed is not None:
+        suggest_service.update_knowledge(renamed.id, renamed.title)
+    return state, changed
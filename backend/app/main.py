@@ -1,20 +1,49 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
 
 from .config import settings
-from .database import engine, Base
+from .database import engine, Base, SessionLocal, migrate_schema
 from .models import (
     Folder,
     KnowledgeItem,
     MarkdownContent,
+    MarkdownBlob,
+    MarkdownImportRecord,
+    MarkdownVersion,
     WebpageContent,
+    WebpageRefreshState,
     Tag,
-    LearningRecord
+    LearningRecord,
+    Attachment,
+    AttachmentUpload,
+    AttachmentUploadChunk
 )
-from .api.v1 import folders, tags, knowledge, markdown, webpage
+from .api.v1 import folders, tags, knowledge, markdown, attachments, webpage, system
+from .crud import folder as folder_crud
+from .crud import webpage as webpage_crud
+from .services.search_service import search_service
+from .services.webpage_fetcher import webpage_fetcher
+from .services.executor import cpu_executor, ExecutorBusyError
+from .services.refresh_scheduler import refresh_scheduler
+from .utils.pagination import InvalidCursorError
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await cpu_executor.warm_up()
+    if settings.REFRESH_ENABLED:
+        refresh_scheduler.start()
+    yield
+    await refresh_scheduler.stop()
+    await webpage_fetcher.close()
+    cpu_executor.shutdown()
 
-app = FastAPI(title=settings.APP_NAME, debug=settings.DEBUG)
+
+app = FastAPI(title=settings.APP_NAME, debug=settings.DEBUG, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,7 +53,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(ExecutorBusyError)
+async def executor_busy_handler(request: Request, exc: ExecutorBusyError):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "服务繁忙，请稍后重试"},
+        headers={"Retry-After": "1"}
+    )
+
+
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
 Base.metadata.create_all(bind=engine)
+migrate_schema(engine)
+search_service.init_index(engine)
+
+with SessionLocal() as db:
+    folder_crud.rebuild_folder_paths(db)
+    webpage_crud.backfill_canonical_urls(db)
 
 # API v1 路由
 api_v1_router = APIRouter(prefix="/api/v1")
@@ -34,7 +84,9 @@ api_v1_router.include_router(folders.router)
 api_v1_router.include_router(tags.router)
 api_v1_router.include_router(knowledge.router)
 api_v1_router.include_router(markdown.router)
+api_v1_router.include_router(attachments.router)
 api_v1_router.include_router(webpage.router)
+api_v1_router.include_router(system.router)
 
 # 将 API 路由注册到主应用
 app.include_router(api_v1_router)
@@ -1,16 +1,24 @@
 from .folder import Folder
 from .knowledge import KnowledgeItem
-from .markdown import MarkdownContent
-from .webpage import WebpageContent
+from .markdown import MarkdownBlob, MarkdownContent, MarkdownImportRecord, MarkdownVersion
+from .webpage import WebpageContent, WebpageRefreshState
 from .tag import Tag, knowledge_tags
 from .learning import LearningRecord
+from .attachment import Attachment, AttachmentUpload, AttachmentUploadChunk
 
 __all__ = [
     "Folder",
     "KnowledgeItem",
     "MarkdownContent",
+    "MarkdownBlob",
+    "MarkdownImportRecord",
+    "MarkdownVersion",
     "WebpageContent",
+    "WebpageRefreshState",
     "Tag",
     "knowledge_tags",
-    "LearningRecord"
+    "LearningRecord",
+    "Attachment",
+    "AttachmentUpload",
+    "AttachmentUploadChunk"
 ]
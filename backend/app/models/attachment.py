@@ -0,0 +1,42 @@
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+
+from ..database import Base
+
+
+class Attachment(Base):
+    """知识项的附件；文件按内容的 sha256 存放，内容相同的附件共用一个文件"""
+    __tablename__ = "attachments"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    knowledge_item_id = Column(Integer, ForeignKey("knowledge_items.id", ondelete="CASCADE"), nullable=False, index=True)
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    hash = Column(String(64), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class AttachmentUpload(Base):
+    """进行中的分块上传，分块写入 knowledge/uploads/<id>.part 中各自的偏移处"""
+    __tablename__ = "attachment_uploads"
+
+    id = Column(String(32), primary_key=True)
+    knowledge_item_id = Column(Integer, ForeignKey("knowledge_items.id", ondelete="CASCADE"), nullable=False, index=True)
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    # 客户端声明的整个文件的 sha256，可选；给出时完成上传前校验
+    sha256 = Column(String(64), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # 每收到一个分块更新一次，长时间没有更新的上传由 gc 清理
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+
+
+class AttachmentUploadChunk(Base):
+    """已收到并校验通过的分块"""
+    __tablename__ = "attachment_upload_chunks"
+
+    upload_id = Column(String(32), ForeignKey("attachment_uploads.id", ondelete="CASCADE"), primary_key=True)
+    chunk_index = Column(Integer, primary_key=True)
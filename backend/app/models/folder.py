@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -7,10 +7,18 @@ from ..database import Base
 
 class Folder(Base):
     __tablename__ = "folders"
+    __table_args__ = (
+        Index("ix_folders_created_at_id", "created_at", "id"),
+        Index("ix_folders_updated_at_id", "updated_at", "id"),
+        Index("ix_folders_name_id", "name", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String(255), nullable=False)
-    parent_id = Column(Integer, ForeignKey("folders.id", ondelete="CASCADE"), nullable=True)
+    parent_id = Column(Integer, ForeignKey("folders.id", ondelete="CASCADE"), nullable=True, index=True)
+    # 物化路径，形如 "/1/5/23/"，子树是一段连续的 path 范围；depth 从 1 开始
+    path = Column(String(1000), nullable=True, index=True)
+    depth = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
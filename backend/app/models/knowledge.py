@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -7,6 +7,14 @@ from ..database import Base
 
 class KnowledgeItem(Base):
     __tablename__ = "knowledge_items"
+    # 列表分页按 (排序列, id) 取游标，每种排序方式一个复合索引
+    __table_args__ = (
+        Index("ix_knowledge_items_created_at_id", "created_at", "id"),
+        Index("ix_knowledge_items_updated_at_id", "updated_at", "id"),
+        Index("ix_knowledge_items_title_id", "title", "id"),
+        Index("ix_knowledge_items_folder_id_updated_at_id", "folder_id", "updated_at", "id"),
+        Index("ix_knowledge_items_folder_id_type", "folder_id", "type"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     title = Column(String(255), nullable=False)
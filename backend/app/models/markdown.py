@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -10,8 +10,58 @@ class MarkdownContent(Base):
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     knowledge_item_id = Column(Integer, ForeignKey("knowledge_items.id", ondelete="CASCADE"), nullable=False)
-    file_path = Column(String(500), nullable=False)
+    # 内容寻址的 blob 路径，见 FileService.save_markdown；旧数据可能是 uuid 命名的文件
+    file_path = Column(String(500), nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     knowledge_item = relationship("KnowledgeItem", back_populates="markdown_content")
+
+
+class MarkdownBlob(Base):
+    """内容寻址存储中每个 blob 被 MarkdownContent 引用的次数，归零后由 gc 删除文件"""
+    __tablename__ = "markdown_blobs"
+
+    hash = Column(String(64), primary_key=True)
+    ref_count = Column(Integer, nullable=False, default=0, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class MarkdownVersion(Base):
+    """Markdown 内容的历史版本
+
+    每隔若干个版本保存一次完整快照（snapshot，file_path 指向 blob），其余版本只保存相对上一版本的
+    行级差异（delta，JSON 格式），读取时从最近的快照开始依次应用，链长不超过快照间隔。
+    """
+    __tablename__ = "markdown_versions"
+    __table_args__ = (
+        UniqueConstraint("knowledge_item_id", "version", name="uq_markdown_versions_item_version"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    knowledge_item_id = Column(Integer, ForeignKey("knowledge_items.id", ondelete="CASCADE"), nullable=False, index=True)
+    version = Column(Integer, nullable=False)
+    # snapshot 或 delta
+    kind = Column(String(20), nullable=False)
+    file_path = Column(String(500), nullable=True, index=True)
+    delta = Column(Text, nullable=True)
+    # 该版本正文的字节数和 sha256
+    size = Column(Integer, nullable=False, default=0)
+    content_hash = Column(String(64), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class MarkdownImportRecord(Base):
+    """目录/压缩包导入时已写入的文件，中断后重新导入同一来源时据此跳过"""
+    __tablename__ = "markdown_import_records"
+    __table_args__ = (
+        UniqueConstraint("source", "path", name="uq_markdown_import_records_source_path"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    # 来源标识：目录为 "dir:绝对路径"，压缩包为 "zip:sha256"
+    source = Column(String(300), nullable=False)
+    path = Column(String(1000), nullable=False)
+    knowledge_item_id = Column(Integer, ForeignKey("knowledge_items.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
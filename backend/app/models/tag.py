@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Table, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -10,16 +10,23 @@ knowledge_tags = Table(
     Base.metadata,
     Column("knowledge_item_id", Integer, ForeignKey("knowledge_items.id", ondelete="CASCADE"), primary_key=True),
     Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
-    Column("created_at", DateTime(timezone=True), server_default=func.now())
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    # 主键以 knowledge_item_id 开头，按标签查知识项需要反向索引
+    Index("ix_knowledge_tags_tag_id_item", "tag_id", "knowledge_item_id")
 )
 
 
 class Tag(Base):
     __tablename__ = "tags"
+    __table_args__ = (
+        Index("ix_tags_created_at_id", "created_at", "id"),
+        Index("ix_tags_updated_at_id", "updated_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String(100), nullable=False, unique=True)
     color = Column(String(20), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     knowledge_items = relationship("KnowledgeItem", secondary=knowledge_tags, back_populates="tags")
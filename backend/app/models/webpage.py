@@ -11,6 +11,8 @@ class WebpageContent(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     knowledge_item_id = Column(Integer, ForeignKey("knowledge_items.id", ondelete="CASCADE"), nullable=False)
     url = Column(String(1000), nullable=False)
+    # 判重用的规范 URL，见 utils.url.canonical_url；历史重复数据合并前可能为空
+    canonical_url = Column(String(1000), nullable=True, unique=True, index=True)
     title = Column(String(255), nullable=True)
     description = Column(Text, nullable=True)
     summary = Column(Text, nullable=True)
@@ -20,3 +22,13 @@ class WebpageContent(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     knowledge_item = relationship("KnowledgeItem", back_populates="webpage_content")
+
+
+class WebpageRefreshState(Base):
+    __tablename__ = "webpage_refresh_states"
+
+    webpage_id = Column(Integer, ForeignKey("webpage_contents.id", ondelete="CASCADE"), primary_key=True)
+    checked_at = Column(DateTime(timezone=True), nullable=True)
+    refresh_interval = Column(Integer, nullable=False)
+    change_count = Column(Integer, nullable=False, default=0)
+    failure_count = Column(Integer, nullable=False, default=0)
@@ -5,6 +5,7 @@ from . import markdown
 from . import webpage
 from . import tag
 from . import learning
+from . import attachment
 
 __all__ = [
     "common",
@@ -13,5 +14,6 @@ __all__ = [
     "markdown",
     "webpage",
     "tag",
-    "learning"
+    "learning",
+    "attachment"
 ]
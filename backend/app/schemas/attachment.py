@@ -0,0 +1,34 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+
+class Attachment(BaseModel):
+    id: int
+    knowledge_item_id: int
+    filename: str
+    content_type: str
+    size: int
+    hash: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class AttachmentUploadCreate(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=1000)
+    size: int = Field(..., ge=0)
+    content_type: Optional[str] = None
+    # 整个文件的 sha256，可选；给出时完成上传后校验
+    sha256: Optional[str] = Field(None, pattern="^[0-9a-fA-F]{64}$")
+
+
+class AttachmentUpload(BaseModel):
+    id: str
+    knowledge_item_id: int
+    filename: str
+    size: int
+    chunk_size: int
+    chunk_count: int
+    received: List[int] = []
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Generic, TypeVar, Optional
+from typing import Generic, List, TypeVar, Optional
 
 T = TypeVar("T")
 
@@ -10,6 +10,11 @@ class ApiResponse(BaseModel, Generic[T]):
     message: str = "操作成功"
 
 
+class PageResponse(ApiResponse[List[T]], Generic[T]):
+    # 下一页游标，为空表示已经是最后一页
+    next_cursor: Optional[str] = None
+
+
 class PaginationParams(BaseModel):
     page: int = 1
     page_size: int = 20
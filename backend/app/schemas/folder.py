@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 
@@ -19,6 +19,8 @@ class FolderUpdate(BaseModel):
 
 class Folder(FolderBase):
     id: int
+    path: Optional[str] = None
+    depth: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
@@ -26,8 +28,19 @@ class Folder(FolderBase):
         from_attributes = True
 
 
+class FolderItemCounts(BaseModel):
+    # direct 只算本文件夹，total 包含所有子孙文件夹（不受 depth 截断影响）
+    direct: int = 0
+    total: int = 0
+    by_type: Dict[str, int] = {}
+    total_by_type: Dict[str, int] = {}
+
+
 class FolderWithChildren(Folder):
     children: List["FolderWithChildren"] = []
+    # 按 depth 截断时，未展开的节点是否还有子文件夹
+    has_children: bool = False
+    counts: Optional[FolderItemCounts] = None
 
 
 FolderWithChildren.model_rebuild()
@@ -1,7 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
+from .common import PageResponse
+
 
 class KnowledgeItemBase(BaseModel):
     title: str
@@ -27,13 +29,63 @@ class KnowledgeItem(KnowledgeItemBase):
         from_attributes = True
 
 
+class KnowledgeSearchResult(KnowledgeItem):
+    score: Optional[float] = None
+    snippet: Optional[str] = None
+
+
+class KnowledgeSuggestion(BaseModel):
+    type: str
+    id: int
+    text: str
+
+
+# 批量操作单次最多处理的知识项数
+BULK_MAX_ITEMS = 5000
+
+
+class KnowledgeBulkTags(BaseModel):
+    item_ids: List[int] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+    tag_ids: List[int] = Field(..., min_length=1, max_length=100)
+
+
+class KnowledgeBulkMove(BaseModel):
+    item_ids: List[int] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+    # 为空表示移到根目录
+    folder_id: Optional[int] = None
+
+
+class KnowledgeBulkDelete(BaseModel):
+    item_ids: List[int] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+
+
+class KnowledgeBulkItemResult(BaseModel):
+    id: int
+    # updated / unchanged / not_found
+    status: str
+
+
+class KnowledgeBulkResult(BaseModel):
+    updated: int = 0
+    unchanged: int = 0
+    not_found: int = 0
+    results: List[KnowledgeBulkItemResult] = []
+
+
+class KnowledgeTagQueryPage(PageResponse[KnowledgeItem]):
+    # 命中总数和标签分面，只在第一页（不带游标时）返回
+    total: Optional[int] = None
+    facets: List["TagFacet"] = []
+
+
 class KnowledgeItemDetail(KnowledgeItem):
     tags: List["Tag"] = []
     markdown_content: Optional["MarkdownContent"] = None
     webpage_content: Optional["WebpageContent"] = None
 
 
-from .tag import Tag
+from .tag import Tag, TagFacet
 from .markdown import MarkdownContent
 from .webpage import WebpageContent
 KnowledgeItemDetail.model_rebuild()
+KnowledgeTagQueryPage.model_rebuild()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -27,3 +27,68 @@ class MarkdownContent(MarkdownContentBase):
 
 class MarkdownContentWithData(MarkdownContent):
     content: Optional[str] = None
+
+
+class MarkdownVersion(BaseModel):
+    id: int
+    knowledge_item_id: int
+    version: int
+    kind: str
+    size: int
+    content_hash: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class MarkdownVersionWithContent(MarkdownVersion):
+    content: str
+
+
+class MarkdownVersionDiff(BaseModel):
+    from_version: int
+    to_version: int
+    added: int
+    removed: int
+    diff: str
+
+
+class MarkdownHeading(BaseModel):
+    level: int
+    title: str
+    anchor: str
+    # 该节在原文中的字节范围 [start, end)
+    start: int
+    end: int
+
+
+class MarkdownOutline(BaseModel):
+    content_hash: str
+    size: int
+    headings: List[MarkdownHeading] = []
+
+
+class MarkdownSection(MarkdownHeading):
+    content: str
+
+
+class MarkdownImportJob(BaseModel):
+    id: str
+    status: str
+    source: str
+    folder_id: Optional[int] = None
+    discovered: int
+    imported: int
+    skipped: int
+    failed: int
+    bytes: int
+    files_per_second: Optional[float] = None
+    megabytes_per_second: Optional[float] = None
+    errors: List[Dict] = []
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -23,3 +23,11 @@ class Tag(TagBase):
 
     class Config:
         from_attributes = True
+
+
+class TagFacet(BaseModel):
+    id: int
+    name: str
+    color: Optional[str] = None
+    # 命中的知识项中带有该标签的数量
+    count: int
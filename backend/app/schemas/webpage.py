@@ -1,5 +1,5 @@
 from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from typing import Optional, List, Dict
 from datetime import datetime
 
 
@@ -26,6 +26,7 @@ class WebpageContentUpdate(BaseModel):
 class WebpageContent(WebpageContentBase):
     id: int
     knowledge_item_id: int
+    canonical_url: Optional[str] = None
     fetched_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
@@ -36,3 +37,29 @@ class WebpageContent(WebpageContentBase):
 
 class WebpageFetchRequest(BaseModel):
     url: str
+
+
+class WebpageImportRequest(BaseModel):
+    urls: List[str]
+    folder_id: Optional[int] = None
+
+
+class WebpageImportJob(BaseModel):
+    id: str
+    status: str
+    total: int
+    completed: int
+    succeeded: int
+    failed: int
+    pending: int
+    retried: int
+    pages_per_second: Optional[float] = None
+    errors: List[Dict] = []
+    rejected: List[str] = []
+    existing: List[Dict] = []
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
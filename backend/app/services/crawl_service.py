@@ -0,0 +1,157 @@
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from ..config import settings
+from ..database import SessionLocal
+from .executor import ExecutorBusyError
+from .job_registry import JobRegistry
+from .webpage_fetcher import webpage_fetcher
+
+
+# 错误列表最多保留的条数，避免大批量失败时任务状态无限增长
+MAX_JOB_ERRORS = 100
+
+
+class CrawlJob:
+    def __init__(self, targets: List[Tuple[int, str]]):
+        self.id = uuid.uuid4().hex
+        self.status = "pending"
+        self.total = len(targets)
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.errors: List[Dict] = []
+        self.rejected: List[str] = []
+        self.existing: List[Dict] = []
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.targets = targets
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def completed(self) -> int:
+        return self.succeeded + self.failed
+
+    @property
+    def pending(self) -> int:
+        return self.total - self.completed
+
+    @property
+    def pages_per_second(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        elapsed = ((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds()
+        return round(self.completed / elapsed, 2) if elapsed > 0 else None
+
+
+class CrawlService:
+    """批量网页抓取：固定数量的 worker 并发抓取，按主机限流，失败重试，结果分批写库"""
+
+    def __init__(self):
+        self.jobs: JobRegistry[CrawlJob] = JobRegistry()
+
+    def start(self, targets: List[Tuple[int, str]]) -> CrawlJob:
+        job = CrawlJob(targets)
+        self.jobs.add(job)
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    def get_job(self, job_id: str) -> Optional[CrawlJob]:
+        return self.jobs.get(job_id)
+
+    async def _run(self, job: CrawlJob):
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for target in job.targets:
+            queue.put_nowait(target)
+        job.targets = []
+
+        results: List[Tuple[int, Dict]] = []
+        last_flush = time.monotonic()
+
+        async def flush():
+            nonlocal results, last_flush
+            batch, results = results, []
+            last_flush = time.monotonic()
+            if batch:
+                await asyncio.to_thread(self._save, batch)
+
+        async def worker():
+            while True:
+                try:
+                    knowledge_id, url = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+
+                webpage_data = await self._fetch_with_retry(job, url)
+                if "error" in webpage_data:
+                    job.failed += 1
+                    if len(job.errors) < MAX_JOB_ERRORS:
+                        job.errors.append({"knowledge_id": knowledge_id, "url": url, "error": webpage_data["error"]})
+                else:
+                    job.succeeded += 1
+                    results.append((knowledge_id, webpage_data))
+
+                if len(results) >= settings.CRAWL_BATCH_SIZE or (
+                    results and time.monotonic() - last_flush >= settings.CRAWL_FLUSH_INTERVAL
+                ):
+                    await flush()
+
+        workers = min(settings.CRAWL_CONCURRENCY, max(job.total, 1))
+        tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+        try:
+            await asyncio.gather(*tasks)
+            await flush()
+            job.status = "finished"
+        except Exception as e:
+            job.status = "failed"
+            job.errors.append({"error": str(e) or e.__class__.__name__})
+        finally:
+            # 一个 worker 出错时 gather 立即返回，其余 worker 要取消并等它们退出，不再继续抓取和修改计数
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            job.finished_at = datetime.utcnow()
+
+    async def _fetch_with_retry(self, job: CrawlJob, url: str) -> Dict:
+        attempt = 0
+        while True:
+            try:
+                return await webpage_fetcher.fetch_page(url)
+            except Exception as e:
+                if attempt >= settings.CRAWL_MAX_RETRIES or not self._is_retryable(e):
+                    return {"url": url, "error": str(e) or e.__class__.__name__}
+                # 指数退避加随机抖动，避免同一主机的请求同时重试
+                delay = settings.CRAWL_RETRY_BACKOFF * (2 ** attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+                attempt += 1
+                job.retried += 1
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            status_code = error.response.status_code
+            return status_code == 429 or status_code >= 500
+        return isinstance(error, (httpx.TransportError, ExecutorBusyError))
+
+    @staticmethod
+    def _save(batch: List[Tuple[int, Dict]]):
+        from ..crud import webpage as webpage_crud
+
+        db = SessionLocal()
+        try:
+            webpage_crud.apply_fetch_results(db, batch)
+        finally:
+            db.close()
+
+
+crawl_service = CrawlService()
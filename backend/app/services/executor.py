@@ -0,0 +1,151 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+from ..config import settings
+
+
+class ExecutorBusyError(Exception):
+    """排队任务已达上限，调用方应返回 429"""
+
+
+def _timed_call(func: Callable, args: tuple):
+    # 在工作进程/线程内计时，返回值同时带回纯执行耗时
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class TaskMetrics:
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.run_seconds = 0.0
+        self.max_run_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def to_dict(self) -> Dict:
+        finished = self.completed + self.failed
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_run_ms": round(self.run_seconds / finished * 1000, 3) if finished else None,
+            "max_run_ms": round(self.max_run_seconds * 1000, 3),
+            "avg_wait_ms": round(self.wait_seconds / finished * 1000, 3) if finished else None
+        }
+
+
+class TaskExecutor:
+    """CPU 密集任务的共享执行器
+
+    默认使用进程池，避免解析等任务占住 GIL 拖慢其它请求；进程池不可用时退回线程池。
+    同时在途的任务数有上限，超过时直接拒绝而不是无限排队。
+    """
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None
+    ):
+        self.mode = mode or settings.EXECUTOR_MODE
+        self.workers = workers or settings.EXECUTOR_WORKERS or os.cpu_count() or 1
+        self.max_pending = max_pending or settings.EXECUTOR_MAX_PENDING
+        self.pending = 0
+        self.metrics: Dict[str, TaskMetrics] = {}
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create_executor()
+            return self._executor
+
+    def _create_executor(self) -> Executor:
+        if self.mode == "process":
+            try:
+                # spawn 避免在带有事件循环和线程的进程里 fork
+                return ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            except (OSError, NotImplementedError, ImportError):
+                self.mode = "thread"
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cpu-task")
+
+    async def run(self, name: str, func: Callable, *args):
+        """在执行器中运行 func(*args)；func 必须是模块级函数，以便进程池序列化"""
+        metrics = self.metrics.setdefault(name, TaskMetrics())
+        if self.pending >= self.max_pending:
+            metrics.rejected += 1
+            raise ExecutorBusyError(f"任务队列已满（{self.max_pending}）")
+
+        self.pending += 1
+        metrics.submitted += 1
+        submitted_at = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            try:
+                result, run_seconds = await loop.run_in_executor(self.executor, _timed_call, func, args)
+            except BrokenProcessPool:
+                # 工作进程异常退出后重建进程池，本次任务按失败处理
+                self._reset()
+                raise
+        except Exception:
+            metrics.failed += 1
+            metrics.wait_seconds += time.perf_counter() - submitted_at
+            raise
+        finally:
+            self.pending -= 1
+
+        metrics.completed += 1
+        metrics.run_seconds += run_seconds
+        metrics.max_run_seconds = max(metrics.max_run_seconds, run_seconds)
+        metrics.wait_seconds += max(time.perf_counter() - submitted_at - run_seconds, 0.0)
+        return result
+
+    async def warm_up(self):
+        # 提前拉起工作进程，避免第一个请求承担进程启动开销；进程无法启动时退回线程池
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*[
+                loop.run_in_executor(self.executor, os.getpid) for _ in range(self.workers)
+            ])
+        except BrokenProcessPool:
+            self._reset()
+            self.mode = "thread"
+
+    def snapshot(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "tasks": {name: metrics.to_dict() for name, metrics in self.metrics.items()}
+        }
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+cpu_executor = TaskExecutor()
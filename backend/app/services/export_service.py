@@ -0,0 +1,190 @@
+import codecs
+import io
+import json
+import zipfile
+from datetime import date, datetime
+from typing import Dict, Iterator, List
+
+from sqlalchemy import Table, select, tuple_
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models import Folder, KnowledgeItem, LearningRecord, MarkdownContent, Tag, WebpageContent, knowledge_tags
+from .file_service import file_service
+
+
+EXPORT_FORMAT_VERSION = 1
+
+# 按外键依赖排序，导入时可以按顺序逐表恢复
+EXPORT_TABLES: List[Table] = [
+    Folder.__table__,
+    Tag.__table__,
+    KnowledgeItem.__table__,
+    knowledge_tags,
+    MarkdownContent.__table__,
+    WebpageContent.__table__,
+    LearningRecord.__table__
+]
+
+# 每次查询的行数
+ROW_CHUNK_SIZE = 1000
+
+# 文件分块读取和输出缓冲的大小
+BLOCK_SIZE = 64 * 1024
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{value.__class__.__name__} 无法序列化")
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default)
+
+
+def _line(table: str, data: Dict) -> bytes:
+    return (_dumps({"table": table, "data": data}) + "\n").encode("utf-8")
+
+
+class _ZipSink(io.RawIOBase):
+    """zipfile 的输出目标：不可 seek，写入的数据暂存在内存里，由生成器随时取走"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+class ExportService:
+    """全量导出知识库
+
+    数据库按主键分批读取，每批之后结束读事务，SQLite 不会在整个导出期间持有读锁而阻塞写入；
+    Markdown 正文从文件按固定大小分块读取。两种格式都是同步生成器，由 StreamingResponse 放到线程池中迭代。
+
+    - ndjson：每行 {"table": 表名, "data": 行}，首行为 meta，最后是 table 为 markdown 的正文
+    - zip：manifest.json、每张表一个 <表名>.ndjson、markdown/<知识项 id>.md；
+      zip 的中央目录要在末尾写出，内存占用随文件数线性增长（每个文件约几百字节）
+    """
+
+    def iter_rows(self, db: Session, table: Table) -> Iterator[Dict]:
+        keys = list(table.primary_key.columns)
+        last = None
+        while True:
+            query = select(table).order_by(*keys).limit(ROW_CHUNK_SIZE)
+            if last is not None:
+                query = query.where(tuple_(*keys) > tuple_(*last))
+            rows = db.execute(query).mappings().all()
+            db.rollback()
+            for row in rows:
+                yield dict(row)
+            if len(rows) < ROW_CHUNK_SIZE:
+                return
+            last = [rows[-1][key.name] for key in keys]
+
+    def manifest(self) -> Dict:
+        return {
+            "app": settings.APP_NAME,
+            "format_version": EXPORT_FORMAT_VERSION,
+            "exported_at": datetime.utcnow().isoformat(),
+            "tables": [table.name for table in EXPORT_TABLES]
+        }
+
+    def iter_ndjson(self) -> Iterator[bytes]:
+        db = SessionLocal()
+        try:
+            buffer = [_line("meta", self.manifest())]
+            size = len(buffer[0])
+            for table in EXPORT_TABLES:
+                for row in self.iter_rows(db, table):
+                    line = _line(table.name, row)
+                    buffer.append(line)
+                    size += len(line)
+                    if size >= BLOCK_SIZE:
+                        yield b"".join(buffer)
+                        buffer, size = [], 0
+            if buffer:
+                yield b"".join(buffer)
+
+            for row in self.iter_rows(db, MarkdownContent.__table__):
+                yield from self._markdown_line(row)
+        finally:
+            db.close()
+
+    def _markdown_line(self, row: Dict) -> Iterator[bytes]:
+        """content 字段边读边转义输出，单个大文件也不会整体读入内存"""
+        head = {"knowledge_item_id": row["knowledge_item_id"], "file_path": row["file_path"]}
+        blocks = file_service.iter_markdown(row["file_path"], BLOCK_SIZE)
+        try:
+            first = next(blocks, b"")
+        except OSError:
+            yield _line("markdown", {**head, "content": None})
+            return
+
+        prefix = _dumps({"table": "markdown", "data": {**head, "content": ""}})
+        # 去掉末尾的 `"}}`，在空字符串中间接着写正文
+        yield prefix[:-3].encode("utf-8")
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        block = first
+        while block:
+            text = decoder.decode(block)
+            if text:
+                yield _dumps(text)[1:-1].encode("utf-8")
+            block = next(blocks, b"")
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield _dumps(text)[1:-1].encode("utf-8")
+        yield b'"}}\n'
+
+    def iter_zip(self) -> Iterator[bytes]:
+        db = SessionLocal()
+        sink = _ZipSink()
+        try:
+            with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr("manifest.json", _dumps(self.manifest()))
+                for table in EXPORT_TABLES:
+                    # 不可 seek 时条目大小事先未知，强制 zip64 以免超过 2GB 时出错
+                    with archive.open(f"{table.name}.ndjson", "w", force_zip64=True) as entry:
+                        for row in self.iter_rows(db, table):
+                            entry.write((_dumps(row) + "\n").encode("utf-8"))
+                            if sink.size >= BLOCK_SIZE:
+                                yield sink.drain()
+
+                for row in self.iter_rows(db, MarkdownContent.__table__):
+                    blocks = file_service.iter_markdown(row["file_path"], BLOCK_SIZE)
+                    try:
+                        block = next(blocks, b"")
+                    except OSError:
+                        continue
+                    with archive.open(f"markdown/{row['knowledge_item_id']}.md", "w", force_zip64=True) as entry:
+                        while block:
+                            entry.write(block)
+                            if sink.size >= BLOCK_SIZE:
+                                yield sink.drain()
+                            block = next(blocks, b"")
+            yield sink.drain()
+        finally:
+            db.close()
+
+    def iter_export(self, export_format: str) -> Iterator[bytes]:
+        if export_format == "ndjson":
+            return self.iter_ndjson()
+        return self.iter_zip()
+
+
+export_service = ExportService()
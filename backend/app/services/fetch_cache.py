@@ -0,0 +1,74 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from ..config import settings
+from ..utils.url import normalize_url
+
+
+class FetchCache:
+    """网页抓取的响应元数据缓存：ETag / Last-Modified / 内容哈希以及上次提取的结果
+
+    使用独立的 SQLite 文件，和业务数据库的事务互不影响。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or Path(settings.DATA_DIR) / "cache" / "fetch_cache.db")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fetch_cache ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                "content_hash TEXT, data TEXT, updated_at TEXT)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, content_hash, data FROM fetch_cache WHERE url = ?",
+                (normalize_url(url),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "content_hash": row[2],
+            "data": json.loads(row[3]) if row[3] else None
+        }
+
+    def set(
+        self,
+        url: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        content_hash: str,
+        data: Dict
+    ):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO fetch_cache (url, etag, last_modified, content_hash, data, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    normalize_url(url), etag, last_modified, content_hash,
+                    json.dumps(data, ensure_ascii=False), datetime.utcnow().isoformat()
+                )
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
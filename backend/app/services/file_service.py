@@ -1,41 +1,366 @@
+import codecs
+import hashlib
+import itertools
 import os
 import uuid
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, NamedTuple, Optional, Tuple
 
 from ..config import settings
+from ..utils import compression
+from .markdown_cache import MarkdownCache
+
+try:
+    import fcntl
+except ImportError:  # Windows：打开中的文件不能被改名或删除，complete 移走组装文件时会直接失败
+    fcntl = None
+
+
+BLOB_SUFFIX = ".md"
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def normalize_newlines(text: str) -> str:
+    """与文本模式读取时的通用换行处理一致，CRLF / CR 统一为 LF"""
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+class UploadTooLargeError(ValueError):
+    """上传的文件超过大小上限"""
+
+
+class MarkdownStat(NamedTuple):
+    etag: str
+    # 文件的存储编码：none / gzip / zstd
+    codec: str
+    stored_size: int
+    # 解压后的字节数
+    size: int
+
+
+class MarkdownUpload:
+    """流式写入一个 Markdown 文件
+
+    每块数据写入临时文件，同时计算 sha256、增量校验 UTF-8、检查大小上限；commit 时按当前压缩设置编码，
+    原子地换入 blob 存储并返回相对路径。未 commit 的临时文件由 discard 删除，进程崩溃留下的由 gc 清理。
+    换行与 save_markdown 一样统一为 LF 后再计算哈希和写入，同样的内容无论上传还是保存都得到同一个 blob；
+    块末尾的 \r 留到下一块再处理，跨块的 CRLF 不会变成两个换行。
+    """
+
+    def __init__(self, service: "FileService", max_bytes: int):
+        self.service = service
+        self.max_bytes = max_bytes
+        # 收到的原始字节数，用于检查上限
+        self.received = 0
+        # 统一换行后写入的字节数
+        self.size = 0
+        self._pending_cr = False
+        self._digest = hashlib.sha256()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._tmp_path = service.blobs_dir / f".upload-{uuid.uuid4().hex}.tmp"
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, chunk: bytes):
+        self.received += len(chunk)
+        if self.received > self.max_bytes:
+            raise UploadTooLargeError(f"文件不能超过 {self.max_bytes // 1024 // 1024} MB")
+        try:
+            self._decoder.decode(chunk)
+        except UnicodeDecodeError:
+            raise ValueError("文件不是有效的 UTF-8 文本")
+        if self._pending_cr:
+            chunk = b"\r" + chunk
+        self._pending_cr = chunk.endswith(b"\r")
+        if self._pending_cr:
+            chunk = chunk[:-1]
+        if b"\r" in chunk:
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        self._append(chunk)
+
+    def _append(self, data: bytes):
+        self.size += len(data)
+        self._digest.update(data)
+        self._file.write(data)
+
+    def commit(self) -> str:
+        try:
+            self._decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            raise ValueError("文件不是有效的 UTF-8 文本")
+        if self._pending_cr:
+            self._append(b"\n")
+            self._pending_cr = False
+        self._file.close()
+
+        path = self.service.blob_path(self._digest.hexdigest())
+        try:
+            os.utime(path)
+            self.discard()
+        except FileNotFoundError:
+            codec = self.service.compression
+            if codec != "none" and self.size >= settings.MARKDOWN_COMPRESSION_MIN_BYTES:
+                self._compress(codec)
+            self.service._replace(self._tmp_path, path)
+        return str(path.relative_to(self.service.base_dir))
+
+    def _compress(self, codec: str):
+        """把临时文件流式压缩为另一个临时文件，压缩后没有变小则保留原文"""
+        compressed_path = self._tmp_path.with_name(self._tmp_path.name + ".z.tmp")
+        compressor = compression.compress_stream(codec, self.size)
+        try:
+            with open(self._tmp_path, "rb") as source, open(compressed_path, "wb") as target:
+                while block := source.read(1024 * 1024):
+                    target.write(compressor.compress(block))
+                target.write(compressor.flush())
+            if compressed_path.stat().st_size < self.size:
+                os.replace(compressed_path, self._tmp_path)
+        finally:
+            compressed_path.unlink(missing_ok=True)
+
+    def discard(self):
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+class ChunkChecksumError(ValueError):
+    """分块或整个文件的内容与客户端给出的 sha256 不一致"""
+
+
+def _lock_part(f, path: Path, exclusive: bool):
+    """给组装文件加锁，并确认加锁后路径仍指向这个文件，已被移走时抛出 FileNotFoundError
+
+    写分块时持有共享锁直到关闭；complete 持有排它锁，等正在写的分块全部关闭后才计算哈希并移走文件，
+    之后拿到共享锁的写入方会发现路径已不存在而放弃，不会写进按内容共用的附件文件。
+    """
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    if os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+        raise FileNotFoundError(path)
+
+
+class AttachmentChunk:
+    """把分块上传的一块直接写到组装文件中对应的偏移处
+
+    组装文件预先分配为完整大小，各分块按偏移写入，全部到齐后文件即为完整内容，不需要再拼接，
+    多个分块也可以并发写入。边写边计算 sha256，finish 时比对校验和并 fsync，之后才登记为已收到。
+    打开后一直持有组装文件的共享锁，complete 要等它关闭后才会移走文件，见 _lock_part。
+    """
+
+    def __init__(self, path: Path, offset: int, length: int):
+        self.length = length
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = open(path, "r+b")
+        try:
+            _lock_part(self._file, path, exclusive=False)
+        except BaseException:
+            self._file.close()
+            raise
+        self._file.seek(offset)
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.length:
+            raise ValueError(f"分块超过 {self.length} 字节")
+        self._digest.update(data)
+        self._file.write(data)
+
+    def finish(self, checksum: str):
+        if self.size != self.length:
+            raise ValueError(f"分块应为 {self.length} 字节，实际收到 {self.size} 字节")
+        if self._digest.hexdigest() != checksum.strip().lower():
+            raise ChunkChecksumError("分块的 sha256 不一致")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
 
 
 class FileService:
     def __init__(self, base_dir: Optional[str] = None):
         self.base_dir = Path(base_dir or settings.DATA_DIR)
         self.markdown_dir = self.base_dir / "knowledge" / "markdown"
+        self.blobs_dir = self.base_dir / "knowledge" / "blobs"
         self.attachments_dir = self.base_dir / "knowledge" / "attachments"
+        self.rendered_dir = self.base_dir / "knowledge" / "rendered"
+        self.uploads_dir = self.base_dir / "knowledge" / "uploads"
+        self._blob_prefix = str(self.blobs_dir.relative_to(self.base_dir)) + os.sep
+        self.cache = MarkdownCache(
+            settings.MARKDOWN_CACHE_BYTES, settings.MARKDOWN_CACHE_MAX_ENTRY_BYTES
+        ) if settings.MARKDOWN_CACHE_BYTES > 0 else None
+        self.compression = settings.MARKDOWN_COMPRESSION
+        compression.check_codec(self.compression)
         self._ensure_dirs()
 
     def _ensure_dirs(self):
         self.markdown_dir.mkdir(parents=True, exist_ok=True)
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
         self.attachments_dir.mkdir(parents=True, exist_ok=True)
+        self.rendered_dir.mkdir(parents=True, exist_ok=True)
+        self.uploads_dir.mkdir(parents=True, exist_ok=True)
 
-    def save_markdown(self, content: str, filename: Optional[str] = None) -> str:
-        if not filename:
-            filename = f"{uuid.uuid4()}.md"
-        file_path = self.markdown_dir / filename
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(content)
-        return str(file_path.relative_to(self.base_dir))
+    def save_markdown(self, content: str, cache: bool = True) -> str:
+        """按内容的 sha256 保存为 blob，返回相对路径
+
+        内容相同的笔记共用同一个文件；blob 写入后不再修改，更新笔记即写入新的 blob。
+        引用计数由调用方在数据库事务中维护（见 crud.blob）。
+        cache 为 True 时同时写入读缓存；批量导入时关闭，避免把常用的笔记挤出缓存。
+        哈希按压缩前的内容计算，压缩方式变化不影响去重。
+        换行先统一为 LF 再计算哈希和写入，缓存中的内容与之后从文件读出的完全一致。
+        """
+        content = normalize_newlines(content)
+        data = content.encode("utf-8")
+        path = self.blob_path(hashlib.sha256(data).hexdigest())
+        try:
+            # 已存在时只刷新修改时间，gc 的宽限期从这里重新计算
+            os.utime(path)
+        except FileNotFoundError:
+            self._atomic_write(path, self.encode(data))
+        relative_path = str(path.relative_to(self.base_dir))
+        if cache and self.cache is not None:
+            self.cache.set(relative_path, content, len(data))
+        return relative_path
 
     def read_markdown(self, relative_path: str) -> str:
         full_path = self.get_full_path(relative_path)
-        with open(full_path, "r", encoding="utf-8") as f:
-            return f.read()
+        if self.cache is None:
+            return self._read_text(full_path)[0]
+
+        # blob 内容不可变，无需 stat；旧文件按 mtime 和大小校验
+        stamp = None
+        if self.blob_hash(relative_path) is None:
+            stat = full_path.stat()
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        content = self.cache.get(relative_path, stamp)
+        if content is None:
+            content, size = self._read_text(full_path)
+            self.cache.set(relative_path, content, size, stamp)
+        return content
 
-    def update_markdown(self, relative_path: str, content: str):
+    @staticmethod
+    def _read_text(full_path: Path) -> Tuple[str, int]:
+        """返回解压后的文本和字节数"""
+        with open(full_path, "rb") as f:
+            data = compression.open_reader(f).read()
+        return normalize_newlines(data.decode("utf-8")), len(data)
+
+    def iter_markdown(
+        self,
+        relative_path: str,
+        block_size: int = 64 * 1024,
+        start: int = 0,
+        length: Optional[int] = None
+    ) -> Iterator[bytes]:
+        """按固定大小分块读取解压后的 Markdown 原文，压缩的文件边读边解压
+
+        start / length 按解压后的字节计算；压缩文件的 seek 需要从头解压到该位置。
+        """
+        full_path = self.get_full_path(relative_path)
+        with open(full_path, "rb") as f:
+            reader = compression.open_reader(f)
+            if start:
+                reader.seek(start)
+            remaining = length
+            while remaining is None or remaining > 0:
+                block = reader.read(block_size if remaining is None else min(block_size, remaining))
+                if not block:
+                    break
+                if remaining is not None:
+                    remaining -= len(block)
+                yield block
+
+    def iter_stored(self, relative_path: str, block_size: int = 64 * 1024) -> Iterator[bytes]:
+        """按存储时的编码原样分块读取，不解压"""
+        with open(self.get_full_path(relative_path), "rb") as f:
+            while block := f.read(block_size):
+                yield block
+
+    def stat_markdown(self, relative_path: str) -> MarkdownStat:
+        """ETag、存储编码和大小；blob 的 ETag 就是内容哈希，旧文件按 mtime 和大小生成弱 ETag"""
         full_path = self.get_full_path(relative_path)
-        with open(full_path, "w", encoding="utf-8") as f:
-            f.write(content)
+        with open(full_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            codec = compression.detect(f.read(4))
+            size = compression.uncompressed_size(f, codec)
+        if size is None:
+            size = sum(len(block) for block in self.iter_markdown(relative_path, 1024 * 1024))
+
+        digest = self.blob_hash(relative_path)
+        etag = f'"{digest}"' if digest else f'W/"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        return MarkdownStat(etag=etag, codec=codec, stored_size=stat.st_size, size=size)
+
+    def start_markdown_upload(self, max_bytes: int) -> MarkdownUpload:
+        return MarkdownUpload(self, max_bytes)
+
+    def encode(self, data: bytes, codec: Optional[str] = None) -> bytes:
+        """小于 MARKDOWN_COMPRESSION_MIN_BYTES 的内容不压缩，压缩后没有变小的也保留原文"""
+        codec = codec or self.compression
+        if codec == "none" or len(data) < settings.MARKDOWN_COMPRESSION_MIN_BYTES:
+            return data
+        compressed = compression.compress(data, codec)
+        return compressed if len(compressed) < len(data) else data
+
+    def iter_markdown_files(self) -> Iterator[Path]:
+        """所有 Markdown 文件：blob 和旧的 uuid 文件"""
+        for _, path in self.iter_blobs():
+            yield path
+        for entry in os.scandir(self.markdown_dir):
+            if entry.is_file() and entry.name.endswith(".md"):
+                yield Path(entry.path)
+
+    def recompress(self, full_path: Path, codec: Optional[str] = None) -> Tuple[int, int]:
+        """把文件原地转换为指定的压缩方式（默认为当前设置），返回转换前后的字节数
+
+        边解压边压缩写到同目录的临时文件再原子替换，不把整个文件读进内存；规则与 encode 相同。
+        """
+        codec = codec or self.compression
+        old_size = full_path.stat().st_size
+        with open(full_path, "rb") as f:
+            current = compression.detect(f.read(4))
+            size = compression.uncompressed_size(f, current)
+            target = "none" if size is not None and size < settings.MARKDOWN_COMPRESSION_MIN_BYTES else codec
+            if target == current:
+                return old_size, old_size
+
+            tmp_path = full_path.parent / f".{full_path.name}.{uuid.uuid4().hex}.tmp"
+            try:
+                raw_size = self._transcode(f, current, tmp_path, target, size)
+                new_size = tmp_path.stat().st_size
+                if target != "none" and (raw_size < settings.MARKDOWN_COMPRESSION_MIN_BYTES or new_size >= raw_size):
+                    # 压缩后没有变小（或解压后才知道太小），保留原文
+                    if current == "none":
+                        tmp_path.unlink()
+                        return old_size, old_size
+                    self._transcode(f, current, tmp_path, "none", size)
+                    new_size = raw_size
+                self._replace(tmp_path, full_path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+        return old_size, new_size
+
+    @staticmethod
+    def _transcode(f, current: str, tmp_path: Path, target: str, size: Optional[int]) -> int:
+        """从头读出 f 的原文，按 target 压缩写入 tmp_path，返回原文字节数"""
+        f.seek(0)
+        reader = compression.open_reader(f, current)
+        compressor = None if target == "none" else compression.compress_stream(target, -1 if size is None else size)
+        raw_size = 0
+        with open(tmp_path, "wb") as out:
+            while block := reader.read(1024 * 1024):
+                raw_size += len(block)
+                out.write(compressor.compress(block) if compressor else block)
+            if compressor:
+                out.write(compressor.flush())
+        return raw_size
 
     def delete_file(self, relative_path: str):
+        if self.cache is not None:
+            self.cache.invalidate(relative_path)
         full_path = self.get_full_path(relative_path)
         if full_path.exists():
             full_path.unlink()
@@ -43,5 +368,143 @@ class FileService:
     def get_full_path(self, relative_path: str) -> Path:
         return self.base_dir / relative_path
 
+    def blob_path(self, digest: str) -> Path:
+        # 两级 256 路分片，每个目录下的文件数保持在几十个以内
+        return self.blobs_dir / digest[:2] / digest[2:4] / f"{digest}{BLOB_SUFFIX}"
+
+    def blob_hash(self, relative_path: str) -> Optional[str]:
+        """blob 的相对路径返回其 sha256，旧的 uuid 文件返回 None"""
+        # 每次读取都会调用，只做字符串比较
+        if not relative_path.startswith(self._blob_prefix) or not relative_path.endswith(BLOB_SUFFIX):
+            return None
+        parts = relative_path[len(self._blob_prefix):-len(BLOB_SUFFIX)].split(os.sep)
+        if len(parts) != 3 or parts[2][:2] != parts[0] or parts[2][2:4] != parts[1]:
+            return None
+        return parts[2]
+
+    def rendered_path(self, digest: str, suffix: str) -> Path:
+        """按内容哈希缓存的渲染结果，分片方式与 blob 相同"""
+        return self.rendered_dir / digest[:2] / digest[2:4] / f"{digest}{suffix}"
+
+    def save_rendered(self, digest: str, suffix: str, data: bytes):
+        self._atomic_write(self.rendered_path(digest, suffix), data)
+
+    def delete_rendered(self, digest: str):
+        for suffix in (".json", ".html"):
+            self.rendered_path(digest, suffix).unlink(missing_ok=True)
+
+    def attachment_path(self, digest: str) -> Path:
+        return self.attachments_dir / digest[:2] / digest[2:4] / digest
+
+    def upload_part_path(self, upload_id: str) -> Path:
+        return self.uploads_dir / f"{upload_id}.part"
+
+    def create_upload_part(self, upload_id: str, size: int):
+        # 稀疏文件，只占用实际写入的部分
+        with open(self.upload_part_path(upload_id), "wb") as f:
+            f.truncate(size)
+
+    def open_upload_chunk(self, upload_id: str, offset: int, length: int) -> AttachmentChunk:
+        return AttachmentChunk(self.upload_part_path(upload_id), offset, length)
+
+    def store_attachment(self, upload_id: str, expected_hash: Optional[str] = None) -> str:
+        """分块全部到齐后计算整个文件的 sha256，按哈希移入附件目录并返回哈希；内容已存在时直接复用
+
+        组装文件按块顺序读取，不会整体读入内存。校验失败时抛出 ChunkChecksumError，组装文件保留；
+        已被另一次 complete 移走时抛出 FileNotFoundError。
+        """
+        part_path = self.upload_part_path(upload_id)
+        f = open(part_path, "rb")
+        try:
+            # 持有排它锁直到文件移走，期间不会有分块写入
+            _lock_part(f, part_path, exclusive=True)
+            digest = hashlib.sha256()
+            while block := f.read(UPLOAD_CHUNK_SIZE):
+                digest.update(block)
+            digest = digest.hexdigest()
+            if expected_hash and digest != expected_hash:
+                raise ChunkChecksumError("文件的 sha256 与上传时声明的不一致")
+
+            if fcntl is None:
+                # Windows 上自己打开着的文件也不能改名，先关闭；此时仍有分块在写时改名会失败
+                f.close()
+            path = self.attachment_path(digest)
+            try:
+                os.utime(path)
+                part_path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                self._replace(part_path, path)
+                # 修改时间是最后一个分块写入的时间，刷新后 gc 才会给附件记录留出提交的时间
+                os.utime(path)
+        finally:
+            f.close()
+        return digest
+
+    def delete_upload_part(self, upload_id: str):
+        self.upload_part_path(upload_id).unlink(missing_ok=True)
+
+    def iter_blobs(self) -> Iterator[Tuple[str, Path]]:
+        """遍历所有 blob 文件，返回 (sha256, 完整路径)"""
+        return self._iter_sharded(self.blobs_dir, BLOB_SUFFIX)
+
+    def iter_attachments(self) -> Iterator[Tuple[str, Path]]:
+        return self._iter_sharded(self.attachments_dir, "")
+
+    @staticmethod
+    def _iter_sharded(root: Path, suffix: str) -> Iterator[Tuple[str, Path]]:
+        for first in sorted(os.scandir(root), key=lambda entry: entry.name):
+            if not first.is_dir():
+                continue
+            for second in sorted(os.scandir(first.path), key=lambda entry: entry.name):
+                if not second.is_dir():
+                    continue
+                for entry in os.scandir(second.path):
+                    if entry.name.endswith(suffix) and not entry.name.startswith("."):
+                        yield entry.name[:len(entry.name) - len(suffix)], Path(entry.path)
+
+    def remove_stale_temp_files(self, older_than: float) -> int:
+        """删除写入中途崩溃留下的临时文件"""
+        removed = 0
+        for directory, _, names in itertools.chain(
+            os.walk(self.blobs_dir), os.walk(self.rendered_dir), os.walk(self.attachments_dir)
+        ):
+            for name in names:
+                path = Path(directory) / name
+                if name.endswith(".tmp") and path.stat().st_mtime < older_than:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+        return removed
+
+    def _atomic_write(self, path: Path, data: bytes):
+        """先写同目录下的临时文件并 fsync，再原子 rename；中途崩溃不会留下写了一半的目标文件"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.parent / f".{path.name}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            self._replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def _replace(self, tmp_path: Path, path: Path):
+        """fsync 已写完的临时文件，再原子 rename 到目标位置"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_dir(path.parent)
+
+    @staticmethod
+    def _fsync_dir(directory: Path):
+        # rename 要等目录项落盘才算持久化；Windows 不支持打开目录
+        if os.name != "posix":
+            return
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
 
 file_service = FileService()
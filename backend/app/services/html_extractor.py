@@ -0,0 +1,168 @@
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+
+from ..config import settings
+
+
+# 摘要取前几个 <p> 段落
+SUMMARY_PARAGRAPHS = 3
+SUMMARY_MAX_LENGTH = 500
+
+# 每次喂给解析器的字符数，解析器在两次喂入之间检查是否已经拿到所需内容
+FEED_CHUNK_SIZE = 64 * 1024
+
+# 内容不计入文本的标签
+SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+
+META_NAMES = ("description", "keywords")
+
+CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+
+class _Done(Exception):
+    pass
+
+
+class HtmlExtractor(HTMLParser):
+    """只提取标题、description/keywords 和前几个段落的流式 HTML 解析器
+
+    不构建文档树；拿到全部所需信息后立即停止解析。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title: Optional[str] = None
+        self.h1: Optional[str] = None
+        self.meta: Dict[str, str] = {}
+        self.og_meta: Dict[str, str] = {}
+        self.paragraphs: List[str] = []
+
+        self._in_body = False
+        self._skip_depth = 0
+        self._capture: Optional[str] = None
+        self._buffer: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+            return
+
+        if tag == "meta":
+            self._handle_meta(dict(attrs))
+            return
+
+        if tag == "body":
+            self._in_body = True
+        elif tag == "title" and self.title is None and self._capture is None:
+            self._start_capture("title")
+        elif tag == "h1" and self.h1 is None and self._capture is None:
+            self._in_body = True
+            self._start_capture("h1")
+        elif tag == "p" and len(self.paragraphs) < SUMMARY_PARAGRAPHS:
+            self._in_body = True
+            # 未闭合的 <p> 遇到新的 <p> 时隐式结束
+            if self._capture == "p":
+                self._finish_capture()
+            if self._capture is None:
+                self._start_capture("p")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == "meta":
+            self._handle_meta(dict(attrs))
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+            return
+        if tag == "head":
+            self._in_body = True
+        if tag == self._capture:
+            self._finish_capture()
+        self._check_done()
+
+    def handle_data(self, data):
+        if self._capture is not None and not self._skip_depth:
+            text = data.strip()
+            if text:
+                self._buffer.append(text)
+
+    def result(self) -> Dict:
+        if self._capture is not None:
+            self._finish_capture()
+
+        title = self.title or self.h1 or None
+        texts = [text for text in self.paragraphs if text]
+        return {
+            "title": title,
+            "description": self._meta_value("description"),
+            "summary": " ".join(texts)[:SUMMARY_MAX_LENGTH] if texts else None,
+            "keywords": self._meta_value("keywords")
+        }
+
+    def _handle_meta(self, attrs: Dict):
+        content = (attrs.get("content") or "").strip()
+        name = (attrs.get("name") or "").lower()
+        prop = (attrs.get("property") or "").lower()
+        if name in META_NAMES and name not in self.meta:
+            self.meta[name] = content
+        if prop.startswith("og:") and prop[3:] in META_NAMES and prop[3:] not in self.og_meta:
+            self.og_meta[prop[3:]] = content
+
+    def _meta_value(self, name: str) -> Optional[str]:
+        return self.meta.get(name) or self.og_meta.get(name) or None
+
+    def _start_capture(self, tag: str):
+        self._capture = tag
+        self._buffer = []
+
+    def _finish_capture(self):
+        text = "".join(self._buffer)
+        if self._capture == "title":
+            self.title = text
+        elif self._capture == "h1":
+            self.h1 = text
+        elif self._capture == "p":
+            self.paragraphs.append(text)
+        self._capture = None
+        self._buffer = []
+
+    def _check_done(self):
+        # 进入正文后 <head> 中的 title/meta 已经读完，段落凑够即可停止
+        if (
+            self._in_body
+            and self._capture is None
+            and len(self.paragraphs) >= SUMMARY_PARAGRAPHS
+            and (self.title or self.h1)
+        ):
+            raise _Done()
+
+
+def extract_content(html: str, url: str) -> Dict:
+    # 只解析前 EXTRACT_MAX_BYTES 个字符，超长页面的尾部不影响结果
+    html = html[:settings.EXTRACT_MAX_BYTES]
+
+    parser = HtmlExtractor()
+    try:
+        for start in range(0, len(html), FEED_CHUNK_SIZE):
+            parser.feed(html[start:start + FEED_CHUNK_SIZE])
+        parser.close()
+    except _Done:
+        pass
+
+    return {"url": url, **parser.result()}
+
+
+def decode(body: bytes, encoding: Optional[str] = None) -> str:
+    # 响应头没有声明编码时从 <meta charset> 中嗅探
+    if not encoding:
+        match = CHARSET_PATTERN.search(body[:4096])
+        encoding = match.group(1).decode("ascii") if match else "utf-8"
+    try:
+        return body.decode(encoding, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def extract_bytes(body: bytes, encoding: Optional[str], url: str) -> Dict:
+    return extract_content(decode(body[:settings.EXTRACT_MAX_BYTES], encoding), url)
@@ -0,0 +1,131 @@
+import re
+from html import escape
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Set
+
+
+# 允许输出的标签，其余标签去掉但保留其中的文本
+ALLOWED_TAGS = {
+    "p", "br", "hr", "h1", "h2", "h3", "h4", "h5", "h6",
+    "em", "strong", "b", "i", "u", "s", "del", "ins", "mark", "sub", "sup", "small", "kbd", "abbr",
+    "code", "pre", "blockquote", "ul", "ol", "li", "dl", "dt", "dd",
+    "a", "img", "table", "thead", "tbody", "tfoot", "tr", "th", "td",
+    "div", "span", "details", "summary"
+}
+
+# 连同内容一起丢弃的标签
+DROPPED_TAGS = {
+    "script", "style", "iframe", "frame", "frameset", "object", "embed", "applet", "template",
+    "noscript", "textarea", "select", "button", "form", "title", "svg", "math"
+}
+
+VOID_TAGS = {"br", "hr", "img"}
+
+_HEADING_ATTRIBUTES = {"id"}
+
+ALLOWED_ATTRIBUTES: Dict[str, Set[str]] = {
+    "a": {"href", "title", "id", "class"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "abbr": {"title"},
+    "code": {"class"},
+    "div": {"class", "id"},
+    "span": {"class"},
+    "li": {"id"},
+    "sup": {"id"},
+    "ol": {"start"},
+    "th": {"align", "colspan", "rowspan"},
+    "td": {"align", "colspan", "rowspan"},
+    "details": {"open"},
+    **{f"h{level}": _HEADING_ATTRIBUTES for level in range(1, 7)}
+}
+
+URL_ATTRIBUTES = {"href", "src"}
+SAFE_SCHEMES = {"http", "https", "mailto"}
+
+_SCHEME = re.compile(r"^([a-z][a-z0-9+.\-]*):")
+_DATA_IMAGE = re.compile(r"^data:image/(png|jpeg|gif|webp);base64,", re.IGNORECASE)
+# 浏览器解析 URL 前会去掉的空白和控制字符
+_URL_IGNORED = re.compile(r"[\x00-\x20\x7f]+")
+
+
+def _safe_url(tag: str, value: str) -> bool:
+    normalized = _URL_IGNORED.sub("", value).lower()
+    match = _SCHEME.match(normalized)
+    if match is None:
+        # 相对路径和页内锚点
+        return True
+    if match.group(1) in SAFE_SCHEMES:
+        return True
+    return tag == "img" and _DATA_IMAGE.match(normalized) is not None
+
+
+class HtmlSanitizer(HTMLParser):
+    """白名单方式清理 Markdown 渲染出的 HTML
+
+    Markdown 允许内嵌任意 HTML，渲染结果直接插入页面前必须去掉脚本、事件属性和 javascript: 链接。
+    只保留白名单中的标签和属性，文本和属性值重新转义；输出的标签总是成对闭合。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._output: List[str] = []
+        self._open: List[str] = []
+        self._drop_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self._drop_depth += 1
+            return
+        if self._drop_depth or tag not in ALLOWED_TAGS:
+            return
+        self._output.append(self._start_tag(tag, attrs))
+        if tag not in VOID_TAGS:
+            self._open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in DROPPED_TAGS or self._drop_depth or tag not in ALLOWED_TAGS:
+            return
+        self._output.append(self._start_tag(tag, attrs))
+        if tag not in VOID_TAGS:
+            self._output.append(f"</{tag}>")
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self._drop_depth = max(self._drop_depth - 1, 0)
+            return
+        if self._drop_depth or tag not in self._open:
+            return
+        # 先闭合中间没有闭合的标签
+        while self._open:
+            open_tag = self._open.pop()
+            self._output.append(f"</{open_tag}>")
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self._drop_depth:
+            self._output.append(escape(data, quote=False))
+
+    def _start_tag(self, tag: str, attrs) -> str:
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        parts = [tag]
+        for name, value in attrs:
+            if name not in allowed:
+                continue
+            value = value or ""
+            if name in URL_ATTRIBUTES and not _safe_url(tag, value):
+                continue
+            parts.append(f'{name}="{escape(value, quote=True)}"')
+        return f"<{' '.join(parts)}>"
+
+    def result(self) -> str:
+        self.close()
+        while self._open:
+            self._output.append(f"</{self._open.pop()}>")
+        return "".join(self._output)
+
+
+def sanitize_html(html: Optional[str]) -> str:
+    sanitizer = HtmlSanitizer()
+    sanitizer.feed(html or "")
+    return sanitizer.result()
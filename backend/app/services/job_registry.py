@@ -0,0 +1,40 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Generic, Optional, TypeVar
+
+from ..config import settings
+
+Job = TypeVar("Job")
+
+
+class JobRegistry(Generic[Job]):
+    """后台任务的进度表，任务需要有 id 和 finished_at 两个属性
+
+    运行中的任务一直保留；已结束的任务保留 JOB_RETENTION_SECONDS 秒，最多 JOB_MAX_FINISHED 个，
+    超出时按加入的先后淘汰最早的。每次加入和查询时顺带清理，不需要单独的定时任务。
+    """
+
+    def __init__(self, retention_seconds: Optional[float] = None, max_finished: Optional[int] = None):
+        self.retention_seconds = settings.JOB_RETENTION_SECONDS if retention_seconds is None else retention_seconds
+        self.max_finished = settings.JOB_MAX_FINISHED if max_finished is None else max_finished
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    def add(self, job: Job):
+        self._evict()
+        self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._evict()
+        return self._jobs.get(job_id)
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def _evict(self):
+        now = datetime.utcnow()
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        excess = len(finished) - self.max_finished
+        for job in finished:
+            if excess > 0 or (now - job.finished_at).total_seconds() > self.retention_seconds:
+                del self._jobs[job.id]
+                excess -= 1
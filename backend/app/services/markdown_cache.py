@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class MarkdownCache:
+    """Markdown 正文的 LRU 读缓存，按总字节数（UTF-8 编码后的长度）限制容量
+
+    每个条目带一个校验标记：blob 内容不可变，标记为 None，命中即有效；
+    旧的 uuid 文件可能被改写，标记为 (mtime_ns, size)，与读取时的 stat 不一致则视为失效。
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, Tuple[Optional[Hashable], str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, stamp: Optional[Hashable] = None) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != stamp:
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, content: str, size: int, stamp: Optional[Hashable] = None):
+        # 单个过大的文件不缓存，以免把其它常用笔记全部挤出
+        if size > self.max_entry_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (stamp, content, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def _remove(self, key: str):
+        self.bytes -= self._entries.pop(key)[2]
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import markdown
+from markdown.extensions import Extension
+from markdown.extensions.toc import slugify_unicode, unique
+from markdown.treeprocessors import Treeprocessor
+
+from .executor import cpu_executor
+from .file_service import file_service
+from .html_sanitizer import sanitize_html
+
+
+# 渲染规则或清理规则变化时加一，已缓存的结果会重新生成
+RENDER_VERSION = 1
+
+EXTENSIONS = ["extra", "sane_lists"]
+
+HEADING_TAGS = {f"h{level}": level for level in range(1, 7)}
+
+FRONT_MATTER_DELIMITERS = (b"---", b"...")
+
+# 与 Python-Markdown 的规则一致：# 必须在行首，后面可以不跟空格
+_ATX = re.compile(r"^(#{1,6})(.*?)#*$")
+_SETEXT = re.compile(r"^(=+|-+)[ ]*$")
+_FENCE = re.compile(r"^(`{3,}|~{3,})")
+_INLINE_LINK = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+_INLINE_MARKS = re.compile(r"[*`]+")
+
+
+def _front_matter_end(lines: List[bytes]) -> int:
+    """开头 YAML front matter 占用的行数，没有时返回 0"""
+    if not lines or lines[0].rstrip() != b"---":
+        return 0
+    for index in range(1, len(lines)):
+        if lines[index].rstrip() in FRONT_MATTER_DELIMITERS:
+            return index + 1
+    return 0
+
+
+def _title(text: str) -> str:
+    return _INLINE_MARKS.sub("", _INLINE_LINK.sub(r"\1", text)).strip()
+
+
+def scan_outline(data: bytes) -> Tuple[List[Dict], int]:
+    """逐行扫描标题，返回 (标题列表, front matter 之后正文的起始字节)
+
+    每个标题包含 level、title、anchor 和按原文字节计算的 [start, end)：start 是标题行的开头，
+    end 是下一个同级或更高级标题的开头（没有时为文件末尾），即该标题下整节内容的范围。
+    围栏代码块中的行不算标题；setext 标题只认段落第一行下面的 === / ---，与渲染器一致。
+    """
+    lines = data.splitlines(keepends=True)
+    skip = _front_matter_end(lines)
+    offset = body_start = sum(len(line) for line in lines[:skip])
+
+    headings = []
+    anchors = set()
+    fence = None
+    # 上一行是否为段落的第一行，(起始字节, 文本)
+    candidate = None
+    previous_blank = True
+    for raw in lines[skip:]:
+        line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+        start = offset
+        offset += len(raw)
+
+        if fence is not None:
+            if line.rstrip() == fence:
+                fence = None
+            previous_blank = False
+            continue
+        match = _FENCE.match(line)
+        if match:
+            fence = match.group(1)
+            candidate = None
+            previous_blank = False
+            continue
+
+        level = title = None
+        heading_start = start
+        match = _ATX.match(line)
+        if match:
+            level, title = len(match.group(1)), match.group(2)
+        elif candidate is not None and _SETEXT.match(line):
+            level = 1 if line[0] == "=" else 2
+            heading_start, title = candidate
+
+        if level is not None:
+            title = _title(title)
+            headings.append({
+                "level": level,
+                "title": title,
+                "anchor": unique(slugify_unicode(title, "-"), anchors),
+                "start": heading_start,
+                "end": len(data)
+            })
+            # 标题行之后的内容另起一块
+            candidate = None
+            previous_blank = True
+            continue
+
+        blank = not line.strip()
+        candidate = (start, line) if previous_blank and not blank and not line.startswith(("    ", "\t")) else None
+        previous_blank = blank
+
+    # 每节到下一个同级或更高级的标题为止
+    open_headings: List[Dict] = []
+    for heading in headings:
+        while open_headings and open_headings[-1]["level"] >= heading["level"]:
+            open_headings.pop()["end"] = heading["start"]
+        open_headings.append(heading)
+    return headings, body_start
+
+
+class _HeadingAnchors(Treeprocessor):
+    """按文档顺序给标题元素设置与大纲一致的 id，对不上的标题按文本生成"""
+
+    def __init__(self, md, headings: List[Dict]):
+        super().__init__(md)
+        self.headings = headings
+
+    def run(self, root):
+        anchors = {heading["anchor"] for heading in self.headings}
+        position = 0
+        for element in root.iter():
+            level = HEADING_TAGS.get(element.tag)
+            if level is None:
+                continue
+            if position < len(self.headings) and self.headings[position]["level"] == level:
+                element.set("id", self.headings[position]["anchor"])
+                position += 1
+            else:
+                element.set("id", unique(slugify_unicode("".join(element.itertext()), "-"), anchors))
+
+
+class _HeadingAnchorExtension(Extension):
+    def __init__(self, headings: List[Dict]):
+        super().__init__()
+        self.headings = headings
+
+    def extendMarkdown(self, md):
+        # 在行内元素处理之后运行
+        md.treeprocessors.register(_HeadingAnchors(md, self.headings), "heading_anchors", 5)
+
+
+def render(data: bytes) -> Dict:
+    """把 Markdown 原文渲染为清理过的 HTML 并提取标题大纲；在 CPU 执行器中运行"""
+    headings, body_start = scan_outline(data)
+    text = data[body_start:].decode("utf-8", errors="replace")
+    html = markdown.markdown(text, extensions=[*EXTENSIONS, _HeadingAnchorExtension(headings)])
+    return {"size": len(data), "headings": headings, "html": sanitize_html(html)}
+
+
+class MarkdownRenderService:
+    """渲染结果按内容哈希缓存在 knowledge/rendered 下：<hash>.json 存大纲，<hash>.html 存 HTML
+
+    内容相同的笔记共用一份渲染结果，blob 不可变，缓存不需要失效，随 blob 一起由 gc 删除。
+    获取大纲只读 json，不读正文；blob 的哈希直接取自路径，旧的 uuid 文件要先读出内容计算哈希。
+    """
+
+    def load_outline(self, digest: str) -> Optional[Dict]:
+        try:
+            with open(file_service.rendered_path(digest, ".json"), "rb") as f:
+                outline = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if outline.get("render_version") != RENDER_VERSION:
+            return None
+        return outline
+
+    def save(self, digest: str, result: Dict) -> Dict:
+        outline = {
+            "render_version": RENDER_VERSION,
+            "content_hash": digest,
+            "size": result["size"],
+            "headings": result["headings"]
+        }
+        # 先写 HTML，json 存在即说明 HTML 已经就绪
+        file_service.save_rendered(digest, ".html", result["html"].encode("utf-8"))
+        file_service.save_rendered(
+            digest, ".json", json.dumps(outline, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        )
+        return outline
+
+    async def ensure(self, file_path: str) -> Dict:
+        """返回内容的大纲，没有缓存时读取原文在 CPU 执行器中渲染；文件不存在时抛出 OSError"""
+        digest = file_service.blob_hash(file_path)
+        outline = self.load_outline(digest) if digest else None
+        if outline is not None:
+            return outline
+
+        data = b"".join(file_service.iter_markdown(file_path))
+        if digest is None:
+            digest = hashlib.sha256(data).hexdigest()
+            outline = self.load_outline(digest)
+            if outline is not None:
+                return outline
+        result = await cpu_executor.run("render_markdown", render, data)
+        return self.save(digest, result)
+
+    def html_path(self, outline: Dict) -> Path:
+        return file_service.rendered_path(outline["content_hash"], ".html")
+
+    def find_heading(self, outline: Dict, anchor: str) -> Optional[Dict]:
+        return next((heading for heading in outline["headings"] if heading["anchor"] == anchor), None)
+
+
+markdown_render_service = MarkdownRenderService()
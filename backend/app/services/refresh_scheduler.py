@@ -0,0 +1,243 @@
+import asyncio
+import heapq
+import math
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..config import settings
+from ..database import SessionLocal
+from .webpage_fetcher import webpage_fetcher
+
+
+def next_refresh_interval(interval: Optional[int], changed: bool, failed: bool) -> int:
+    """根据本次刷新结果调整间隔：有变化则缩短，无变化逐步放宽，失败时退避"""
+    interval = interval or settings.REFRESH_DEFAULT_INTERVAL
+    if failed:
+        interval *= 2
+    elif changed:
+        interval //= 2
+    else:
+        interval = math.ceil(interval * 1.5)
+    return min(max(interval, settings.REFRESH_MIN_INTERVAL), settings.REFRESH_MAX_INTERVAL)
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    # SQLite 取回的时间不带时区，按 UTC 处理
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def due_time(
+    checked_at: Optional[datetime],
+    fetched_at: Optional[datetime],
+    interval: Optional[int]
+) -> float:
+    # 取最近一次检查或抓取的时间；从未抓取成功的网页立即到期
+    last = max(
+        (stamp for stamp in (_timestamp(checked_at), _timestamp(fetched_at)) if stamp is not None),
+        default=None
+    )
+    if last is None:
+        return 0.0
+    return last + (interval or settings.REFRESH_DEFAULT_INTERVAL)
+
+
+class RateLimiter:
+    """令牌桶：所有刷新请求共用的全局速率预算"""
+
+    def __init__(self, rate_per_second: float, burst: float = 1.0):
+        self.rate = rate_per_second
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RefreshScheduler:
+    """定时刷新已保存的网页
+
+    按到期时间维护一个最小堆，到期时间 = 上次检查时间 + 刷新间隔；刷新间隔随网页的历史变化频率
+    自适应调整，经常变化的网页更早被检查。抓取受全局令牌桶和并发数限制，只写入内容有变化的网页。
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int]] = []
+        self._due: Dict[int, float] = {}
+        self._in_flight: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._workers: Set[asyncio.Task] = set()
+        self.checked = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.failed = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = [task for task in (self._task, *self._workers) if task is not None]
+        self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers.clear()
+        self._in_flight.clear()
+
+    def snapshot(self) -> Dict:
+        now = time.time()
+        return {
+            "running": self._task is not None,
+            "scheduled": len(self._due),
+            "overdue": sum(1 for due in self._due.values() if due <= now),
+            "in_flight": len(self._in_flight),
+            "checked": self.checked,
+            "changed": self.changed,
+            "unchanged": self.unchanged,
+            "failed": self.failed
+        }
+
+    async def _run(self):
+        limiter = RateLimiter(settings.REFRESH_RATE_PER_MINUTE / 60)
+        slots = asyncio.Semaphore(settings.REFRESH_CONCURRENCY)
+        next_resync = 0.0
+
+        while True:
+            # 定期从数据库同步，接收新保存的网页和手动刷新后的时间
+            if time.monotonic() >= next_resync:
+                try:
+                    self._merge(await asyncio.to_thread(self._load_schedule))
+                except Exception:
+                    # 数据库暂时不可用时沿用内存中的队列，下一轮再同步
+                    pass
+                next_resync = time.monotonic() + settings.REFRESH_RESYNC_INTERVAL
+
+            webpage_id = self._pop_due()
+            if webpage_id is None:
+                wait = next_resync - time.monotonic()
+                if self._heap:
+                    wait = min(wait, self._heap[0][0] - time.time())
+                await asyncio.sleep(max(wait, 0.01))
+                continue
+
+            await limiter.acquire()
+            await slots.acquire()
+            self._in_flight.add(webpage_id)
+            task = asyncio.create_task(self._refresh(webpage_id))
+            self._workers.add(task)
+
+            def done(task, webpage_id=webpage_id):
+                # 单个网页刷新出错时不影响调度，下次同步时会重新入队
+                if not task.cancelled():
+                    task.exception()
+                slots.release()
+                self._workers.discard(task)
+                self._in_flight.discard(webpage_id)
+
+            task.add_done_callback(done)
+
+    def _pop_due(self) -> Optional[int]:
+        now = time.time()
+        while self._heap and self._heap[0][0] <= now:
+            due, webpage_id = heapq.heappop(self._heap)
+            # 堆中的旧条目（到期时间已被更新）直接丢弃
+            if self._due.get(webpage_id) == due:
+                del self._due[webpage_id]
+                return webpage_id
+        return None
+
+    def _schedule(self, webpage_id: int, due: float):
+        self._due[webpage_id] = due
+        heapq.heappush(self._heap, (due, webpage_id))
+
+    def _merge(self, schedule: List[Tuple[int, float]]):
+        seen = set()
+        for webpage_id, due in schedule:
+            seen.add(webpage_id)
+            if webpage_id not in self._in_flight and self._due.get(webpage_id) != due:
+                self._schedule(webpage_id, due)
+        for webpage_id in list(self._due):
+            if webpage_id not in seen:
+                del self._due[webpage_id]
+        # 旧条目过多时重建堆
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._heap = [(due, webpage_id) for webpage_id, due in self._due.items()]
+            heapq.heapify(self._heap)
+
+    async def _refresh(self, webpage_id: int):
+        url = await asyncio.to_thread(self._load_url, webpage_id)
+        if url is None:
+            return
+
+        try:
+            webpage_data = await webpage_fetcher.fetch_page(url)
+        except Exception as e:
+            webpage_data = {"url": url, "error": str(e) or e.__class__.__name__}
+
+        result = await asyncio.to_thread(self._save, webpage_id, webpage_data)
+        if result is None:
+            return
+        due, changed = result
+
+        self.checked += 1
+        if "error" in webpage_data:
+            self.failed += 1
+        elif changed:
+            self.changed += 1
+        else:
+            self.unchanged += 1
+        self._schedule(webpage_id, due)
+
+    @staticmethod
+    def _load_schedule() -> List[Tuple[int, float]]:
+        from ..crud import webpage as webpage_crud
+
+        db = SessionLocal()
+        try:
+            return [
+                (webpage_id, due_time(checked_at, fetched_at, interval))
+                for webpage_id, checked_at, fetched_at, interval in webpage_crud.get_refresh_schedule(db)
+            ]
+        finally:
+            db.close()
+
+    @staticmethod
+    def _load_url(webpage_id: int) -> Optional[str]:
+        from ..crud import webpage as webpage_crud
+
+        db = SessionLocal()
+        try:
+            db_webpage = webpage_crud.get_webpage_content(db, webpage_id)
+            return db_webpage.url if db_webpage else None
+        finally:
+            db.close()
+
+    @staticmethod
+    def _save(webpage_id: int, webpage_data: Dict) -> Optional[Tuple[float, bool]]:
+        from ..crud import webpage as webpage_crud
+
+        db = SessionLocal()
+        try:
+            result = webpage_crud.apply_refresh_result(db, webpage_id, webpage_data)
+            if result is None:
+                return None
+            state, changed = result
+            return due_time(state.checked_at, None, state.refresh_interval), bool(changed)
+        finally:
+            db.close()
+
+
+refresh_scheduler = RefreshScheduler()
@@ -0,0 +1,277 @@
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+
+# FTS5 索引的列，rowid 即 knowledge_items.id
+INDEX_COLUMNS = ("title", "tags", "markdown", "webpage")
+
+# bm25 列权重，与 INDEX_COLUMNS 顺序一致
+COLUMN_WEIGHTS = (10.0, 5.0, 1.0, 2.0)
+
+# trigram 分词器无法匹配少于 3 个字符的词
+MIN_TERM_LENGTH = 3
+
+
+class SearchService:
+    def __init__(self, table: str = "knowledge_fts"):
+        self.table = table
+        self.enabled = False
+
+    def init_index(self, engine: Engine):
+        if engine.dialect.name != "sqlite":
+            return
+
+        with engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": self.table}
+            ).first()
+            if not exists:
+                # trigram 分词器按字符切分，中文和英文都可以做子串匹配
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+                    f"{', '.join(INDEX_COLUMNS)}, tokenize = 'trigram')"
+                ))
+        self.enabled = True
+
+        if not exists:
+            from ..database import SessionLocal
+            db = SessionLocal()
+            try:
+                self.rebuild(db)
+                db.commit()
+            finally:
+                db.close()
+
+    def rebuild(self, db: Session):
+        from ..models import KnowledgeItem
+
+        db.execute(text(f"DELETE FROM {self.table}"))
+        item_ids = [row[0] for row in db.query(KnowledgeItem.id).all()]
+        for item_id in item_ids:
+            self.index_item(db, item_id)
+
+    def index_item(self, db: Session, item_id: int):
+        """根据数据库当前状态重建单个知识项的索引行"""
+        from ..models import KnowledgeItem, MarkdownContent, WebpageContent, Tag, knowledge_tags
+        from .file_service import file_service
+
+        if not self.enabled:
+            return
+
+        item = db.query(KnowledgeItem.title).filter(KnowledgeItem.id == item_id).first()
+        if not item:
+            self.remove_item(db, item_id)
+            return
+
+        tag_names = [
+            row[0] for row in db.query(Tag.name).join(
+                knowledge_tags, knowledge_tags.c.tag_id == Tag.id
+            ).filter(knowledge_tags.c.knowledge_item_id == item_id).all()
+        ]
+
+        markdown = ""
+        file_path = db.query(MarkdownContent.file_path).filter(
+            MarkdownContent.knowledge_item_id == item_id
+        ).scalar()
+        if file_path:
+            try:
+                markdown = file_service.read_markdown(file_path)
+            except OSError:
+                markdown = ""
+
+        webpage = db.query(WebpageContent).filter(
+            WebpageContent.knowledge_item_id == item_id
+        ).first()
+
+        self._write(db, item_id, {
+            "title": item.title,
+            "tags": " ".join(tag_names),
+            "markdown": markdown,
+            "webpage": self.webpage_text(webpage)
+        })
+
+    def update_columns(self, db: Session, item_id: int, **columns):
+        """只更新部分列，索引行不存在时回退为完整重建"""
+        if not self.enabled:
+            return
+
+        row = db.execute(
+            text(f"SELECT {', '.join(INDEX_COLUMNS)} FROM {self.table} WHERE rowid = :id"),
+            {"id": item_id}
+        ).mappings().first()
+        if row is None:
+            self.index_item(db, item_id)
+            return
+
+        values = dict(row)
+        values.update({key: value or "" for key, value in columns.items()})
+        self._write(db, item_id, values)
+
+    def update_tags(self, db: Session, item_id: int):
+        from ..models import Tag, knowledge_tags
+
+        if not self.enabled:
+            return
+
+        tag_names = [
+            row[0] for row in db.query(Tag.name).join(
+                knowledge_tags, knowledge_tags.c.tag_id == Tag.id
+            ).filter(knowledge_tags.c.knowledge_item_id == item_id).all()
+        ]
+        self.update_columns(db, item_id, tags=" ".join(tag_names))
+
+    def update_tags_many(self, db: Session, item_ids: List[int]):
+        """批量刷新多个知识项的 tags 列：标签名和索引行各查一次，再批量写回"""
+        from ..models import Tag, knowledge_tags
+
+        if not self.enabled or not item_ids:
+            return
+
+        tag_names: Dict[int, List[str]] = {item_id: [] for item_id in item_ids}
+        for item_id, name in db.query(knowledge_tags.c.knowledge_item_id, Tag.name).join(
+            Tag, knowledge_tags.c.tag_id == Tag.id
+        ).filter(knowledge_tags.c.knowledge_item_id.in_(item_ids)):
+            tag_names[item_id].append(name)
+
+        rows = []
+        for start in range(0, len(item_ids), 500):
+            id_list = ", ".join(str(int(item_id)) for item_id in item_ids[start:start + 500])
+            rows += db.execute(text(
+                f"SELECT rowid AS id, {', '.join(INDEX_COLUMNS)} FROM {self.table} WHERE rowid IN ({id_list})"
+            )).mappings().all()
+
+        values = []
+        for row in rows:
+            row = dict(row)
+            row["tags"] = " ".join(tag_names[row["id"]])
+            values.append(row)
+        self._write_many(db, values)
+        # 还没有索引行的知识项按单个重建
+        for item_id in set(item_ids) - {row["id"] for row in values}:
+            self.index_item(db, item_id)
+
+    def add_items(self, db: Session, rows: List[Dict]):
+        """批量写入完整的索引行，rows 中每项包含 id 和 INDEX_COLUMNS 中的列"""
+        if not self.enabled:
+            return
+        self._write_many(db, rows)
+
+    def update_webpage(self, db: Session, item_id: int, webpage):
+        if not self.enabled:
+            return
+        self.update_columns(db, item_id, webpage=self.webpage_text(webpage))
+
+    def remove_item(self, db: Session, item_id: int):
+        if not self.enabled:
+            return
+        db.execute(text(f"DELETE FROM {self.table} WHERE rowid = :id"), {"id": item_id})
+
+    def remove_items(self, db: Session, item_ids: List[int]):
+        if not self.enabled or not item_ids:
+            return
+        db.execute(text(f"DELETE FROM {self.table} WHERE rowid = :id"), [{"id": item_id} for item_id in item_ids])
+
+    def search(
+        self,
+        db: Session,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        after: Optional[Tuple[Optional[float], int]] = None,
+        folder_ids: Optional[List[int]] = None
+    ) -> List[Tuple[int, Optional[float], Optional[str]]]:
+        """返回 (knowledge_item_id, bm25 分数, 高亮片段) 列表，分数越小越相关
+
+        after 为上一页最后一条的 (分数, id)，传入时从其后开始取，忽略 offset。
+        folder_ids 不为空时只返回这些文件夹中的知识项。
+        """
+        terms = query.split()
+        long_terms = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+        short_terms = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+        if not terms:
+            return []
+
+        params: Dict = {"limit": limit, "offset": offset}
+        conditions = []
+        for index, term in enumerate(short_terms):
+            # 短词无法走 trigram 索引，退化为对索引表的 LIKE 扫描
+            key = f"like_{index}"
+            params[key] = f"%{self._escape_like(term)}%"
+            conditions.append(
+                "(" + " OR ".join(f"{column} LIKE :{key} ESCAPE '\\'" for column in INDEX_COLUMNS) + ")"
+            )
+
+        if folder_ids is not None:
+            # 子树可能有上千个文件夹，整数 id 直接拼入，避免超出绑定参数个数上限
+            id_list = ", ".join(str(int(folder_id)) for folder_id in folder_ids) or "NULL"
+            conditions.append(f"rowid IN (SELECT id FROM knowledge_items WHERE folder_id IN ({id_list}))")
+
+        if long_terms:
+            params["match"] = " ".join(self._quote(term) for term in long_terms)
+            weights = ", ".join(str(weight) for weight in COLUMN_WEIGHTS)
+            sql = (
+                f"SELECT rowid, bm25({self.table}, {weights}) AS score, "
+                f"snippet({self.table}, -1, '<mark>', '</mark>', '…', 16) AS snippet "
+                f"FROM {self.table} WHERE {self.table} MATCH :match"
+            )
+            if after is not None:
+                params.update(after_score=after[0], after_id=after[1], offset=0)
+                conditions.append(f"(bm25({self.table}, {weights}), rowid) > (:after_score, :after_id)")
+            if conditions:
+                sql += " AND " + " AND ".join(conditions)
+            sql += " ORDER BY score, rowid LIMIT :limit OFFSET :offset"
+        else:
+            if after is not None:
+                params.update(after_id=after[1], offset=0)
+                conditions.append("rowid < :after_id")
+            sql = (
+                f"SELECT rowid, NULL AS score, NULL AS snippet FROM {self.table} "
+                f"WHERE {' AND '.join(conditions)} ORDER BY rowid DESC LIMIT :limit OFFSET :offset"
+            )
+
+        rows = db.execute(text(sql), params).all()
+        return [(row[0], row[1], row[2]) for row in rows]
+
+    def _write(self, db: Session, item_id: int, values: Dict):
+        db.execute(text(f"DELETE FROM {self.table} WHERE rowid = :id"), {"id": item_id})
+        db.execute(
+            text(
+                f"INSERT INTO {self.table} (rowid, {', '.join(INDEX_COLUMNS)}) "
+                f"VALUES (:id, {', '.join(':' + column for column in INDEX_COLUMNS)})"
+            ),
+            {"id": item_id, **{column: values.get(column) or "" for column in INDEX_COLUMNS}}
+        )
+
+    def _write_many(self, db: Session, rows: List[Dict]):
+        if not rows:
+            return
+        db.execute(text(f"DELETE FROM {self.table} WHERE rowid = :id"), [{"id": row["id"]} for row in rows])
+        db.execute(
+            text(
+                f"INSERT INTO {self.table} (rowid, {', '.join(INDEX_COLUMNS)}) "
+                f"VALUES (:id, {', '.join(':' + column for column in INDEX_COLUMNS)})"
+            ),
+            [{"id": row["id"], **{column: row.get(column) or "" for column in INDEX_COLUMNS}} for row in rows]
+        )
+
+    @staticmethod
+    def webpage_text(webpage) -> str:
+        if webpage is None:
+            return ""
+        fields = [webpage.title, webpage.description, webpage.summary, webpage.keywords]
+        return "\n".join(field for field in fields if field)
+
+    @staticmethod
+    def _quote(term: str) -> str:
+        return '"' + term.replace('"', '""') + '"'
+
+    @staticmethod
+    def _escape_like(term: str) -> str:
+        return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+search_service = SearchService()
@@ -0,0 +1,336 @@
+import bisect
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from pypinyin import lazy_pinyin
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..config import settings
+
+
+# 拉丁字母/拼音前缀的最大索引长度，更长的输入先用截断前缀召回再逐条校验
+MAX_PREFIX_LENGTH = 6
+
+# 声母缩写（如 "xxbj"）的最大索引长度
+MAX_INITIALS_LENGTH = 4
+
+# 标题只索引前若干个字符，控制内存占用
+MAX_INDEXED_CHARS = 32
+
+# 倒排列表超过该长度时缓存按排名排好的顺序，查询时可以提前结束扫描
+ORDERED_CACHE_THRESHOLD = 256
+
+
+def _is_cjk(char: str) -> bool:
+    code = ord(char)
+    return (
+        0x4E00 <= code <= 0x9FFF
+        or 0x3400 <= code <= 0x4DBF
+        or 0x20000 <= code <= 0x2A6DF
+        or 0xF900 <= code <= 0xFAFF
+    )
+
+
+def normalize(text: str) -> str:
+    # NFKC 把全角字母数字转成半角
+    return unicodedata.normalize("NFKC", text).lower().strip()
+
+
+def segment(text: str) -> List[Tuple[str, str]]:
+    """把文本切分为 ("cjk", 汉字串) 和 ("word", 字母数字串) 片段"""
+    segments = []
+    kind = None
+    buffer = []
+    for char in text:
+        if _is_cjk(char):
+            char_kind = "cjk"
+        elif char.isalnum():
+            char_kind = "word"
+        else:
+            char_kind = None
+
+        if char_kind != kind and buffer:
+            segments.append((kind, "".join(buffer)))
+            buffer = []
+        kind = char_kind
+        if char_kind is not None:
+            buffer.append(char)
+
+    if buffer:
+        segments.append((kind, "".join(buffer)))
+    return segments
+
+
+class _Entry:
+    __slots__ = ("text", "forms", "keys")
+
+    def __init__(self, text: str, forms: List[str], keys: Set[str]):
+        self.text = text
+        self.forms = forms
+        self.keys = keys
+
+
+class SuggestIndex:
+    """单一类型（知识项标题或标签名）的前缀 / n-gram 倒排索引
+
+    - 汉字：单字和二元组，任意位置都能命中
+    - 英文单词：词首前缀
+    - 拼音：每段汉字的全拼前缀和声母缩写前缀
+    - "^" 开头的键：整条文本（原文 / 拼音 / 声母）的前缀，用于把前缀匹配排在前面
+    """
+
+    def __init__(self):
+        self.entries: Dict[int, _Entry] = {}
+        self.ranks: Dict[int, Tuple[int, int]] = {}
+        self.postings: Dict[str, Set[int]] = {}
+        self._ordered: Dict[str, List[int]] = {}
+
+    def add(self, entry_id: int, text: str):
+        self.remove(entry_id)
+
+        keys: Set[str] = set()
+        compact, pinyin, initials = [], [], []
+
+        for kind, value in segment(normalize(text)[:MAX_INDEXED_CHARS]):
+            compact.append(value)
+            if kind == "word":
+                keys.update(value[:length] for length in range(1, min(len(value), MAX_PREFIX_LENGTH) + 1))
+                pinyin.append(value)
+                initials.append(value[0])
+                continue
+
+            keys.update(value)
+            keys.update(value[index:index + 2] for index in range(len(value) - 1))
+
+            syllables = lazy_pinyin(value)
+            full = "".join(syllables)
+            short = "".join(syllable[0] for syllable in syllables if syllable)
+            keys.update(full[:length] for length in range(1, min(len(full), MAX_PREFIX_LENGTH) + 1))
+            keys.update(short[:length] for length in range(2, min(len(short), MAX_INITIALS_LENGTH) + 1))
+            pinyin.append(full)
+            initials.append(short)
+
+        forms = ["".join(compact), "".join(pinyin), "".join(initials)]
+        for form in forms:
+            keys.update("^" + form[:length] for length in range(1, min(len(form), MAX_PREFIX_LENGTH) + 1))
+
+        self.entries[entry_id] = _Entry(text, forms, keys)
+        self.ranks[entry_id] = (len(text), -entry_id)
+        for key in keys:
+            self.postings.setdefault(key, set()).add(entry_id)
+            ordered = self._ordered.get(key)
+            if ordered is not None:
+                bisect.insort(ordered, entry_id, key=self.ranks.__getitem__)
+
+    def remove(self, entry_id: int):
+        entry = self.entries.pop(entry_id, None)
+        if entry is None:
+            return
+        rank = self.ranks[entry_id]
+        for key in entry.keys:
+            ids = self.postings.get(key)
+            if ids is None:
+                continue
+            ids.discard(entry_id)
+            ordered = self._ordered.get(key)
+            if ordered is not None:
+                index = bisect.bisect_left(ordered, rank, key=self.ranks.__getitem__)
+                if index < len(ordered) and ordered[index] == entry_id:
+                    del ordered[index]
+            if not ids:
+                del self.postings[key]
+                self._ordered.pop(key, None)
+        del self.ranks[entry_id]
+
+    def query(self, query: str, limit: int) -> List[Tuple[tuple, int, str]]:
+        segments = segment(normalize(query))
+        if not segments:
+            return []
+
+        keys = set()
+        verify = False
+        for kind, value in segments:
+            if kind == "word":
+                keys.add(value[:MAX_PREFIX_LENGTH])
+                verify = verify or len(value) > MAX_PREFIX_LENGTH
+            elif len(value) == 1:
+                keys.add(value)
+            else:
+                keys.update(value[index:index + 2] for index in range(len(value) - 1))
+                verify = verify or len(value) > 2
+        needles = [value for _, value in segments]
+        compact = "".join(needles)
+
+        posting_keys = sorted(keys, key=lambda key: len(self.postings.get(key, ())))
+        if not self.postings.get(posting_keys[0]):
+            return []
+        filters = [self.postings[key] for key in posting_keys[1:]]
+
+        def accept(entry_id: int) -> bool:
+            if not all(entry_id in ids for ids in filters):
+                return False
+            if verify:
+                forms = self.entries[entry_id].forms
+                return all(any(needle in form for form in forms) for needle in needles)
+            return True
+
+        # 整条文本以查询开头的优先，其余按较短文本、较新记录排序
+        results = []
+        seen = set()
+        anchor = "^" + compact[:MAX_PREFIX_LENGTH]
+        if anchor in self.postings:
+            for entry_id in self._iter_ordered(anchor):
+                if len(results) >= limit:
+                    break
+                if entry_id not in self.postings[posting_keys[0]] or not accept(entry_id):
+                    continue
+                if len(compact) > MAX_PREFIX_LENGTH and not any(
+                    form.startswith(compact) for form in self.entries[entry_id].forms
+                ):
+                    continue
+                results.append(((False,) + self.ranks[entry_id], entry_id))
+                seen.add(entry_id)
+
+        for entry_id in self._iter_ordered(posting_keys[0]):
+            if len(results) >= limit:
+                break
+            if entry_id in seen or not accept(entry_id):
+                continue
+            results.append(((True,) + self.ranks[entry_id], entry_id))
+
+        return [(rank, entry_id, self.entries[entry_id].text) for rank, entry_id in results]
+
+    def _iter_ordered(self, key: str) -> List[int]:
+        ordered = self._ordered.get(key)
+        if ordered is None:
+            ordered = sorted(self.postings[key], key=self.ranks.__getitem__)
+            if len(ordered) >= ORDERED_CACHE_THRESHOLD:
+                self._ordered[key] = ordered
+        return ordered
+
+
+class SuggestService:
+    """知识项标题和标签名的搜索建议，索引常驻内存
+
+    本进程的修改由 crud 在提交后增量更新；其它进程（多个 worker、命令行导入）直接写库，
+    查询时每隔 SUGGEST_REFRESH_INTERVAL 秒检查一次：updated_at 比上次新的行重新索引，
+    行数与索引条数不一致（其它进程删除了记录）时重建该索引。
+    """
+
+    def __init__(self):
+        self.knowledge = SuggestIndex()
+        self.tags = SuggestIndex()
+        self.loaded = False
+        self._watermarks: Dict[str, Optional[datetime]] = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _sources(self):
+        from ..models import KnowledgeItem, Tag
+
+        return (
+            ("knowledge", KnowledgeItem, KnowledgeItem.title),
+            ("tags", Tag, Tag.name)
+        )
+
+    def ensure_loaded(self, db: Session):
+        if self.loaded:
+            return
+        with self._lock:
+            if self.loaded:
+                return
+            for name, model, column in self._sources():
+                # 先取水位再读数据，读的过程中其它进程的修改留给下次检查
+                self._watermarks[name] = db.query(func.max(model.updated_at)).scalar()
+                index = SuggestIndex()
+                for entry_id, text in db.query(model.id, column).all():
+                    index.add(entry_id, text)
+                setattr(self, name, index)
+            self._checked_at = time.monotonic()
+            self.loaded = True
+
+    def refresh(self, db: Session):
+        """检查其它进程对数据库的修改；两次检查之间不足 SUGGEST_REFRESH_INTERVAL 秒或另一个线程正在检查时直接返回"""
+        if time.monotonic() - self._checked_at < settings.SUGGEST_REFRESH_INTERVAL:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            for name, model, column in self._sources():
+                self._sync(db, name, model, column)
+        finally:
+            self._refresh_lock.release()
+
+    def _sync(self, db: Session, name: str, model, column):
+        count, latest = db.query(func.count(model.id), func.max(model.updated_at)).one()
+        watermark = self._watermarks.get(name)
+        if latest is not None:
+            query = db.query(model.id, column)
+            if watermark is not None:
+                # updated_at 只精确到秒，同一秒内的再次修改不会让最大值变化，每次都重取水位所在的那一秒；
+                # 走 updated_at 索引，只有文本变了的行才重新索引
+                query = query.filter(model.updated_at > watermark - timedelta(seconds=1))
+            changed = query.all()
+            with self._lock:
+                index = getattr(self, name)
+                for entry_id, text in changed:
+                    entry = index.entries.get(entry_id)
+                    if entry is None or entry.text != text:
+                        index.add(entry_id, text)
+            self._watermarks[name] = latest
+
+        if count != len(getattr(self, name).entries):
+            index = SuggestIndex()
+            for entry_id, text in db.query(model.id, column).all():
+                index.add(entry_id, text)
+            with self._lock:
+                setattr(self, name, index)
+
+    def suggest(self, db: Session, query: str, limit: int = 10) -> List[Dict]:
+        self.ensure_loaded(db)
+        self.refresh(db)
+        with self._lock:
+            matches = [
+                (rank, "tag", entry_id, text)
+                for rank, entry_id, text in self.tags.query(query, limit)
+            ] + [
+                (rank, "knowledge", entry_id, text)
+                for rank, entry_id, text in self.knowledge.query(query, limit)
+            ]
+        matches.sort(key=lambda match: match[0])
+        return [
+            {"type": kind, "id": entry_id, "text": text}
+            for _, kind, entry_id, text in matches[:limit]
+        ]
+
+    # 以下增量更新方法由 crud 在提交后调用；索引尚未加载时无需维护
+    def update_knowledge(self, item_id: int, title: Optional[str]):
+        self._update("knowledge", item_id, title)
+
+    def remove_knowledge(self, item_id: int):
+        self._update("knowledge", item_id, None)
+
+    def update_tag(self, tag_id: int, name: Optional[str]):
+        self._update("tags", tag_id, name)
+
+    def remove_tag(self, tag_id: int):
+        self._update("tags", tag_id, None)
+
+    def _update(self, name: str, entry_id: int, text: Optional[str]):
+        if not self.loaded:
+            return
+        with self._lock:
+            index = getattr(self, name)
+            if text is None:
+                index.remove(entry_id)
+            else:
+                index.add(entry_id, text)
+
+
+suggest_service = SuggestService()
@@ -0,0 +1,322 @@
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import yaml
+from fastapi import UploadFile
+
+from ..config import settings
+from ..database import SessionLocal
+from .job_registry import JobRegistry
+
+
+# 错误列表最多保留的条数
+MAX_JOB_ERRORS = 100
+
+MARKDOWN_SUFFIXES = (".md", ".markdown")
+
+# 以 "." 开头的目录（.obsidian、.trash、.git 等）也会跳过
+SKIPPED_NAMES = {"__MACOSX", "node_modules"}
+
+FRONT_MATTER = re.compile(r"\A---[ \t]*\r?\n(.*?)^(?:---|\.\.\.)[ \t]*\r?$", re.S | re.M)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def _skipped(name: str) -> bool:
+    return name.startswith(".") or name in SKIPPED_NAMES
+
+
+class DirectorySource:
+    """本地笔记目录，逐个目录扫描，不预先列出整棵树"""
+
+    def __init__(self, root: str):
+        self.root = Path(root).resolve()
+        self.key = f"dir:{self.root}"
+        self.name = self.root.name
+
+    def iter_paths(self) -> Iterator[str]:
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+            except OSError:
+                continue
+            subdirs = []
+            for entry in entries:
+                if _skipped(entry.name):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file() and entry.name.lower().endswith(MARKDOWN_SUFFIXES):
+                    yield Path(entry.path).relative_to(self.root).as_posix()
+            stack.extend(reversed(subdirs))
+
+    def read(self, path: str) -> bytes:
+        full_path = self.root / path
+        if full_path.stat().st_size > settings.IMPORT_MAX_FILE_BYTES:
+            raise ValueError("文件过大")
+        return full_path.read_bytes()
+
+    def close(self):
+        pass
+
+
+class ZipSource:
+    """笔记库压缩包；来源标识取文件内容的 sha256，重新上传同一个压缩包即可续传"""
+
+    def __init__(self, zip_path: str, key: str, name: str, remove: bool = False):
+        self.zip_path = zip_path
+        self.key = key
+        self.name = name
+        self.remove = remove
+        self.archive = zipfile.ZipFile(zip_path)
+        self._infos: Dict[str, zipfile.ZipInfo] = {}
+
+    def iter_paths(self) -> Iterator[str]:
+        for info in self.archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(MARKDOWN_SUFFIXES):
+                continue
+            parts = [part for part in info.filename.replace("\\", "/").split("/") if part not in ("", ".")]
+            # 不接受 ".." 之类跳出根目录的路径
+            if not parts or any(part == ".." or _skipped(part) for part in parts):
+                continue
+            path = "/".join(parts)
+            self._infos[path] = info
+            yield path
+
+    def read(self, path: str) -> bytes:
+        info = self._infos.pop(path)
+        if info.file_size > settings.IMPORT_MAX_FILE_BYTES:
+            raise ValueError("文件过大")
+        with self.archive.open(info) as f:
+            data = f.read(settings.IMPORT_MAX_FILE_BYTES + 1)
+        if len(data) > settings.IMPORT_MAX_FILE_BYTES:
+            raise ValueError("文件过大")
+        return data
+
+    def close(self):
+        self.archive.close()
+        if self.remove:
+            os.remove(self.zip_path)
+
+
+Source = Union[DirectorySource, ZipSource]
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def open_source(path: str) -> Source:
+    """目录或 .zip 文件"""
+    if os.path.isdir(path):
+        return DirectorySource(path)
+    if zipfile.is_zipfile(path):
+        return ZipSource(path, f"zip:{file_sha256(path)}", Path(path).name)
+    raise ValueError(f"{path} 不是目录或 zip 文件")
+
+
+def parse_tags(value) -> List[str]:
+    """front matter 中的 tags 可以是列表，也可以是逗号或空格分隔的字符串"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = re.split(r"[,\s]+", value)
+    elif not isinstance(value, (list, tuple)):
+        value = [value]
+    names = []
+    for tag in value:
+        name = str(tag).strip().lstrip("#").strip() if tag is not None else ""
+        if name:
+            names.append(name[:100])
+    return list(dict.fromkeys(names))
+
+
+def parse_note(path: str, data: bytes) -> Dict:
+    content = data.decode("utf-8-sig")
+    meta = {}
+    match = FRONT_MATTER.match(content)
+    if match:
+        try:
+            loaded = yaml.safe_load(match.group(1))
+        except yaml.YAMLError:
+            loaded = None
+        if isinstance(loaded, dict):
+            meta = loaded
+
+    title = meta.get("title")
+    if not isinstance(title, str) or not title.strip():
+        title = PurePosixPath(path).stem
+    return {
+        "path": path,
+        "dirs": tuple(path.split("/")[:-1]),
+        "title": title.strip(),
+        "content": content,
+        "tags": parse_tags(meta.get("tags", meta.get("tag"))),
+        "size": len(data)
+    }
+
+
+def _load(source: Source, path: str) -> Union[Dict, Exception]:
+    try:
+        return parse_note(path, source.read(path))
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+        return e
+
+
+def _batches(paths: Iterator[str], size: int) -> Iterator[List[str]]:
+    batch = []
+    for path in paths:
+        batch.append(path)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class VaultImportJob:
+    def __init__(self, source: str, folder_id: Optional[int] = None):
+        self.id = uuid.uuid4().hex
+        self.status = "pending"
+        self.source = source
+        self.folder_id = folder_id
+        self.discovered = 0
+        self.imported = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.errors: List[Dict] = []
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return ((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds()
+
+    @property
+    def files_per_second(self) -> Optional[float]:
+        elapsed = self.elapsed
+        return round(self.imported / elapsed, 2) if elapsed else None
+
+    @property
+    def megabytes_per_second(self) -> Optional[float]:
+        elapsed = self.elapsed
+        return round(self.bytes / 1024 / 1024 / elapsed, 3) if elapsed else None
+
+    def add_error(self, error: Dict):
+        if len(self.errors) < MAX_JOB_ERRORS:
+            self.errors.append(error)
+
+
+class VaultImportService:
+    """把 Obsidian / Typora 等笔记库导入为 Markdown 知识项
+
+    边扫描边导入：每凑满一批路径就用线程池并行读取和解析，目录映射为文件夹，front matter 中的标签映射为标签，
+    整批在一个事务中写入。每个写入的文件都有导入记录，中断后对同一来源重新导入会跳过已完成的文件。
+    """
+
+    def __init__(self):
+        self.jobs: JobRegistry[VaultImportJob] = JobRegistry()
+
+    def start(self, source: Source, folder_id: Optional[int] = None) -> VaultImportJob:
+        job = VaultImportJob(source.name, folder_id)
+        self.jobs.add(job)
+        job.task = asyncio.create_task(asyncio.to_thread(self.run, job, source))
+        return job
+
+    def get_job(self, job_id: str) -> Optional[VaultImportJob]:
+        return self.jobs.get(job_id)
+
+    async def save_upload(self, file: UploadFile) -> ZipSource:
+        """把上传的压缩包流式写到临时文件，同时计算 sha256"""
+        tmp_dir = Path(settings.DATA_DIR) / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = tmp_dir / f"{uuid.uuid4().hex}.zip"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > settings.IMPORT_MAX_ZIP_BYTES:
+                        raise ValueError(f"压缩包不能超过 {settings.IMPORT_MAX_ZIP_BYTES // 1024 // 1024} MB")
+                    digest.update(chunk)
+                    f.write(chunk)
+            if not zipfile.is_zipfile(tmp_path):
+                raise ValueError("不是有效的 zip 文件")
+            return ZipSource(str(tmp_path), f"zip:{digest.hexdigest()}", file.filename or tmp_path.name, remove=True)
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def run(
+        self,
+        job: VaultImportJob,
+        source: Source,
+        progress: Optional[Callable[[VaultImportJob], None]] = None
+    ):
+        from ..crud import folder as folder_crud
+        from ..crud import markdown as markdown_crud
+
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        folders: Dict[Tuple[Optional[int], str], Tuple[int, str, int]] = {}
+        db = SessionLocal()
+        try:
+            done = markdown_crud.get_imported_paths(db, source.key)
+            with ThreadPoolExecutor(settings.IMPORT_READ_WORKERS, thread_name_prefix="vault-read") as pool:
+                for batch in _batches(source.iter_paths(), settings.IMPORT_BATCH_SIZE):
+                    job.discovered += len(batch)
+                    paths = [path for path in batch if path not in done]
+                    job.skipped += len(batch) - len(paths)
+
+                    notes = []
+                    for path, note in zip(paths, pool.map(lambda path: _load(source, path), paths)):
+                        if isinstance(note, Exception):
+                            job.failed += 1
+                            job.add_error({"path": path, "error": str(note) or note.__class__.__name__})
+                            continue
+                        note["folder_id"] = folder_crud.get_or_create_folder_path(
+                            db, note["dirs"], job.folder_id, folders
+                        )
+                        notes.append(note)
+
+                    if notes:
+                        markdown_crud.import_markdown_notes(db, source.key, notes)
+                        job.imported += len(notes)
+                        job.bytes += sum(note["size"] for note in notes)
+                    if progress:
+                        progress(job)
+            # 只建了目录、没有笔记的批次也要提交
+            db.commit()
+            job.status = "finished"
+        except Exception as e:
+            db.rollback()
+            job.status = "failed"
+            job.errors.append({"error": str(e) or e.__class__.__name__})
+        finally:
+            db.close()
+            source.close()
+            job.finished_at = datetime.utcnow()
+        return job
+
+
+vault_import_service = VaultImportService()
@@ -1,6 +1,25 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
 from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from ..config import settings
+from . import html_extractor
+from .executor import cpu_executor, ExecutorBusyError
+from .fetch_cache import FetchCache
+
+
+class _HostLimit:
+    """单个主机的并发限制；users 为正在使用或等待的请求数，降为 0 时移除"""
+
+    __slots__ = ("semaphore", "users")
+
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(settings.FETCH_MAX_CONNECTIONS_PER_HOST)
+        self.users = 0
 
 
 class WebpageFetcher:
@@ -8,12 +27,39 @@ class WebpageFetcher:
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
         }
+        self._client: Optional[httpx.AsyncClient] = None
+        # 只保留有请求在进行的主机，长期运行的抓取和刷新不会无限增长
+        self._host_limits: Dict[str, _HostLimit] = {}
+        self.cache = FetchCache() if settings.FETCH_CACHE_ENABLED else None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # 所有抓取共享同一个连接池，复用 keep-alive 连接和已解析的地址
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(settings.FETCH_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=settings.FETCH_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.FETCH_MAX_CONNECTIONS,
+                    keepalive_expiry=settings.FETCH_KEEPALIVE_EXPIRY
+                ),
+                follow_redirects=True
+            )
+        return self._client
 
-    def fetch(self, url: str) -> Dict:
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self.cache is not None:
+            self.cache.close()
+
+    async def fetch(self, url: str) -> Dict:
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            return self.extract_content(response.text, url)
+            return await self.fetch_page(url)
+        except ExecutorBusyError:
+            raise
         except Exception as e:
             return {
                 "url": url,
@@ -24,46 +70,71 @@ class WebpageFetcher:
                 "error": str(e)
             }
 
-    def extract_content(self, html: str, url: str) -> Dict:
-        soup = BeautifulSoup(html, "html.parser")
-
-        title = self._extract_title(soup)
-        description = self._extract_meta(soup, "description")
-        keywords = self._extract_meta(soup, "keywords")
-        summary = self._extract_summary(soup)
-
-        return {
-            "url": url,
-            "title": title,
-            "description": description,
-            "summary": summary,
-            "keywords": keywords
-        }
+    async def fetch_page(self, url: str) -> Dict:
+        """抓取并提取网页信息，页面未变化时返回缓存结果并带上 not_modified=True"""
+        # 缓存是同步的 SQLite，读写放到线程中，不阻塞事件循环
+        cached = await asyncio.to_thread(self.cache.get, url) if self.cache is not None else None
+        if cached and not cached["data"]:
+            cached = None
+
+        # 条件请求：源站返回 304 时不再下载和解析
+        headers = {}
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        async with self._host_limit(url):
+            async with self.client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and cached:
+                    return {**cached["data"], "url": url, "not_modified": True}
+                response.raise_for_status()
+                body = await self._read_body(response)
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                encoding = response.charset_encoding
+
+        # 源站不支持条件请求时，用内容哈希判断是否变化
+        content_hash = hashlib.sha256(body).hexdigest()
+        if cached and cached["content_hash"] == content_hash:
+            if (etag, last_modified) != (cached["etag"], cached["last_modified"]):
+                await asyncio.to_thread(self.cache.set, url, etag, last_modified, content_hash, cached["data"])
+            return {**cached["data"], "url": url, "not_modified": True}
+
+        # 解码和解析在共享执行器里进行，不占用事件循环
+        data = await cpu_executor.run("extract_webpage", html_extractor.extract_bytes, body, encoding, url)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, url, etag, last_modified, content_hash, data)
+        return {**data, "not_modified": False}
 
-    def _extract_title(self, soup: BeautifulSoup) -> Optional[str]:
-        if soup.title:
-            return soup.title.string.strip()
-        h1 = soup.find("h1")
-        if h1:
-            return h1.get_text(strip=True)
-        return None
-
-    def _extract_meta(self, soup: BeautifulSoup, name: str) -> Optional[str]:
-        meta = soup.find("meta", attrs={"name": name})
-        if meta and meta.get("content"):
-            return meta["content"].strip()
-        meta = soup.find("meta", attrs={"property": f"og:{name}"})
-        if meta and meta.get("content"):
-            return meta["content"].strip()
-        return None
-
-    def _extract_summary(self, soup: BeautifulSoup) -> Optional[str]:
-        paragraphs = soup.find_all("p")
-        if paragraphs:
-            texts = [p.get_text(strip=True) for p in paragraphs[:3] if p.get_text(strip=True)]
-            if texts:
-                return " ".join(texts)[:500]
-        return None
+    @asynccontextmanager
+    async def _host_limit(self, url: str):
+        host = (urlsplit(url).hostname or "").lower()
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = _HostLimit()
+        limit.users += 1
+        try:
+            async with limit.semaphore:
+                yield
+        finally:
+            limit.users -= 1
+            if not limit.users:
+                del self._host_limits[host]
+
+    async def _read_body(self, response: httpx.Response) -> bytes:
+        # 超过上限的部分直接丢弃，提取标题和摘要只需要页面开头
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= settings.FETCH_MAX_BYTES:
+                break
+        return b"".join(chunks)[:settings.FETCH_MAX_BYTES]
+
+    def extract_content(self, html: str, url: str) -> Dict:
+        return html_extractor.extract_content(html, url)
 
 
 webpage_fetcher = WebpageFetcher()
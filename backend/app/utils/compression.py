@@ -0,0 +1,110 @@
+"""Markdown 文件的压缩存储
+
+压缩与否不体现在文件名上，读取时按文件头的魔数判断：gzip 以 1f 8b 开头，zstd 以 28 b5 2f fd 开头，
+这两个序列都不是合法的 UTF-8 文本开头，不会与未压缩的 Markdown 混淆。因此同一路径可以原地转换编码，
+数据库中的 file_path 不需要改动。
+"""
+import gzip
+import zlib
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，只有使用 zstd 时才需要
+    zstandard = None
+
+
+CODECS = ("none", "gzip", "zstd")
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def check_codec(codec: str):
+    if codec not in CODECS:
+        raise ValueError(f"不支持的压缩方式 {codec!r}，可选 {', '.join(CODECS)}")
+    if codec == "zstd" and zstandard is None:
+        raise RuntimeError("使用 zstd 压缩需要安装 zstandard：pip install zstandard")
+
+
+def available_codecs():
+    return [codec for codec in CODECS if codec != "zstd" or zstandard is not None]
+
+
+def detect(head: bytes) -> str:
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return "none"
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        # mtime 固定为 0，相同内容压缩结果相同
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if codec == "zstd":
+        check_codec(codec)
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return data
+
+
+def decompress(data: bytes) -> bytes:
+    codec = detect(data[:4])
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        check_codec(codec)
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def open_reader(f: BinaryIO, codec: Optional[str] = None) -> BinaryIO:
+    """在以二进制打开的文件上套一层增量解压，按块读取时不会一次解压整个文件"""
+    if codec is None:
+        if hasattr(f, "peek"):
+            codec = detect(f.peek(4)[:4])
+        else:
+            codec = detect(f.read(4))
+            f.seek(0)
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=f, mode="rb")
+    if codec == "zstd":
+        check_codec(codec)
+        return zstandard.ZstdDecompressor().stream_reader(f, closefd=False)
+    return f
+
+
+def uncompressed_size(f: BinaryIO, codec: str) -> Optional[int]:
+    """从文件尾部或帧头读出解压后的大小，读不到时返回 None；调用后文件位置不确定"""
+    if codec == "gzip":
+        # ISIZE：最后 4 字节，原始大小对 2^32 取模，单个 Markdown 文件不会超过
+        f.seek(-4, 2)
+        return int.from_bytes(f.read(4), "little")
+    if codec == "zstd":
+        check_codec(codec)
+        f.seek(0)
+        size = zstandard.frame_content_size(f.read(18))
+        return size if size >= 0 else None
+    f.seek(0, 2)
+    return f.tell()
+
+
+def compress_stream(codec: str, size: int = -1):
+    """增量压缩器，compress() / flush() 的用法与 zlib 一致；zstd 传入 size 时写进帧头，供 uncompressed_size 读取"""
+    if codec == "gzip":
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    check_codec(codec)
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj(size=size)
+
+
+def gzip_blocks(blocks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = compress_stream("gzip")
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
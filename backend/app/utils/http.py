@@ -0,0 +1,69 @@
+"""条件请求和 Range 请求的解析"""
+import re
+from typing import Iterable, Optional, Tuple
+
+
+class RangeNotSatisfiableError(ValueError):
+    """请求的范围超出内容长度"""
+
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _opaque(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(header: Optional[str], etags: Iterable[str]) -> bool:
+    """If-None-Match 使用弱比较，忽略 W/ 前缀"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {_opaque(etag) for etag in etags}
+    return any(_opaque(tag) in candidates for tag in header.split(","))
+
+
+def if_range_matches(header: Optional[str], etag: str) -> bool:
+    """If-Range 要求强比较，弱 ETag 或不一致时忽略 Range 返回完整内容；只支持 ETag 形式"""
+    if not header:
+        return True
+    return not etag.startswith("W/") and header.strip() == etag
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """解析单个字节范围，返回闭区间 (start, end)
+
+    格式不认识或包含多个范围时返回 None，按普通请求返回完整内容。
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if size == 0:
+        raise RangeNotSatisfiableError()
+    if first == "":
+        # bytes=-N：最后 N 个字节
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiableError()
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiableError()
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def accepts_encoding(header: Optional[str], encoding: str) -> bool:
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() != encoding:
+            continue
+        match = re.search(r"q=([0-9.]+)", params)
+        return not match or float(match.group(1)) > 0
+    return False
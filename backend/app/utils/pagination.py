@@ -0,0 +1,84 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, String, asc, desc, tuple_, type_coerce
+from sqlalchemy.orm import Query
+from sqlalchemy.sql.elements import ColumnElement
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析，或与当前排序方式不一致"""
+
+
+def encode_cursor(sort: str, order: str, value: Any, last_id: int) -> str:
+    if isinstance(value, datetime):
+        # isoformat 在微秒为 0 时省略小数部分，与 SQLite 中 CURRENT_TIMESTAMP 的存储格式一致
+        value = value.isoformat(sep=" ")
+    payload = json.dumps([sort, order, value, last_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str, Any, int]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort, order, value, last_id = json.loads(payload)
+    except (ValueError, TypeError):
+        raise InvalidCursorError("游标无效")
+    if not isinstance(last_id, int):
+        raise InvalidCursorError("游标无效")
+    return sort, order, value, last_id
+
+
+def keyset_paginate(
+    query: Query,
+    sort_columns: Dict[str, ColumnElement],
+    id_column: ColumnElement,
+    sort: str = "id",
+    order: str = "asc",
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    page: int = 1
+) -> Tuple[List, Optional[str]]:
+    """按 (排序列, id) 做游标分页，返回 (当前页, 下一页游标)
+
+    排序列都有对应的 (列, id) 复合索引，翻到任意深度都只是一次索引范围扫描。
+    没有游标时仍接受 page 参数按偏移量翻页，兼容旧的调用方式。
+    """
+    if sort not in sort_columns:
+        raise InvalidCursorError(f"不支持的排序字段: {sort}")
+    sort_column = sort_columns[sort]
+    by_id = sort_column is id_column
+    direction = desc if order == "desc" else asc
+
+    if cursor:
+        cursor_sort, cursor_order, value, last_id = decode_cursor(cursor)
+        if (cursor_sort, cursor_order) != (sort, order):
+            raise InvalidCursorError("游标与当前排序方式不一致")
+        if by_id:
+            condition = id_column < last_id if order == "desc" else id_column > last_id
+        else:
+            compare_column = sort_column
+            if isinstance(sort_column.type, DateTime) and value is not None:
+                if query.session.get_bind().dialect.name == "sqlite":
+                    # SQLite 中时间以字符串存储，按原样比较，不会改变索引的使用
+                    compare_column = type_coerce(sort_column, String)
+                else:
+                    value = datetime.fromisoformat(value)
+            key = tuple_(compare_column, id_column)
+            condition = key < (value, last_id) if order == "desc" else key > (value, last_id)
+        query = query.filter(condition)
+
+    order_by = [direction(sort_column)] if by_id else [direction(sort_column), direction(id_column)]
+    query = query.order_by(*order_by)
+    if not cursor and page > 1:
+        query = query.offset((page - 1) * limit)
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, order, getattr(last, sort_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
@@ -0,0 +1,134 @@
+"""标签布尔查询表达式
+
+语法（优先级 NOT > AND > OR，相邻的项之间省略运算符时视为 AND）：
+    (python AND asyncio) OR rust NOT draft
+    "machine learning" -draft
+标签名含空格或与运算符同名时用双引号括起来；运算符只识别大写的 AND / OR / NOT，另外 "-" 前缀等同于 NOT。
+
+解析结果是嵌套元组：("tag", 名称)、("not", 子式)、("and", 子式...)、("or", 子式...)。
+"""
+import re
+from typing import List, Optional, Set, Tuple
+
+Node = Tuple
+
+
+class TagQueryError(ValueError):
+    """表达式无法解析"""
+
+
+MAX_TERMS = 64
+
+_TOKEN = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|(-)|([^\s()"]+))')
+
+
+def _tokenize(expression: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise TagQueryError("引号未闭合")
+        position = match.end()
+        lparen, rparen, quoted, minus, word = match.groups()
+        if lparen:
+            tokens.append(("(", lparen))
+        elif rparen:
+            tokens.append((")", rparen))
+        elif quoted is not None:
+            tokens.append(("tag", re.sub(r"\\(.)", r"\1", quoted)))
+        elif minus:
+            tokens.append(("NOT", minus))
+        elif word in ("AND", "OR", "NOT"):
+            tokens.append((word, word))
+        else:
+            tokens.append(("tag", word))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+        self.terms = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, str]:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            raise TagQueryError("表达式为空")
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise TagQueryError(f"多余的 {self.tokens[self.position][1]!r}")
+        return node
+
+    def parse_or(self) -> Node:
+        operands = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take()
+            operands.append(self.parse_and())
+        return operands[0] if len(operands) == 1 else ("or", *operands)
+
+    def parse_and(self) -> Node:
+        operands = [self.parse_not()]
+        while self.peek() in ("AND", "NOT", "tag", "("):
+            if self.peek() == "AND":
+                self.take()
+            operands.append(self.parse_not())
+        return operands[0] if len(operands) == 1 else ("and", *operands)
+
+    def parse_not(self) -> Node:
+        if self.peek() == "NOT":
+            self.take()
+            return ("not", self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self) -> Node:
+        kind = self.peek()
+        if kind == "(":
+            self.take()
+            node = self.parse_or()
+            if self.peek() != ")":
+                raise TagQueryError("括号未闭合")
+            self.take()
+            return node
+        if kind == "tag":
+            self.terms += 1
+            if self.terms > MAX_TERMS:
+                raise TagQueryError(f"表达式中的标签不能超过 {MAX_TERMS} 个")
+            return ("tag", self.take()[1])
+        if kind is None:
+            raise TagQueryError("表达式不完整")
+        raise TagQueryError(f"此处不能出现 {self.take()[1]!r}")
+
+
+def parse_tag_query(expression: str) -> Node:
+    return _Parser(_tokenize(expression)).parse()
+
+
+def tag_names(node: Node) -> Set[str]:
+    if node[0] == "tag":
+        return {node[1]}
+    names = set()
+    for child in node[1:]:
+        names |= tag_names(child)
+    return names
+
+
+def evaluate(node: Node, tags: Set[str]) -> bool:
+    """在给定的标签集合上求值"""
+    kind = node[0]
+    if kind == "tag":
+        return node[1] in tags
+    if kind == "not":
+        return not evaluate(node[1], tags)
+    if kind == "and":
+        return all(evaluate(child, tags) for child in node[1:])
+    return any(evaluate(child, tags) for child in node[1:])
@@ -0,0 +1,55 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """规范化 URL：协议和主机小写、去掉默认端口和片段
+
+    端口超出范围、IPv6 地址缺少方括号等无法解析的 URL 只去掉首尾空白后原样返回，由抓取时报错。
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        # hostname 去掉了 IPv6 地址的方括号，拼回时要补上
+        host = f"[{host}]"
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    if parts.username:
+        userinfo = parts.username + (f":{parts.password}" if parts.password else "")
+        host = f"{userinfo}@{host}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+# 不影响页面内容的跟踪参数
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "spm", "mc_cid", "mc_eid"}
+
+
+def canonical_url(url: str) -> str:
+    """用于判重的规范 URL：在 normalize_url 基础上去掉跟踪参数并排序查询参数，http 与 https 视为同一地址
+
+    只用作唯一键，实际抓取仍使用原始 URL。
+    """
+    normalized = normalize_url(url)
+    try:
+        parts = urlsplit(normalized)
+    except ValueError:
+        return normalized
+    # 按参数名稳定排序，同名参数保持原有顺序
+    query = sorted(
+        (
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+        ),
+        key=lambda pair: pair[0]
+    )
+    scheme = "https" if parts.scheme == "http" else parts.scheme
+    return urlunsplit((scheme, parts.netloc, parts.path, urlencode(query), ""))
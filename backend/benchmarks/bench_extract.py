@@ -0,0 +1,111 @@
+"""网页信息提取基准测试
+
+对比流式提取器（app.services.html_extractor）与原先基于 BeautifulSoup 整树解析的实现。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_extract.py
+    python benchmarks/bench_extract.py --dir /path/to/saved/pages --repeat 20 --pad-mb 4
+
+--pad-mb 会在每个页面的 </body> 前追加若干 MB 的段落，模拟大体积页面。
+未安装 beautifulsoup4 时只测流式提取器。
+未闭合的 <p>、大小写不同的 meta name 等情况下两者结果不同（same 列为 False），
+流式提取器按 HTML 规范隐式结束段落，BeautifulSoup 的 html.parser 会把后续段落嵌套进去。
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.html_extractor import extract_content  # noqa: E402
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "html"
+
+
+def extract_with_soup(html: str, url: str) -> dict:
+    soup = BeautifulSoup(html, "html.parser")
+
+    title = None
+    if soup.title and soup.title.string:
+        title = soup.title.string.strip()
+    elif soup.find("h1"):
+        title = soup.find("h1").get_text(strip=True)
+
+    def meta(name):
+        for attrs in ({"name": name}, {"property": f"og:{name}"}):
+            tag = soup.find("meta", attrs=attrs)
+            if tag and tag.get("content"):
+                return tag["content"].strip()
+        return None
+
+    summary = None
+    paragraphs = soup.find_all("p")
+    texts = [p.get_text(strip=True) for p in paragraphs[:3] if p.get_text(strip=True)]
+    if texts:
+        summary = " ".join(texts)[:500]
+
+    return {
+        "url": url,
+        "title": title,
+        "description": meta("description"),
+        "summary": summary,
+        "keywords": meta("keywords")
+    }
+
+
+def pad(html: str, megabytes: float) -> str:
+    if megabytes <= 0:
+        return html
+    block = "<div class=\"comment\"><p>填充段落 filler paragraph &amp; text</p></div>\n"
+    filler = block * int(megabytes * 1024 * 1024 / len(block.encode("utf-8")))
+    index = html.lower().rfind("</body>")
+    if index == -1:
+        return html + filler
+    return html[:index] + filler + html[index:]
+
+
+def measure(func, html: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(html, "http://example.com/")
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", type=Path, default=FIXTURES_DIR, help="HTML 文件目录")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--pad-mb", type=float, default=2.0)
+    args = parser.parse_args()
+
+    files = sorted(args.dir.glob("*.html")) + sorted(args.dir.glob("*.htm"))
+    if not files:
+        parser.error(f"{args.dir} 中没有 HTML 文件")
+
+    header = f"{'fixture':<32}{'size':>10}{'stream ms':>12}"
+    if BeautifulSoup is not None:
+        header += f"{'soup ms':>12}{'speedup':>10}  same"
+    print(header)
+
+    for path in files:
+        html = path.read_text(encoding="utf-8", errors="replace")
+        for label, page in ((path.name, html), (f"{path.name} +{args.pad_mb}MB", pad(html, args.pad_mb))):
+            size = f"{len(page.encode('utf-8')) / 1024:.0f}KB"
+            stream_ms = measure(extract_content, page, args.repeat)
+            line = f"{label:<32}{size:>10}{stream_ms:>12.3f}"
+            if BeautifulSoup is not None:
+                soup_ms = measure(extract_with_soup, page, max(1, args.repeat // 5))
+                same = extract_content(page, "u") == extract_with_soup(page, "u")
+                line += f"{soup_ms:>12.3f}{soup_ms / stream_ms:>9.0f}x  {same}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+# 配置在导入 app 时读取，必须先指向临时目录和临时数据库
+_TMP_DIR = tempfile.mkdtemp(prefix="study-one-test-")
+os.environ["DATA_DIR"] = os.path.join(_TMP_DIR, "data")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+os.environ["EXECUTOR_MODE"] = "thread"
+os.environ["REFRESH_ENABLED"] = "false"
+os.environ["FETCH_CACHE_ENABLED"] = "false"
+
+from contextlib import contextmanager
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import SessionLocal, engine
+from app.main import app
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@contextmanager
+def count_queries():
+    """记录期间执行的 SQL 语句"""
+    statements: List[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def queries():
+    return count_queries
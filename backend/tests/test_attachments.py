@@ -0,0 +1,129 @@
+"""附件分块上传：分块写入与 complete 移走组装文件之间不会互相踩踏"""
+import hashlib
+import os
+import threading
+import uuid
+
+import pytest
+
+from app.services.file_service import _lock_part, file_service
+
+API = "/api/v1/knowledge"
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _part(data_size: int) -> str:
+    upload_id = uuid.uuid4().hex
+    file_service.create_upload_part(upload_id, data_size)
+    return upload_id
+
+
+def _write_chunk(upload_id: str, offset: int, data: bytes):
+    chunk = file_service.open_upload_chunk(upload_id, offset, len(data))
+    try:
+        chunk.write(data)
+        chunk.finish(sha256(data))
+    finally:
+        chunk.close()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="依赖 flock")
+def test_store_waits_for_open_chunk():
+    data = os.urandom(4096)
+    upload_id = _part(len(data))
+    _write_chunk(upload_id, 0, data[:2048])
+
+    chunk = file_service.open_upload_chunk(upload_id, 2048, 2048)
+    result = {}
+    store = threading.Thread(target=lambda: result.setdefault("digest", file_service.store_attachment(upload_id)))
+    store.start()
+    store.join(0.2)
+    # 还有分块打开着，complete 在等锁
+    assert store.is_alive()
+
+    chunk.write(data[2048:])
+    chunk.finish(sha256(data[2048:]))
+    chunk.close()
+    store.join(5)
+    assert result["digest"] == sha256(data)
+    assert file_service.attachment_path(sha256(data)).read_bytes() == data
+
+
+def test_chunk_rejected_after_store():
+    data = os.urandom(1024)
+    upload_id = _part(len(data))
+    _write_chunk(upload_id, 0, data)
+    part_path = file_service.upload_part_path(upload_id)
+    # 在 complete 之前打开、之后才拿到锁的写入方
+    stale = open(part_path, "r+b")
+    try:
+        digest = file_service.store_attachment(upload_id)
+        with pytest.raises(FileNotFoundError):
+            file_service.open_upload_chunk(upload_id, 0, len(data))
+        with pytest.raises(FileNotFoundError):
+            _lock_part(stale, part_path, exclusive=False)
+    finally:
+        stale.close()
+    assert file_service.attachment_path(digest).read_bytes() == data
+
+
+def test_second_complete_conflicts(client):
+    item_id = client.post(API, json={"title": "attachments", "type": "markdown"}).json()["data"]["id"]
+    data = os.urandom(3000)
+    upload = client.post(
+        f"{API}/{item_id}/attachments/uploads", json={"filename": "a.bin", "size": len(data)}
+    ).json()["data"]
+    response = client.put(
+        f"{API}/attachments/uploads/{upload['id']}/chunks/0",
+        content=data, headers={"X-Chunk-SHA256": sha256(data)}
+    )
+    assert response.status_code == 200
+
+    response = client.post(f"{API}/attachments/uploads/{upload['id']}/complete")
+    assert response.status_code == 200
+    assert response.json()["data"]["hash"] == sha256(data)
+    # 完成后上传记录已删除，再写分块或再次完成都不会碰到附件文件
+    response = client.put(
+        f"{API}/attachments/uploads/{upload['id']}/chunks/0",
+        content=b"x" * len(data), headers={"X-Chunk-SHA256": sha256(b"x" * len(data))}
+    )
+    assert response.status_code == 404
+    assert client.post(f"{API}/attachments/uploads/{upload['id']}/complete").status_code == 404
+    assert file_service.attachment_path(sha256(data)).read_bytes() == data
+
+
+def test_known_hash_still_requires_upload(client):
+    owner = client.post(API, json={"title": "owner", "type": "markdown"}).json()["data"]["id"]
+    other = client.post(API, json={"title": "other", "type": "markdown"}).json()["data"]["id"]
+    data = os.urandom(2000)
+
+    def upload(item_id: int):
+        created = client.post(f"{API}/{item_id}/attachments/uploads", json={
+            "filename": "secret.bin", "size": len(data), "sha256": sha256(data)
+        })
+        assert created.status_code == 200
+        return created.json()["data"]
+
+    first = upload(owner)
+    client.put(
+        f"{API}/attachments/uploads/{first['id']}/chunks/0", content=data, headers={"X-Chunk-SHA256": sha256(data)}
+    )
+    assert client.post(f"{API}/attachments/uploads/{first['id']}/complete").status_code == 200
+
+    # 只知道哈希不能直接得到附件，必须真的上传内容
+    second = upload(other)
+    assert second["received"] == []
+    assert client.get(f"{API}/{other}/attachments").json()["data"] == []
+    response = client.post(f"{API}/attachments/uploads/{second['id']}/complete")
+    assert response.status_code == 409
+
+    client.put(
+        f"{API}/attachments/uploads/{second['id']}/chunks/0", content=data, headers={"X-Chunk-SHA256": sha256(data)}
+    )
+    attachment = client.post(f"{API}/attachments/uploads/{second['id']}/complete").json()["data"]
+    # 内容相同，仍然共用一个文件
+    assert attachment["hash"] == sha256(data)
+    assert not file_service.upload_part_path(second["id"]).exists()
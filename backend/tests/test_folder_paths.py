@@ -0,0 +1,137 @@
+"""文件夹物化路径：10 万个文件夹的回填、50 层的面包屑、移动、防环和子树删除"""
+from sqlalchemy import func, insert, select
+
+import pytest
+
+from app.crud import folder as folder_crud
+from app.database import SessionLocal
+from app.models import Folder
+
+API = "/api/v1/folders"
+
+CHAINS = 2000
+DEPTH = 50
+
+
+def assert_paths_consistent(db):
+    """每个文件夹的 path/depth 都与按 parent_id 推出的一致"""
+    rows = {row.id: row for row in db.query(Folder.id, Folder.parent_id, Folder.path, Folder.depth)}
+    for row in rows.values():
+        if row.parent_id is None:
+            assert (row.path, row.depth) == (f"/{row.id}/", 1), row
+        else:
+            parent = rows[row.parent_id]
+            assert (row.path, row.depth) == (f"{parent.path}{row.id}/", parent.depth + 1), row
+
+
+@pytest.fixture(scope="module")
+def forest():
+    """模拟升级前的数据库：2000 条 50 层的链，共 10 万个文件夹，path/depth 为空"""
+    with SessionLocal() as db:
+        first_id = (db.query(func.max(Folder.id)).scalar() or 0) + 1
+        rows = []
+        for chain in range(CHAINS):
+            base = first_id + chain * DEPTH
+            for level in range(DEPTH):
+                rows.append({
+                    "id": base + level,
+                    "name": f"f{chain}-{level}",
+                    "parent_id": base + level - 1 if level else None
+                })
+        # 两个互为父文件夹的环
+        cycle = [first_id + CHAINS * DEPTH, first_id + CHAINS * DEPTH + 1]
+        rows.append({"id": cycle[0], "name": "cycle-a", "parent_id": cycle[1]})
+        rows.append({"id": cycle[1], "name": "cycle-b", "parent_id": cycle[0]})
+        for start in range(0, len(rows), 10000):
+            db.execute(insert(Folder), rows[start:start + 10000])
+        db.commit()
+
+        updated = folder_crud.rebuild_folder_paths(db)
+
+    yield {"first_id": first_id, "updated": updated, "cycle": cycle}
+
+    with SessionLocal() as db:
+        db.query(Folder).filter(Folder.id >= first_id).delete(synchronize_session=False)
+        db.commit()
+
+
+def chain_ids(forest, chain: int):
+    base = forest["first_id"] + chain * DEPTH
+    return list(range(base, base + DEPTH))
+
+
+def test_backfill(forest, db):
+    assert forest["updated"] >= CHAINS * DEPTH + 2
+    assert db.query(func.count()).select_from(Folder).filter(Folder.path.is_(None)).scalar() == 0
+    assert db.query(func.max(Folder.depth)).scalar() == DEPTH
+    assert_paths_consistent(db)
+    # 已经回填过，再次启动时不做任何修改
+    assert folder_crud.rebuild_folder_paths(db) == 0
+
+
+def test_backfill_breaks_cycle(forest, db):
+    a, b = (db.get(Folder, folder_id) for folder_id in forest["cycle"])
+    roots = [folder for folder in (a, b) if folder.parent_id is None]
+    assert len(roots) == 1
+    child = b if roots[0] is a else a
+    assert child.path == f"{roots[0].path}{child.id}/"
+
+
+def test_breadcrumbs_at_depth_50(client, forest, queries):
+    ids = chain_ids(forest, 7)
+    with queries() as statements:
+        response = client.get(f"{API}/{ids[-1]}/breadcrumbs")
+    assert response.status_code == 200
+    assert [folder["id"] for folder in response.json()["data"]] == ids
+    # 取 path 一条，按 id 批量取祖先一条
+    assert len(statements) == 2
+
+
+def test_descendants(client, forest):
+    ids = chain_ids(forest, 8)
+    response = client.get(f"{API}/{ids[10]}/descendants")
+    assert sorted(folder["id"] for folder in response.json()["data"]) == ids[11:]
+
+
+@pytest.mark.parametrize("target", [0, 1, 25, DEPTH - 1])
+def test_move_into_own_subtree_rejected(client, forest, target):
+    ids = chain_ids(forest, 9)
+    response = client.put(f"{API}/{ids[0]}", json={"parent_id": ids[target]})
+    assert response.status_code == 400
+    assert client.get(f"{API}/{ids[0]}").json()["data"]["parent_id"] is None
+
+
+def test_move_beyond_max_depth_rejected(client, forest):
+    deep = chain_ids(forest, 10)
+    # 50 层的链接到另一条链的第 20 层下面会超过 64 层
+    response = client.put(f"{API}/{deep[0]}", json={"parent_id": chain_ids(forest, 11)[19]})
+    assert response.status_code == 400
+
+
+def test_move_subtree(client, forest, db):
+    source = chain_ids(forest, 12)
+    target = chain_ids(forest, 13)
+    response = client.put(f"{API}/{source[30]}", json={"parent_id": target[4]})
+    assert response.status_code == 200
+    moved = response.json()["data"]
+    assert moved["path"] == f"/{'/'.join(map(str, target[:5]))}/{source[30]}/"
+    assert moved["depth"] == 6
+
+    leaf = client.get(f"{API}/{source[-1]}/breadcrumbs").json()["data"]
+    assert [folder["id"] for folder in leaf] == target[:5] + source[30:]
+    assert_paths_consistent(db)
+
+
+def test_subtree_delete(client, forest, db):
+    ids = chain_ids(forest, 14)
+    item = client.post("/api/v1/knowledge", json={
+        "title": "in deleted folder", "type": "markdown", "folder_id": ids[40]
+    }).json()["data"]
+
+    response = client.delete(f"{API}/{ids[20]}")
+    assert response.status_code == 200
+    remaining = set(db.execute(select(Folder.id).where(Folder.id.in_(ids))).scalars())
+    assert remaining == set(ids[:20])
+    # 子树中的知识项移到根目录
+    assert client.get(f"/api/v1/knowledge/{item['id']}").json()["data"]["folder_id"] is None
+    assert_paths_consistent(db)
@@ -0,0 +1,103 @@
+"""后台任务：进度表按保留时间和个数淘汰已结束的任务；抓取中一个 worker 出错时取消其余 worker"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+from app.config import settings
+from app.services.crawl_service import CrawlService
+from app.services.job_registry import JobRegistry
+from app.services.vault_import import DirectorySource, VaultImportService
+from app.services.webpage_fetcher import webpage_fetcher
+
+
+class Job:
+    def __init__(self, finished_ago: float = None):
+        self.id = uuid.uuid4().hex
+        self.finished_at = None if finished_ago is None else datetime.utcnow() - timedelta(seconds=finished_ago)
+
+
+def test_registry_evicts_oldest_finished():
+    registry = JobRegistry(retention_seconds=3600, max_finished=3)
+    running = Job()
+    registry.add(running)
+    finished = [Job(finished_ago=10) for _ in range(5)]
+    for job in finished:
+        registry.add(job)
+    # 查询时清理：只保留最后加入的 3 个已结束任务，运行中的任务不受个数限制
+    assert registry.get(finished[0].id) is None
+    assert [registry.get(job.id) for job in finished[2:]] == finished[2:]
+    assert registry.get(running.id) is running
+    assert len(registry) == 4
+
+
+def test_registry_evicts_expired():
+    registry = JobRegistry(retention_seconds=60, max_finished=100)
+    expired, recent, running = Job(finished_ago=120), Job(finished_ago=1), Job()
+    for job in (expired, recent, running):
+        registry.add(job)
+    assert registry.get(expired.id) is None
+    assert registry.get(recent.id) is recent
+    assert registry.get(running.id) is running
+
+    # 任务结束后开始计时
+    running.finished_at = datetime.utcnow() - timedelta(seconds=61)
+    assert registry.get(running.id) is None
+
+
+def test_crawl_cancels_workers_on_error(monkeypatch):
+    fetched = []
+
+    async def fetch_page(url):
+        fetched.append(url)
+        await asyncio.sleep(0.01)
+        return {"url": url, "title": url}
+
+    saves = []
+
+    def save(batch):
+        # 只有第一次写库失败
+        saves.append(batch)
+        if len(saves) == 1:
+            raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(webpage_fetcher, "fetch_page", fetch_page)
+    monkeypatch.setattr(CrawlService, "_save", staticmethod(save))
+    monkeypatch.setattr(settings, "CRAWL_CONCURRENCY", 4)
+    monkeypatch.setattr(settings, "CRAWL_BATCH_SIZE", 1)
+
+    async def run():
+        service = CrawlService()
+        job = service.start([(index, f"https://example.com/{index}") for index in range(200)])
+        await job.task
+        completed = job.completed
+        await asyncio.sleep(0.05)
+        return job, completed
+
+    job, completed = asyncio.run(run())
+    assert job.status == "failed"
+    assert job.errors[-1] == {"error": "database is locked"}
+    assert job.finished_at is not None
+    # 其余 worker 已经退出：任务结束后不再抓取、不再改计数
+    assert job.completed == completed
+    assert len(fetched) < 200
+
+
+def test_vault_import_jobs_are_bounded(client, tmp_path):
+    service = VaultImportService()
+    service.jobs = JobRegistry(retention_seconds=3600, max_finished=1)
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "note.md").write_text(f"# {name}\n", encoding="utf-8")
+
+    async def run():
+        jobs = []
+        for name in ("a", "b"):
+            job = service.start(DirectorySource(str(tmp_path / name)))
+            await job.task
+            jobs.append(job)
+        return jobs
+
+    first, second = asyncio.run(run())
+    assert (first.status, second.status) == ("finished", "finished")
+    assert service.get_job(first.id) is None
+    assert service.get_job(second.id) is second
@@ -0,0 +1,80 @@
+"""上传的 Markdown 与通过 PUT 保存的内容按同样的规则统一换行，得到同一个 blob"""
+import pytest
+
+from app.crud import version as version_crud
+from app.services.file_service import file_service
+
+API = "/api/v1/knowledge"
+
+CRLF_TEXT = "# 标题\r\n\r\n第一行\r\n第二行\r旧 Mac 换行\r\n"
+LF_TEXT = "# 标题\n\n第一行\n第二行\n旧 Mac 换行\n"
+
+
+def _markdown_item(client) -> int:
+    return client.post(API, json={"title": "upload", "type": "markdown"}).json()["data"]["id"]
+
+
+@pytest.mark.parametrize("split", [1, 5, 9, len(CRLF_TEXT.encode())])
+def test_upload_normalizes_newlines_across_chunks(split):
+    data = CRLF_TEXT.encode()
+    upload = file_service.start_markdown_upload(1024 * 1024)
+    try:
+        # 逐段写入，其中一些切分点正好落在 \r 和 \n 之间
+        for start in range(0, len(data), split):
+            upload.write(data[start:start + split])
+        file_path = upload.commit()
+    finally:
+        upload.discard()
+    assert file_service.read_markdown(file_path) == LF_TEXT
+    assert upload.size == len(LF_TEXT.encode())
+    assert file_path == file_service.save_markdown(LF_TEXT)
+
+
+def test_trailing_carriage_return():
+    upload = file_service.start_markdown_upload(1024)
+    try:
+        upload.write(b"end\r")
+        file_path = upload.commit()
+    finally:
+        upload.discard()
+    assert file_service.read_markdown(file_path) == "end\n"
+
+
+def test_upload_and_put_share_blob(client):
+    uploaded_id = _markdown_item(client)
+    response = client.post(
+        f"{API}/markdown/upload",
+        params={"item_id": uploaded_id},
+        files={"file": ("note.md", CRLF_TEXT.encode())}
+    )
+    assert response.status_code == 200
+    uploaded_path = response.json()["data"]["file_path"]
+
+    for text in (CRLF_TEXT, LF_TEXT):
+        put_id = _markdown_item(client)
+        response = client.put(f"{API}/{put_id}/markdown", json={"content": text})
+        assert response.json()["data"]["file_path"] == uploaded_path
+
+    # 原样重新保存不会换成另一个 blob
+    response = client.put(f"{API}/{uploaded_id}/markdown", json={"content": CRLF_TEXT})
+    assert response.json()["data"]["file_path"] == uploaded_path
+    assert client.get(f"{API}/{uploaded_id}/markdown/raw").content == LF_TEXT.encode()
+
+
+def test_upload_version_snapshot_reuses_blob(client, db):
+    item_id = _markdown_item(client)
+    text = "# 快照\n" + "".join(f"第 {index} 行\n" for index in range(200))
+    response = client.post(
+        f"{API}/markdown/upload", params={"item_id": item_id}, files={"file": ("note.md", text.encode())}
+    )
+    file_path = response.json()["data"]["file_path"]
+
+    latest = version_crud.get_latest_version(db, item_id)
+    assert latest.kind == version_crud.SNAPSHOT
+    assert latest.file_path == file_path
+    assert latest.content_hash == file_service.blob_hash(file_path)
+
+    # 再次上传同样的内容不产生新版本
+    client.post(f"{API}/markdown/upload", params={"item_id": item_id}, files={"file": ("note.md", text.encode())})
+    db.expire_all()
+    assert version_crud.get_latest_version(db, item_id).version == latest.version
@@ -0,0 +1,69 @@
+"""每个接口执行的 SQL 条数固定，不随分页大小和每项的标签数增长"""
+import uuid
+
+import pytest
+
+API = "/api/v1/knowledge"
+
+
+@pytest.fixture(scope="module")
+def items(client):
+    word = f"qc{uuid.uuid4().hex[:8]}"
+    tag_ids = [
+        client.post("/api/v1/tags", json={"name": f"{word}-{index}"}).json()["data"]["id"]
+        for index in range(3)
+    ]
+    item_ids = []
+    for index in range(30):
+        item_id = client.post(API, json={"title": f"{word} note {index}", "type": "markdown"}).json()["data"]["id"]
+        client.put(f"{API}/{item_id}/markdown", json={"content": f"# {word}\n\nbody {index}\n"})
+        for tag_id in tag_ids:
+            client.post(f"{API}/{item_id}/tags/{tag_id}")
+        item_ids.append(item_id)
+    webpage_id = client.post(API, json={"title": f"{word} page", "type": "webpage"}).json()["data"]["id"]
+    return {"word": word, "tag_ids": tag_ids, "item_ids": item_ids, "webpage_id": webpage_id}
+
+
+def _count(client, queries, url: str, status: int = 200) -> int:
+    with queries() as statements:
+        response = client.get(url)
+    assert response.status_code == status, response.text
+    return len(statements)
+
+
+@pytest.mark.parametrize("page_size", [5, 30])
+def test_list(client, queries, items, page_size):
+    assert _count(client, queries, f"{API}?page_size={page_size}") == 1
+
+
+def test_list_cursor_page(client, queries, items):
+    next_cursor = client.get(f"{API}?page_size=5").json()["next_cursor"]
+    assert _count(client, queries, f"{API}?page_size=5&cursor={next_cursor}") == 1
+
+
+@pytest.mark.parametrize("page_size", [5, 30])
+def test_by_tags(client, queries, items, page_size):
+    tag_ids = ",".join(str(tag_id) for tag_id in items["tag_ids"])
+    assert _count(client, queries, f"{API}/by-tags?tag_ids={tag_ids}&page_size={page_size}") == 1
+
+
+@pytest.mark.parametrize("page_size", [5, 30])
+def test_search(client, queries, items, page_size):
+    # 全文检索一条，按 id 取知识项一条
+    assert _count(client, queries, f"{API}/search?q={items['word']}&page_size={page_size}") == 2
+
+
+def test_detail(client, queries, items):
+    assert _count(client, queries, f"{API}/{items['item_ids'][0]}") == 1
+
+
+def test_markdown_content(client, queries, items):
+    # 存在性检查一条，内容一条；正文来自读缓存或文件
+    assert _count(client, queries, f"{API}/{items['item_ids'][0]}/markdown") == 2
+
+
+def test_type_guard_failure(client, queries, items):
+    with queries() as statements:
+        response = client.put(f"{API}/{items['webpage_id']}/markdown", json={"content": "x"})
+    assert response.status_code == 400
+    assert len(statements) == 1
@@ -0,0 +1,62 @@
+"""compress-markdown 原地转换压缩方式：流式读写，结果与 encode 的规则一致"""
+import os
+from pathlib import Path
+
+import pytest
+
+from app.config import settings
+from app.services.file_service import file_service
+from app.utils import compression
+
+TEXT = "".join(f"# 第 {index} 节\n\n重复的正文内容，压缩后会明显变小。\n\n" for index in range(2000)).encode()
+
+
+@pytest.fixture(autouse=True)
+def no_whole_reads(monkeypatch):
+    """转换时不允许一次读出整个文件"""
+    def read_bytes(self):
+        raise AssertionError(f"read_bytes({self})")
+
+    monkeypatch.setattr(Path, "read_bytes", read_bytes)
+
+
+def _write(tmp_path, name: str, data: bytes) -> Path:
+    path = tmp_path / name
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _read(path: Path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("codec", compression.available_codecs())
+def test_round_trip(tmp_path, codec):
+    path = _write(tmp_path, "note.md", TEXT)
+    old_size, new_size = file_service.recompress(path, codec)
+    assert old_size == len(TEXT)
+    assert _read(path) == file_service.encode(TEXT, codec)
+    assert new_size == os.path.getsize(path)
+
+    # 再转换一次不做修改，转回不压缩得到原文
+    assert file_service.recompress(path, codec) == (new_size, new_size)
+    file_service.recompress(path, "none")
+    assert _read(path) == TEXT
+    assert os.listdir(tmp_path) == ["note.md"]
+
+
+def test_small_file_is_decompressed(tmp_path):
+    small = TEXT[:settings.MARKDOWN_COMPRESSION_MIN_BYTES - 1]
+    path = _write(tmp_path, "small.md", compression.compress(small, "gzip"))
+    file_service.recompress(path, "gzip")
+    assert _read(path) == small
+
+
+def test_incompressible_file_is_kept(tmp_path):
+    data = os.urandom(64 * 1024)
+    path = _write(tmp_path, "random.md", data)
+    assert file_service.recompress(path, "gzip") == (len(data), len(data))
+    assert _read(path) == data
+    assert os.listdir(tmp_path) == ["random.md"]
@@ -0,0 +1,53 @@
+"""搜索建议索引常驻内存，其它进程直接写库的修改在下次检查时同步"""
+import uuid
+
+import pytest
+
+from app.config import settings
+from app.models import KnowledgeItem, Tag
+
+API = "/api/v1/knowledge/suggest"
+
+
+@pytest.fixture
+def word(client, monkeypatch):
+    monkeypatch.setattr(settings, "SUGGEST_REFRESH_INTERVAL", 0)
+    word = f"sg{uuid.uuid4().hex[:6]}"
+    # 先查一次，确保索引已经加载
+    client.get(API, params={"q": word})
+    return word
+
+
+def _suggest(client, q: str):
+    return {(row["type"], row["text"]) for row in client.get(API, params={"q": q}).json()["data"]}
+
+
+def test_changes_from_other_process(client, db, word):
+    # 直接写库，不经过 crud，相当于另一个 worker 或命令行导入
+    item = KnowledgeItem(title=f"{word} 笔记", type="markdown")
+    tag = Tag(name=f"{word}-tag")
+    db.add_all([item, tag])
+    db.commit()
+    assert _suggest(client, word) == {("tag", f"{word}-tag"), ("knowledge", f"{word} 笔记")}
+
+    item.title = f"{word} 改名"
+    tag.name = f"{word}-renamed"
+    db.commit()
+    assert _suggest(client, word) == {("tag", f"{word}-renamed"), ("knowledge", f"{word} 改名")}
+
+    db.delete(item)
+    db.delete(tag)
+    db.commit()
+    assert _suggest(client, word) == set()
+
+
+def test_own_changes_do_not_rebuild(client, word, monkeypatch):
+    from app.services.suggest_service import suggest_service
+
+    item_id = client.post("/api/v1/knowledge", json={"title": f"{word} 本进程", "type": "markdown"}).json()["data"]["id"]
+    index = suggest_service.knowledge
+    assert _suggest(client, word) == {("knowledge", f"{word} 本进程")}
+    client.delete(f"/api/v1/knowledge/{item_id}")
+    assert _suggest(client, word) == set()
+    # 本进程的修改已经增量更新，检查时行数一致，不会重建索引
+    assert suggest_service.knowledge is index
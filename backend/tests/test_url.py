@@ -0,0 +1,41 @@
+"""URL 规范化：非法端口不抛异常，IPv6 主机保留方括号"""
+import pytest
+
+from app.utils.url import canonical_url, normalize_url
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTP://Example.COM:80/a#frag", "http://example.com/a"),
+    ("https://example.com:8443", "https://example.com:8443/"),
+    ("http://[::1]:8080/x", "http://[::1]:8080/x"),
+    ("http://[2001:DB8::1]:80/x", "http://[2001:db8::1]/x"),
+    ("http://user:pw@[::1]:81/", "http://user:pw@[::1]:81/"),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+@pytest.mark.parametrize("url", ["http://a.com:99999/x", "http://[::1/x", " http://a.com:-1/ "])
+def test_unparseable_url_returned_stripped(url):
+    assert normalize_url(url) == url.strip()
+    # 仍可作为判重键
+    assert canonical_url(url)
+
+
+def test_ipv6_keys_do_not_collide():
+    assert canonical_url("http://[::1]:8080/x") != canonical_url("http://[::1:8080]/x")
+    assert canonical_url("http://[::1]:8080/x") == "https://[::1]:8080/x"
+
+
+def test_lookup_with_bad_url(client):
+    for url in ("http://a.com:99999/x", "http://[::1]:8080/x", "http://[::1/x"):
+        response = client.get("/api/v1/knowledge/webpage/lookup", params={"url": url})
+        assert response.status_code == 200
+        assert response.json()["data"] is None
+
+
+def test_import_rejects_unparseable_urls(client):
+    urls = ["http://a.com:99999/x", "http://[::1/x", "ftp://example.com/"]
+    response = client.post("/api/v1/knowledge/webpage/import", json={"urls": urls})
+    assert response.status_code == 200
+    assert sorted(response.json()["data"]["rejected"]) == sorted(urls)
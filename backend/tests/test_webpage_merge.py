@@ -0,0 +1,77 @@
+"""合并重复网页：删除重复项、改写保留项的规范 URL 在同一个事务中完成"""
+import hashlib
+import uuid
+
+import pytest
+
+from app.crud import webpage as webpage_crud
+from app.models import Attachment, KnowledgeItem, WebpageContent
+from app.services.file_service import file_service
+from app.services.search_service import search_service
+
+API = "/api/v1/knowledge"
+
+
+@pytest.fixture
+def duplicates(client, db):
+    """同一网址的三条历史记录，canonical_url 为空（判重上线前保存的数据）"""
+    host = f"dup-{uuid.uuid4().hex[:8]}.example.com"
+    item_ids = []
+    for index in range(3):
+        item = KnowledgeItem(title=f"{host} {index}", type="webpage")
+        db.add(item)
+        db.flush()
+        db.add(WebpageContent(knowledge_item_id=item.id, url=f"https://{host}/page?utm_source={index}"))
+        item_ids.append(item.id)
+    db.commit()
+
+    tag_id = client.post("/api/v1/tags", json={"name": host}).json()["data"]["id"]
+    client.post(f"{API}/{item_ids[2]}/tags/{tag_id}")
+    data = f"attachment of {host}".encode()
+    upload = client.post(
+        f"{API}/{item_ids[2]}/attachments/uploads", json={"filename": "a.txt", "size": len(data)}
+    ).json()["data"]
+    client.put(
+        f"{API}/attachments/uploads/{upload['id']}/chunks/0",
+        content=data, headers={"X-Chunk-SHA256": hashlib.sha256(data).hexdigest()}
+    )
+    client.post(f"{API}/attachments/uploads/{upload['id']}/complete")
+    pending = client.post(
+        f"{API}/{item_ids[1]}/attachments/uploads", json={"filename": "b.txt", "size": 10}
+    ).json()["data"]
+    return {"host": host, "item_ids": item_ids, "tag_id": tag_id, "pending": pending["id"]}
+
+
+def _group(db, host: str):
+    return next(
+        group for group in webpage_crud.find_duplicate_webpages(db) if host in group[0].url
+    )
+
+
+def test_merge(client, db, duplicates):
+    item_ids = duplicates["item_ids"]
+    keep = webpage_crud.merge_duplicate_webpages(db, _group(db, duplicates["host"]))
+    assert keep.knowledge_item_id == item_ids[0]
+    assert keep.canonical_url == f"https://{duplicates['host']}/page"
+
+    db.expire_all()
+    assert {item.id for item in db.query(KnowledgeItem).filter(KnowledgeItem.id.in_(item_ids))} == {item_ids[0]}
+    assert db.query(Attachment).filter(Attachment.knowledge_item_id.in_(item_ids[1:])).count() == 0
+    assert not file_service.upload_part_path(duplicates["pending"]).exists()
+    tags = client.get(f"{API}/by-tags", params={"tag_ids": duplicates["tag_id"]}).json()["data"]
+    assert [item["id"] for item in tags] == [item_ids[0]]
+
+
+def test_merge_failure_rolls_back_everything(db, duplicates, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("index failed")
+
+    monkeypatch.setattr(search_service, "index_item", fail)
+    with pytest.raises(RuntimeError):
+        webpage_crud.merge_duplicate_webpages(db, _group(db, duplicates["host"]))
+    db.rollback()
+
+    item_ids = duplicates["item_ids"]
+    assert db.query(KnowledgeItem).filter(KnowledgeItem.id.in_(item_ids)).count() == 3
+    assert db.query(Attachment).filter(Attachment.knowledge_item_id == item_ids[2]).count() == 1
+    assert file_service.upload_part_path(duplicates["pending"]).exists()